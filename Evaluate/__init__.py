@@ -9,6 +9,10 @@
 
 """
 
+import sys
+import logging as log
+
+from Utilities.config import ConfigParser
 from pressureDistribution import PressureDistribution
 from trackDensity import TrackDensity
 from longitudeCrossing import LongitudeCrossing
@@ -24,7 +28,17 @@ def run(configFile):
     :param str configFile: path to the configuration file.
 
     """
-    
+
+    # Culled tracks are missing from the track files, so they would bias
+    # all of the statistics (see the `CullTracks` option)
+
+    config = ConfigParser()
+    config.read(configFile)
+    if config.getboolean('TrackGenerator', 'CullTracks'):
+        log.critical('Tracks generated with CullTracks cannot be'
+                     ' evaluated, as the culled tracks are missing')
+        sys.exit(1)
+
     PD = PressureDistribution(configFile)
     TD = TrackDensity(configFile)
     LC = LongitudeCrossing(configFile)
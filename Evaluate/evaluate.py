@@ -45,6 +45,8 @@ from Utilities.loadData import loadTrackFile
 from Utilities.nctools import ncSaveGrid
 from Utilities.metutils import convert
 from Utilities.maputils import bearing2theta
+from Utilities.trackCatalogue import isCatalogue, readTracks, \
+    readCSV, splitTracks
 from Utilities.stats import between
 
 import Utilities.Intersections as Int
@@ -98,11 +100,10 @@ TRACKFILE_UNIT = ('', 'hr', 'degree', 'degree', 'kph', 'degrees',
 TRACKFILE_FMTS = ('i', 'f', 'f', 'f', 'f', 'f', 'f', 'f', 'f')
 
 TRACKFILE_CNVT = {
-    0: lambda s: int(float(s.strip() or 0)),
-    4: lambda s: convert(float(s.strip() or 0), TRACKFILE_UNIT[4], 'mps'),
-    5: lambda s: bearing2theta(float(s.strip() or 0) * np.pi / 180.),
-    6: lambda s: convert(float(s.strip() or 0), TRACKFILE_UNIT[6], 'Pa'),
-    7: lambda s: convert(float(s.strip() or 0), TRACKFILE_UNIT[7], 'Pa'),
+    'Speed': lambda v: convert(v, TRACKFILE_UNIT[4], 'mps'),
+    'Bearing': lambda v: bearing2theta(v * np.pi / 180.),
+    'CentralPressure': lambda v: convert(v, TRACKFILE_UNIT[6], 'Pa'),
+    'EnvPressure': lambda v: convert(v, TRACKFILE_UNIT[7], 'Pa'),
 }
 
 
@@ -294,19 +295,7 @@ def readTrackData(trackfile):
     :type  trackfile: str
     :param trackfile: the track data filename.
     """
-    try:
-        return np.loadtxt(trackfile,
-                          comments='%',
-                          delimiter=',',
-                          dtype={
-                          'names': TRACKFILE_COLS,
-                          'formats': TRACKFILE_FMTS},
-                          converters=TRACKFILE_CNVT)
-    except ValueError:
-        # return an empty array with the appropriate `dtype` field names
-        return np.empty(0, dtype={
-                        'names': TRACKFILE_COLS,
-                        'formats': TRACKFILE_FMTS})
+    return readCSV(trackfile, TRACKFILE_COLS, TRACKFILE_FMTS, TRACKFILE_CNVT)
 
 def readMultipleTrackData(trackfile):
     """
@@ -317,15 +306,11 @@ def readMultipleTrackData(trackfile):
     :type  trackfile: str
     :param trackfile: the track data filename.
     """
-    datas = []
-    data = readTrackData(trackfile)
-    if len(data) > 0:
-        cycloneId = data['CycloneNumber']
-        for i in range(1, np.max(cycloneId) + 1):
-            datas.append(data[cycloneId == i])
-    else:
-        datas.append(data)
-    return datas
+    if isCatalogue(trackfile):
+        return readTracks(trackfile, TRACKFILE_COLS, TRACKFILE_FMTS,
+                          TRACKFILE_CNVT)
+
+    return splitTracks(readTrackData(trackfile))
 
 def loadTracks(trackfile):
     """
@@ -32,6 +32,8 @@ from mpl_toolkits.basemap import Basemap
 from Utilities.config import ConfigParser
 from Utilities.metutils import convert
 from Utilities.maputils import bearing2theta
+from Utilities.trackCatalogue import isCatalogue, readTracks, \
+    readCSV, splitTracks
 from Utilities.loadData import loadTrackFile
 from Utilities.track import Track
 from Utilities import pathLocator
@@ -59,12 +61,10 @@ TRACKFILE_UNIT = ('', '%Y-%m-%d %H:%M:%S', 'hr', 'degree', 'degree', 'kph', 'deg
 TRACKFILE_FMTS = ('i', datetime, 'f', 'f', 'f', 'f', 'f', 'f', 'f', 'f')
 
 TRACKFILE_CNVT = {
-    0: lambda s: int(float(s.strip() or 0)),
-    1: lambda s: datetime.strptime(s.strip(), TRACKFILE_UNIT[1]),
-    5: lambda s: convert(float(s.strip() or 0), TRACKFILE_UNIT[5], 'mps'),
-    6: lambda s: bearing2theta(float(s.strip() or 0) * np.pi / 180.),
-    7: lambda s: convert(float(s.strip() or 0), TRACKFILE_UNIT[7], 'hPa'),
-    8: lambda s: convert(float(s.strip() or 0), TRACKFILE_UNIT[8], 'hPa'),
+    'Speed': lambda v: convert(v, TRACKFILE_UNIT[5], 'mps'),
+    'Bearing': lambda v: bearing2theta(v * np.pi / 180.),
+    'CentralPressure': lambda v: convert(v, TRACKFILE_UNIT[7], 'hPa'),
+    'EnvPressure': lambda v: convert(v, TRACKFILE_UNIT[8], 'hPa'),
 }
 
 def readTrackData(trackfile):
@@ -79,19 +79,7 @@ def readTrackData(trackfile):
 
     :param str trackfile: the track data filename.
     """
-    try:
-        return np.loadtxt(trackfile,
-                          comments='%',
-                          delimiter=',',
-                          dtype={
-                          'names': TRACKFILE_COLS,
-                          'formats': TRACKFILE_FMTS},
-                          converters=TRACKFILE_CNVT)
-    except ValueError:
-        # return an empty array with the appropriate `dtype` field names
-        return np.empty(0, dtype={
-                        'names': TRACKFILE_COLS,
-                        'formats': TRACKFILE_FMTS})
+    return readCSV(trackfile, TRACKFILE_COLS, TRACKFILE_FMTS, TRACKFILE_CNVT)
 
 def readMultipleTrackData(trackfile):
     """
@@ -105,18 +93,11 @@ def readMultipleTrackData(trackfile):
 
     log.debug("Reading multiple track data from {0}".format(trackfile))
 
-    datas = []
-    data = readTrackData(trackfile)
-    if len(data) > 0:
-        cycloneId = data['CycloneNumber']
-        for i in range(1, np.max(cycloneId) + 1):
-            if len(data[cycloneId == i]) > 0:
-                datas.append(data[cycloneId == i])
-            else:
-                pass
-    else:
-        datas.append(data)
-    return datas
+    if isCatalogue(trackfile):
+        return readTracks(trackfile, TRACKFILE_COLS, TRACKFILE_FMTS,
+                          TRACKFILE_CNVT)
+
+    return splitTracks(readTrackData(trackfile))
 
 def loadTracks(trackfile):
     """
@@ -33,7 +33,6 @@ from os.path import join as pjoin
 
 from Utilities.config import ConfigParser
 
-from Utilities.maputils import find_index
 import Utilities.nctools as nctools
 from Utilities.smooth import smooth
 from Utilities import pathLocator
@@ -43,6 +42,7 @@ from Utilities import colours
 
 from PlotInterface.maps import saveHazardMap
 from PlotInterface.curves import saveHazardCurve
+from hazard.query import HazardQuery
 
 import sqlite3
 import unicodedata
@@ -221,29 +221,12 @@ class AutoPlotHazard(object):
         log.info(("Plotting return period curves for locations within the "
                   "model domain"))
         # Open data file
-        try:
-            ncobj = nctools.ncLoadFile(inputFile)
-            lon = nctools.ncGetDims(ncobj, 'lon')
-            lat = nctools.ncGetDims(ncobj, 'lat')
-            years = nctools.ncGetDims(ncobj, 'years')
-        except (IOError, RuntimeError, KeyError):
-            log.critical("Cannot load input file: %s"%inputFile)
-            raise
+        hq = HazardQuery(inputFile)
 
-        # Load data
-        wspd = nctools.ncGetData(ncobj, 'wspd')
-        try:
-            wLower  = nctools.ncGetData(ncobj, 'wspdlower')
-            wUpper = nctools.ncGetData(ncobj, 'wspdupper')
-            ciBounds = True
-        except KeyError:
-            ciBounds = False
-        ncobj.close()
-
-        minLon = min(lon)
-        maxLon = max(lon)
-        minLat = min(lat)
-        maxLat = max(lat)
+        minLon = min(hq.lon)
+        maxLon = max(hq.lon)
+        minLat = min(hq.lat)
+        maxLat = max(hq.lat)
 
         # Use the same maximum value for all localities to simplify
         # intercomparisons:
@@ -252,13 +235,18 @@ class AutoPlotHazard(object):
         
         placeNames, parentCountries, placeLats, placeLons = \
             self.getLocations(minLon, maxLon, minLat, maxLat)
-        
-        for name, plat, plon, country in zip(placeNames, placeLats,
-                                             placeLons, parentCountries):
+
+        # Load the curves for all locations in a single read:
+        years, wspd, wUpper, wLower = hq.curves(placeLons, placeLats)
+        hq.close()
+        ciBounds = wUpper is not None
+
+        for k, (name, plat, plon, country) in enumerate(zip(placeNames,
+                                                            placeLats,
+                                                            placeLons,
+                                                            parentCountries)):
 
             log.debug("Plotting return period curve for %s"%name)
-            i = find_index(lon, plon)
-            j = find_index(lat, plat)
 
             xlabel = 'Average recurrence interval (years)'
             ylabel = 'Wind speed (%s)'%self.plotUnits.label
@@ -269,14 +257,16 @@ class AutoPlotHazard(object):
             name.replace(' ', '')
             filename = pjoin(plotPath, 'ARI_curve_%s.%s'%(name,"png"))
             log.debug("Saving hazard curve for %s to %s"%(name, filename))
-            placeWspd = metutils.convert(wspd[:, j, i], 'mps',
+            placeWspd = metutils.convert(wspd[k], 'mps',
                                          self.plotUnits.units)
             maxWspd = placeWspd.max()
             if ciBounds:
-                placeWspdLower = metutils.convert(wLower[:,j,i], 'mps',
+                placeWspdLower = metutils.convert(wLower[k], 'mps',
                                                   self.plotUnits.units)
-                placeWspdUpper  = metutils.convert(wUpper[:,j,i], 'mps',
+                placeWspdUpper  = metutils.convert(wUpper[k], 'mps',
                                                    self.plotUnits.units)
+            else:
+                placeWspdLower = placeWspdUpper = placeWspd
                 
             saveHazardCurve(years, placeWspd, placeWspdUpper, placeWspdLower,
                             xlabel, ylabel, title, filename)
@@ -19,12 +19,13 @@ determine the distributions.
 import os
 import sys
 import logging
+import multiprocessing
 from os.path import join as pjoin
 
 import Utilities.stats as stats
 import KDEParameters
 from Utilities.config import cnfGetIniValue
-from Utilities.files import flLoadFile, flSaveFile, flStartLog
+from Utilities.files import flLoadFile, flStartLog
 
 from netCDF4 import Dataset
 import numpy as np
@@ -70,11 +71,15 @@ class GenerateDistributions:
                                reached.
     :param missingValue: Missing values have this value (default
                          :attr:`sys.maxint`).
+    :param int numProcesses: Number of local worker processes used to
+                             calculate the distributions of the cells
+                             (default 1, i.e. serially).
 
     """
 
     def __init__(self, configFile, gridLimit, gridSpace, gridInc, kdeType,
-                 minSamplesCell=40, missingValue=sys.maxint):
+                 minSamplesCell=40, missingValue=sys.maxint,
+                 numProcesses=1):
         """
         Initialise required fields
         """
@@ -87,9 +92,12 @@ class GenerateDistributions:
         self.kdeType = kdeType
         self.minSamplesCell = minSamplesCell
         self.outputPath = cnfGetIniValue(configFile, 'Output', 'Path')
-        self.kdeParameter = KDEParameters.KDEParameters(kdeType)
+        self.kdeParameter = KDEParameters.KDEParameters(
+            kdeType, cnfGetIniValue(configFile, 'StatInterface', 'BinnedKDE',
+                                    False))
 
         self.missingValue = missingValue
+        self.numProcesses = numProcesses
 
     def allDistributions(self, lonLat, parameterList, parameterName=None,
                          kdeStep=0.1, angular=False, periodic=False,
@@ -128,9 +136,13 @@ class GenerateDistributions:
         :param boolean plotParam: Plot the parameters. Default is ``False``.
 
         :returns: If no ``parameterName`` is given returns ``None``
-                  (data are saved to file), otherwise
+                  (data are saved to a netCDF file), otherwise
                   :class:`numpy.ndarray`.
 
+        The distributions of the cells are calculated by a pool of
+        :attr:`numProcesses` worker processes (if more than one), and
+        then assembled in order of cell number.
+
         
         """
         if parameterName:
@@ -153,54 +165,51 @@ class GenerateDistributions:
 
         self.pName = parameterName
 
-        maxCellNum = stats.maxCellNum(self.gridLimit, self.gridSpace)
-
-        # Writing CDF dataset for all individual cell number into files
-        self.logger.debug("Writing CDF dataset for all individual cells into files")
-
-        for cellNum in xrange(0, maxCellNum + 1):
-            self.logger.debug("Processing cell number %i"%cellNum)
-
-            # Generate cyclone parameter data for the cell number
-            self.extractParameter(cellNum)
+        valid = (self.pList != self.missingValue) & \
+                (self.pList < sys.maxint)
+        self.index = stats.CellIndex(self.lonLat[:,0], self.lonLat[:,1],
+                                     self.gridLimit, self.gridSpace, valid)
 
-            # Estimate cyclone parameter data using KDE
-            # The returned array contains the grid, the PDF and the CDF
-            cdf = self.kdeParameter.generateKDE(self.parameter, kdeStep,
-                                                angular=angular,
-                                                periodic=periodic)
-            if plotParam:
-                self._plotParameter(cellNum, kdeStep)
-            self.logger.debug('size of parameter array = %d: size of cdf array = %d'
-                          % (self.parameter.size,cdf.size))
-
-            cellNumlist = []
-            for i in range(len(cdf)):
-                cellNumlist.append(cellNum)
-            if cellNum == 0:
-                results = np.transpose(np.array([cellNumlist, cdf[:,0], cdf[:,2]]))
-            else:
-                self.logger.debug('size of results array = %s'%str(results.size))
-                results = np.concatenate((results, np.transpose(np.array([cellNumlist,
-                                                                          cdf[:,0],
-                                                                     cdf[:,2]]))))
+        maxCellNum = stats.maxCellNum(self.gridLimit, self.gridSpace)
+        cellNums = range(0, maxCellNum + 1)
+        args = (kdeStep, angular, periodic, plotParam)
+
+        if self.numProcesses > 1:
+            self.logger.debug("Calculating distributions for %i cells with "
+                              "%i processes" % (len(cellNums),
+                                                self.numProcesses))
+            pool = multiprocessing.Pool(self.numProcesses,
+                                        initializer=_initWorker,
+                                        initargs=(self, args))
+            try:
+                cdfs = pool.map(_cellDistribution, cellNums,
+                                chunksize=max(1, len(cellNums) //
+                                              (4 * self.numProcesses)))
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            cdfs = [self.cellDistribution(cellNum, *args)
+                    for cellNum in cellNums]
+
+        # The length of each cell's distribution is now known, so the
+        # results can be assembled in a single array:
+        sizes = [len(cdf) for cdf in cdfs]
+        results = np.empty((sum(sizes), 3))
+        start = 0
+        for cellNum, size, cdf in zip(cellNums, sizes, cdfs):
+            results[start:start + size, 0] = cellNum
+            results[start:start + size, 1:] = cdf
+            start += size
 
         if parameterName == None:
             self.logger.debug("Returning CDF dataset for all individual cell numbers")
             return results
         else:
-            cdfHeader = "Cell_Number, CDF_" + self.pName + "_x, CDF_" + \
-                        self.pName + "_y"
             allCellCdfOutput = pjoin(self.outputPath, 'process',
                                      'all_cell_cdf_' + self.pName)
 
-            args = {"filename":allCellCdfOutput, "data":results,
-                    "header":cdfHeader, "delimiter":",", "fmt":"%f"}
-
             self.logger.debug("Writing CDF dataset for all individual cell numbers into files")
-            flSaveFile(**args)
-
-            # Save to netcdf too
 
             filename = allCellCdfOutput + '.nc'
 
@@ -218,6 +227,38 @@ class GenerateDistributions:
 
             ncdf.close()
 
+    def cellDistribution(self, cellNum, kdeStep, angular=False,
+                         periodic=False, plotParam=False):
+        """
+        Calculate the distribution of the parameter for a single cell.
+
+        :param int cellNum: The cell number to process.
+        :param float kdeStep: Increment of the ordinate values at which
+                              the distribution will be calculated.
+        :param angular: Does the data represent an angular measure.
+        :param periodic: The period of the data, if periodic.
+        :param boolean plotParam: Plot the parameter values.
+
+        :returns: :class:`numpy.ndarray` of the ordinate values and
+                  the CDF of the cell.
+
+        """
+        self.logger.debug("Processing cell number %i"%cellNum)
+
+        # Generate cyclone parameter data for the cell number
+        self.extractParameter(cellNum)
+
+        # Estimate cyclone parameter data using KDE
+        # The returned array contains the grid, the PDF and the CDF
+        cdf = self.kdeParameter.generateKDE(self.parameter, kdeStep,
+                                            angular=angular,
+                                            periodic=periodic)
+        if plotParam:
+            self._plotParameter(cellNum, kdeStep)
+        self.logger.debug('size of parameter array = %d: size of cdf array = %d'
+                          % (self.parameter.size,cdf.size))
+        return cdf[:, [0, 2]]
+
     def extractParameter(self, cellNum):
         """
         Extracts the cyclone parameter data for the given cell.
@@ -225,7 +266,9 @@ class GenerateDistributions:
         PDF, the bounds of the cell are expanded until the population is
         sufficient.
 
-        Null/missing values are removed.
+        Null/missing values are removed. The observations are
+        extracted using the :class:`Utilities.stats.CellIndex` built
+        by :meth:`allDistributions`.
 
         :param int cellNum: The cell number to process.
         :returns: None. The :attr:`parameter` attribute is updated.
@@ -246,13 +289,7 @@ class GenerateDistributions:
         nLat = cellLat
         sLat = cellLat - self.gridSpace['y']
 
-        indij = np.where(((lat >= sLat) & (lat < nLat)) &
-                          (lon >= wLon) & (lon < eLon))
-        parameter_ = self.pList[indij]
-        self.parameter = stats.statRemoveNum(np.array(parameter_),
-                                             self.missingValue)
-
-        while np.size(self.parameter) <= self.minSamplesCell:
+        while self.index.count(wLon, eLon, sLat, nLat) <= self.minSamplesCell:
             self.logger.debug("Insufficient samples. Increasing the size of the cell")
             wLon_last = wLon
             eLon_last = eLon
@@ -263,15 +300,13 @@ class GenerateDistributions:
             if (wLon == wLon_last) & (eLon == eLon_last) & (nLat == nLat_last) & (sLat == sLat_last):
                 errMsg = "Insufficient grid points in selected domain to " \
                        + "estimate storm statistics - please select a larger " \
-                       + "domain. Samples = %i / %i" % (np.size(self.parameter),
-                                                        self.minSamplesCell)
+                       + "domain. Samples = %i / %i" % \
+                       (self.index.count(wLon, eLon, sLat, nLat),
+                        self.minSamplesCell)
                 self.logger.critical(errMsg)
                 raise StopIteration, errMsg
-            indij = np.where(((lat >= sLat) & (lat < nLat)) &
-                              ((lon >= wLon) & (lon < eLon)))
-            parameter_ = self.pList[indij]
-            self.parameter = stats.statRemoveNum(np.array(parameter_),
-                                                 self.missingValue)
+
+        self.parameter = self.pList[self.index.query(wLon, eLon, sLat, nLat)]
 
         # Check to see if all values in the array are the same. If the
         # values are the same, bandwidth would be 0, and therefore KDE
@@ -288,11 +323,8 @@ class GenerateDistributions:
                 errMsg = "Insufficient grid points in selected domain to estimate storm statistics - please select a larger domain."
                 self.logger.critical(errMsg)
                 raise StopIteration, errMsg
-            indij = np.where(((lat >= sLat) & (lat < nLat)) &
-                              ((lon >= wLon) & (lon < eLon)))
-            parameter_ = self.pList[indij]
-            self.parameter = stats.statRemoveNum(np.array(parameter_),
-                                                 self.missingValue)
+            self.parameter = self.pList[self.index.query(wLon, eLon,
+                                                         sLat, nLat)]
         self.logger.debug("Number of valid observations in cell %s : %s" %
                       (str(cellNum), str(np.size(self.parameter))))
 
@@ -343,6 +375,36 @@ class GenerateDistributions:
             sLat = self.gridLimit['yMin']
         return wLon, eLon, nLat, sLat
 
+
+def _initWorker(gd, args):
+    """
+    Initialise a worker process of the local process pool by storing the
+    :class:`GenerateDistributions` instance (with the observations
+    loaded) as a module-level global.
+
+    :param gd: :class:`GenerateDistributions` instance.
+    :param tuple args: Additional arguments to
+                       :meth:`GenerateDistributions.cellDistribution`.
+
+    """
+
+    global _gd, _args
+    _gd = gd
+    _args = args
+
+def _cellDistribution(cellNum):
+    """
+    Calculate the distribution for a single cell in a worker process.
+
+    :param int cellNum: The cell number to process.
+
+    :returns: :class:`numpy.ndarray` returned by
+              :meth:`GenerateDistributions.cellDistribution`.
+
+    """
+
+    return _gd.cellDistribution(cellNum, *_args)
+
 if __name__ == "__main__":
     try:
         configFile = sys.argv[1]
@@ -17,6 +17,7 @@ import numpy
 
 import Utilities.stats as stats
 import Utilities.KPDF as KPDF
+import Utilities.binnedKDE as binnedKDE
 
 from Utilities.files import flLoadFile, flStartLog
 from Utilities.grid import grdSave
@@ -71,6 +72,7 @@ class KDEOrigin:
 
         config = ConfigParser()
         config.read(configFile)
+        self.binned = config.getboolean('StatInterface', 'BinnedKDE')
 
         if lonLat is None:
             self.outputPath = config.get('Output', 'Path')
@@ -113,6 +115,31 @@ class KDEOrigin:
 
         return kdeMethod(self.lonLat, grid, bw)
 
+    def _generateBinnedPDF(self, bw):
+        """
+        Generate the PDF for cyclone origins on the :attr:`x`,
+        :attr:`y` grid using the binned kernel density estimator
+        (see :mod:`Utilities.binnedKDE`).
+
+        :param float bw: Bandwidth of the distribution.
+
+        :returns: 2-d PDF of genesis probability, flattened in the
+                  same order as the output of :meth:`_generatePDF`.
+        :raises ValueError: If the bandwidth is <= 0.
+        :raises KeyError: If the chosen KDE method is not available.
+
+        """
+        if bw <= 0:
+            self.logger.critical("bw = %d. Bandwidth cannot be negative or zero"%bw)
+            raise ValueError, 'bw = %d. Bandwidth cannot be negative or zero' %bw
+
+        if self.kdeType not in binnedKDE.MKERNELS:
+            self.logger.critical("Invalid input on option: binned KDE method '%s' does not exist" %self.kdeType)
+            raise KeyError, self.kdeType
+
+        pdf = binnedKDE.MPDF(self.lonLat, self.x, self.y, bw, self.kdeType)
+        return pdf.ravel()
+
     def generateKDE(self, bw=None, save=False, plot=False):
         """
         Generate the PDF for cyclone origins using kernel density
@@ -128,10 +155,13 @@ class KDEOrigin:
         :returns: ``x`` and ``y`` grid and the PDF values.
         
         """
-        grid2d = KPDF.MPDF2DGrid2Array(self.x, self.y, 1)
         if bw:
             self.bw = bw
-        pdf = self._generatePDF(grid2d, self.bw)
+        if self.binned:
+            pdf = self._generateBinnedPDF(self.bw)
+        else:
+            grid2d = KPDF.MPDF2DGrid2Array(self.x, self.y, 1)
+            pdf = self._generatePDF(grid2d, self.bw)
         # Normalise PDF so total probability equals one
         # Note: Need to investigate why output from KPDF is not correctly normalised
         pdf = pdf / pdf.sum()
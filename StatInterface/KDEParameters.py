@@ -20,6 +20,7 @@ import os, sys, pdb, logging
 import numpy as np
 import Utilities.stats as stats
 import Utilities.KPDF as KPDF
+import Utilities.binnedKDE as binnedKDE
 
 from Utilities.files import flLoadFile, flSaveFile
 from Utilities.config import cnfGetIniValue
@@ -36,10 +37,15 @@ class KDEParameters:
                         when generating the distribution. Must be one of
                         ``Epanechnikov``, ``Gaussian``, ``Biweight`` or
                         ``Triangular``.
+    :param boolean binned: If ``True``, calculate the PDFs with the
+                           binned estimator (see
+                           :mod:`Utilities.binnedKDE`), rather than
+                           summing the kernels directly. Default is
+                           ``False``.
 
     """
 
-    def __init__(self, kdeType):
+    def __init__(self, kdeType, binned=False):
         """
         Initialize the logger and ensure the requested KDE type exists.
 
@@ -50,6 +56,7 @@ class KDEParameters:
         if hasattr(KPDF, "UPDF%s" %kdeType):
             self.logger.debug("Using %s to generate distribution"%kdeType)
             self.kdeType = kdeType
+            self.binned = binned
         else:
             self.logger.error("Invalid KDE type: %s" %kdeType)
             raise NotImplementedError, "Invalid KDE type: %s" %kdeType
@@ -181,7 +188,10 @@ class KDEParameters:
         except AttributeError:
             self.logger.exception("Invalid input on option: KDE method UPDF%s does not exist"%self.kdeType)
             raise
-        pdf = kdeMethod( ndata, ndays, bw )
+        if self.binned:
+            pdf = binnedKDE.UPDF(ndata, ndays, bw, self.kdeType)
+        else:
+            pdf = kdeMethod( ndata, ndays, bw )
         # Actual PDF to return
         apdf = 3.0*pdf[365:730]
         cy = stats.cdf(days, apdf)
@@ -197,7 +207,8 @@ class KDEParameters:
     def _generatePDF(self, grid, bw, dataset):
         """
         Sub-function that generates the PDFs of kernel
-        density estimation from raw dataset
+        density estimation from raw dataset. If :attr:`binned` is set
+        and the grid is equally spaced, the binned estimator is used.
         """
         self.logger.debug("Generating PDF")
         if bw <= 0:
@@ -210,6 +221,9 @@ class KDEParameters:
             self.logger.exception("Invalid input on option: KDE method UPDF%s does not exist" %self.kdeType)
             raise
 
+        if self.binned and binnedKDE.isRegular(grid):
+            return binnedKDE.UPDF(dataset, grid, bw, self.kdeType)
+
         return kdeMethod(dataset, grid, bw)
 
 if __name__ == "__main__":
@@ -45,6 +45,7 @@ class SamplingOrigin:
         lon/lat arrays.
         """
         self.logger=logging.getLogger()
+        self.ratio = None
 
         if type(kdeOrigin) == str:
             self.logger.debug("Loading PDF from %s"%kdeOrigin)
@@ -125,14 +126,21 @@ class SamplingOrigin:
         """
         Percent point function on 2-d grid (inverse of CDF).
 
-        :param float q1: Quantile for the x-coordinate.
-        :param float q2: Quantile for the y-coordinate.
+        :param q1: Quantile(s) for the x-coordinate.
+        :param q2: Quantile(s) for the y-coordinate.
+        :type  q1: float or :class:`numpy.ndarray`
+        :type  q2: float or :class:`numpy.ndarray`
 
         :returns: Longitude & latitude of the given quantile values.
 
         """
         xi = self.cdfX.searchsorted(q1)
-        yj = self.cdfY[xi, :].searchsorted(q2)
+        if np.ndim(q1) == 0:
+            yj = self.cdfY[xi, :].searchsorted(q2)
+        else:
+            # Equivalent to searching each row of the conditional CDF:
+            q2 = np.asarray(q2)[:, np.newaxis]
+            yj = (self.cdfY[xi, :] < q2).sum(axis=1)
         return self.x[xi], self.y[yj] #lon, lat
 
     def cdf(self, x, y):
@@ -151,6 +159,72 @@ class SamplingOrigin:
         yi = self.y.searchsorted(y) - 1
         return self.cdfX[xi], self.cdfY[xi, yi]
 
+    def setImportance(self, bias, fraction=0.5):
+        """
+        Bias the sampling of the origins toward locations where `bias`
+        is large (importance sampling). The origins are then sampled
+        from the mixture
+
+            q = (1 - fraction) * p + fraction * p_b
+
+        of the genesis PDF `p` and the PDF `p_b` proportional to
+        `p * bias`. Since `q` is never less than `(1 - fraction) * p`,
+        the likelihood ratio `p / q` of an origin (see :meth:`weights`)
+        is at most `1 / (1 - fraction)`.
+
+        :param bias: :class:`numpy.ndarray` of non-negative values on
+                     the grid of the PDF (e.g. the probability that a
+                     TC originating at each grid point affects the
+                     region of interest).
+        :param float fraction: fraction of the origins sampled from
+                               the biased PDF (0 <= fraction < 1).
+
+        :raises ValueError: if `fraction` is not in [0, 1).
+
+        """
+        if not 0. <= fraction < 1.:
+            raise ValueError("Importance fraction must be in [0, 1)")
+
+        if self.ratio is not None:
+            # Start from the unbiased genesis PDF:
+            self.z = self.z * self.ratio
+
+        p = self.z / self.z.sum()
+        pb = p * bias
+        if pb.sum() > 0:
+            pb /= pb.sum()
+        else:
+            self.logger.warning("Importance bias is zero everywhere - "
+                                "origins will not be biased")
+            pb = p
+
+        q = (1. - fraction) * p + fraction * pb
+        self.ratio = np.where(q > 0, p / np.where(q > 0, q, 1.), 1.)
+        self.z = q
+        self._calculateCDF()
+
+    def weights(self, x, y):
+        """
+        Return the likelihood ratio of origins sampled (with
+        :meth:`ppf`) at the given locations, i.e. the ratio of the
+        genesis PDF to the PDF the origins are sampled from. The
+        ratio is 1 unless the sampling has been biased with
+        :meth:`setImportance`.
+
+        :param x: Longitude(s) of the origins.
+        :param y: Latitude(s) of the origins.
+        :type  x: float or :class:`numpy.ndarray`
+        :type  y: float or :class:`numpy.ndarray`
+
+        :returns: Likelihood ratio of each origin.
+
+        """
+        if self.ratio is None:
+            return np.ones(np.shape(x))
+        xi = np.clip(self.x.searchsorted(x), 0, len(self.x) - 1)
+        yj = np.clip(self.y.searchsorted(y), 0, len(self.y) - 1)
+        return self.ratio[yj, xi]
+
     def generateSamples(self, ns, outputFile=None):
         """
         Generate random samples of cyclone origins.
@@ -214,32 +288,61 @@ class SamplingOrigin:
         # calculate CDF of (x,Px)
         cdfX = stats.cdf(self.x, px)
         # define Py & CDFy with nx by ny
+        # Py=conditional distribution (zero where Px is zero)
         py = np.zeros([self.x.size, self.y.size], 'd')
-        cdfY = np.zeros([self.x.size, self.y.size], 'd')
-        # Py=conditional distribution,  CDFy = CDF of Y
-        try:
-            for i in xrange(len(self.x)):
-                for j in xrange(len(self.z[:, i])):
-                    if px[i] == 0:
-                        py[i,j] = 0
-                    else:
-                        py[i,j] = self.z[j, i]/px[i]
-                cdfTemp = stats.cdf(self.y, py[i, :])
-                for j in xrange(len(cdfTemp)):
-                    cdfY[i,j] = cdfTemp[j]
-        except IndexError:
-            self.logger.debug("i = %s"%str(i))
-            self.logger.debug("j = %s"%str(j))
-            self.logger.debug("p_y[%s, %s] = %s"%(str(i), str(j), str(py[i, j])))
-            self.logger.debug("z[%s, %s] = %s"%(str(i), str(j), str(self.z[j, i])))
-            self.logger.debug("p_x[%s] = %s"%(str(i), str(px[i])))
-            self.logger.debug("cdfy dim = %s"%(str(cdfY.shape)))
-            self.logger.debug("p_y dim = %s"%(str(py.shape)))
-            self.logger.debug("cdfx dim = %s"%(str(cdfX.shape)))
-            self.logger.debug("p_x dim = %s"%(str(px.shape)))
-
-            raise
+        valid = px != 0
+        py[valid, :] = self.z[:, valid].T/px[valid, np.newaxis]
+        # CDFy = CDF of Y for each column of x, calculated for all
+        # columns at once (as for stats.cdf)
+        cdfY = (abs(self.y[1] - self.y[0])*py).cumsum(axis=1)
+        total = cdfY[:, -1].copy()
+        total[total == 0] = 1.
+        cdfY = cdfY/total[:, np.newaxis]
 
         self.cdfX = cdfX
         self.cdfY = cdfY
         return
+
+
+def transitProbability(trackFile, x, y, region, bandwidth=5.0):
+    """
+    Estimate the probability that a TC originating at each point of a
+    grid passes through a region, from the historical tracks. The
+    transit indicator of each historical track is smoothed over the
+    grid with a Gaussian kernel centred on the origin of the track. A
+    pseudo-count of one track at the overall transit rate is added, so
+    the estimate tends to the overall rate far from any observed
+    origins.
+
+    :param str trackFile: path to the ``cyclone_tracks`` file written
+                          by :mod:`DataProcess` (cyclone origin
+                          indicator, longitude and latitude of each
+                          observation).
+    :param x: :class:`numpy.ndarray` of grid longitudes.
+    :param y: :class:`numpy.ndarray` of grid latitudes.
+    :param dict region: the region of interest, with the keys `xMin`,
+                        `xMax`, `yMin` and `yMax`.
+    :param float bandwidth: standard deviation of the kernel (degrees).
+
+    :returns: 2-D :class:`numpy.ndarray` (latitude, longitude) of
+              transit probabilities.
+
+    """
+    data = np.asarray(flLoadFile(trackFile, delimiter=','))
+    indicator, lon, lat = data[:, 0], data[:, 1], data[:, 2]
+
+    number = np.cumsum(indicator == 1) - 1
+    inside = ((region['xMin'] <= lon) & (lon <= region['xMax']) &
+              (region['yMin'] <= lat) & (lat <= region['yMax']))
+    transit = np.bincount(number, inside) > 0
+    origin = np.flatnonzero(indicator == 1)
+
+    # The Gaussian kernel is separable, so the kernel sums over the
+    # tracks are products of the longitude and latitude kernels:
+    kx = np.exp(-0.5 * ((x[:, np.newaxis] - lon[origin]) / bandwidth) ** 2)
+    ky = np.exp(-0.5 * ((y[:, np.newaxis] - lat[origin]) / bandwidth) ** 2)
+
+    prior = transit.mean()
+    total = np.dot(ky, kx.T)
+    passing = np.dot(ky, (kx * transit).T)
+    return (passing + prior) / (total + 1.)
@@ -54,6 +54,8 @@ class StatInterface(object):
         self.kde2DType = config.get('StatInterface','kde2DType')
         minSamplesCell = config.getint('StatInterface', 'minSamplesCell')
         self.kdeStep = config.getfloat('StatInterface', 'kdeStep')
+        numProcesses = config.getint('StatInterface', 'NumProcesses')
+        self.binned = config.getboolean('StatInterface', 'BinnedKDE')
         self.outputPath = config.get('Output', 'Path')
         self.processPath = pjoin(self.outputPath, 'process')
 
@@ -85,7 +87,8 @@ class StatInterface(object):
                                                   gridSpace, gridInc,
                                                   self.kdeType,
                                                   minSamplesCell,
-                                                  missingValue)
+                                                  missingValue,
+                                                  numProcesses)
         self.gridSpace = gridSpace
         self.gridInc = gridInc
 
@@ -115,7 +118,7 @@ class StatInterface(object):
                   pjoin(self.processPath, 'jdays'))
         pList = pjoin(self.processPath, 'jdays')
         lonLat = pjoin(self.processPath, 'init_lon_lat')
-        kde = KDEParameters.KDEParameters(self.kdeType)
+        kde = KDEParameters.KDEParameters(self.kdeType, self.binned)
         #kde.generateGenesisDateCDF(jdays, lonLat, bw=14,
         #                           genesisKDE=pjoin(self.processPath,
         #                                            'cdfGenesisDays'))
@@ -15,10 +15,55 @@ on [0,2*pi).
 """
 
 import numpy
-import KPDF
-from scipy.special import i0
+import Utilities.KPDF as KPDF
 from math import pi
-import stats
+import Utilities.stats as stats
+
+# Minimum number of points on the periodic grid onto which the data are
+# binned before convolution with the kernel:
+CIRCULAR_BINS = 1024
+
+def _vonMises(bw, theta):
+    """Unnormalised von Mises kernel with concentration *bw*."""
+    return numpy.exp(bw*numpy.cos(theta))
+
+def _periodicPDF(parameters, bw, grid, kdeStep):
+    """
+    Evaluate the sum of the kernels (each normalised to unit sum over
+    the grid) by circular convolution of the linearly binned data with
+    the kernel, for a grid that divides the circle into a whole number
+    of steps. The data are binned onto a refinement of the grid with at
+    least :data:`CIRCULAR_BINS` points.
+
+    :returns: :class:`numpy.ndarray` of the sum of the kernels at the
+              grid points, or ``None`` if the grid is not periodic.
+
+    """
+    nsteps = int(round(2*pi/kdeStep))
+    if nsteps < 1 or abs(nsteps*kdeStep - 2*pi) > 1e-8*2*pi:
+        return None
+    refine = int(numpy.ceil(float(CIRCULAR_BINS)/nsteps))
+    nbins = nsteps*refine
+    step = 2*pi/nbins
+
+    kernel = numpy.fft.rfft(_vonMises(bw, numpy.arange(nbins)*step))
+
+    # Sum of each kernel over the grid, which depends on the bin it is
+    # centred on (points beyond 2*pi duplicate those at the start):
+    ngrid = numpy.bincount((numpy.arange(len(grid))*refine) % nbins,
+                           minlength=nbins).astype(float)
+    norm = numpy.fft.irfft(numpy.fft.rfft(ngrid)*kernel, nbins)
+
+    pos = numpy.mod(numpy.asarray(parameters, 'd').ravel(), 2*pi)/step
+    lower = numpy.floor(pos).astype(int)
+    frac = pos - lower
+    lower = lower % nbins
+    counts = (numpy.bincount(lower, 1. - frac, nbins) +
+              numpy.bincount((lower + 1) % nbins, frac, nbins))
+
+    pdf = numpy.fft.irfft(numpy.fft.rfft(counts/norm)*kernel, nbins)
+    pdf = pdf[(numpy.arange(len(grid))*refine) % nbins]
+    return numpy.maximum(pdf, 0.)
 
 def circularKDE(parameters, kdeStep=pi/16.):
     """
@@ -26,7 +71,10 @@ def circularKDE(parameters, kdeStep=pi/16.):
     e.g. bearings. Returns the grid on which the PDF is defined, the
     PDF itself and the corresponding CDF.
 
-    By default, the grid is specified on [0,2\*pi)
+    By default, the grid is specified on [0,2\*pi). Where the grid
+    divides the circle into a whole number of steps, the kernels are
+    summed by FFT circular convolution of the binned data; otherwise
+    they are evaluated directly.
 
     :param parameters: :class:`numpy.ndarray` of parameter values.
     :param float kdeStep: Increment of the ordinate at which the
@@ -37,14 +85,13 @@ def circularKDE(parameters, kdeStep=pi/16.):
     """
     bw = KPDF.UPDFOptimumBandwidth(parameters)
     grid = numpy.arange(0, 2*pi+kdeStep, kdeStep)
-    pdf = numpy.empty(len(grid), 'float')
-    chi = 1./(2*pi*i0(bw))
-    for k in parameters:
-        kH = chi*numpy.exp(bw*numpy.cos(grid-k))
-        pdf += kH/kH.sum()
+    pdf = _periodicPDF(parameters, bw, grid, kdeStep)
+    if pdf is None:
+        kH = _vonMises(bw, grid[numpy.newaxis, :] -
+                       numpy.asarray(parameters, 'd').reshape(-1, 1))
+        pdf = (kH/kH.sum(axis=1)[:, numpy.newaxis]).sum(axis=0)
 
     pdf = pdf/len(pdf)
     cy = stats.cdf(grid, pdf)
 
     return grid, pdf, cy
-
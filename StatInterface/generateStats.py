@@ -34,10 +34,12 @@ def acf(p, nlags=1):
     :type p: 1-d :class:`numpy.ndarray`
     
     """
-    ar = np.correlate(p, p, 'full')
     n = len(p)
-    # Grab only the lag-one autocorrelation coeff.
-    ar = ar[n-1:(n+nlags)]/ar.max()
+    # Only the first nlags lags are required, so calculate these
+    # directly rather than the full correlation:
+    ar = np.array([np.dot(p[:n-k], p[k:])
+                   for k in range(min(nlags, n-1) + 1)])
+    ar = ar/ar[0]
     return ar
     
 
@@ -129,6 +131,7 @@ class GenerateStats:
         self.missingValue = missingValue
 
         self.domain_warning_raised = False
+        self.index = None
 
         self.progressbar = progressbar
         self.prgStartValue = prgStartValue
@@ -157,14 +160,26 @@ class GenerateStats:
         prgEndValue = self.prgEndValue
 
         self.logger.debug('Calculating statistics for %i cells' % self.maxCell)
-        for i in range(self.maxCell + 1):
-            self.coeffs.mu[i], self.coeffs.sig[i], self.coeffs.alpha[i], \
-            self.coeffs.phi[i],self.coeffs.min[i] = self.calculate(i,False)
-            self.coeffs.lmu[i], self.coeffs.lsig[i], self.coeffs.lalpha[i], \
-            self.coeffs.lphi[i], self.coeffs.lmin[i] = self.calculate(i,True)
-            if np.mod(i, 10) == 0:  # Periodically update progress bar
+        names = {False: ['mu', 'sig', 'alpha', 'phi', 'min'],
+                 True: ['lmu', 'lsig', 'lalpha', 'lphi', 'lmin']}
+        remaining = []
+        for onLand in [False, True]:
+            values, done = self.calculateGrouped(onLand)
+            for name, value in zip(names[onLand], values):
+                getattr(self.coeffs, name)[done] = value[done]
+            remaining.extend([(i, onLand) for i in np.flatnonzero(~done)])
+
+        # Cells with too few (or identical) observations are expanded
+        # until there are sufficient observations:
+        self.logger.debug('Expanding %i cells with insufficient observations' %
+                          len(remaining))
+        for n, (i, onLand) in enumerate(remaining):
+            values = self.calculate(i, onLand)
+            for name, value in zip(names[onLand], values):
+                getattr(self.coeffs, name)[i] = value
+            if np.mod(n, 10) == 0:  # Periodically update progress bar
                 if progressbar is not None:
-                    progressbar.update((i+1)/float(self.maxCell+1), prgStartValue, prgEndValue)
+                    progressbar.update((n+1)/float(len(remaining)), prgStartValue, prgEndValue)
         if progressbar is not None:
             progressbar.update(1.0, prgStartValue, prgEndValue)
         self.logger.debug('Finished calculating statistics')
@@ -242,18 +257,143 @@ class GenerateStats:
             mu = np.mean(p)
             sig = np.std(p)
 
-        # Calculate the autocorrelations:
-        alphas = np.correlate(p, p, 'full')
-        n = len(p)
-
         # Grab only the lag-one autocorrelation coeff.
-        alpha = alphas[n]/alphas.max()
         alpha = acf(p)[-1]
         phi = np.sqrt(1 - alpha**2)
         mn = min(p)
 
         return mu, sig, alpha, phi, mn
 
+    def groupObservations(self, onLand):
+        """
+        Assign the valid observations over water (or land) to the grid
+        cells, using the same bounds as :meth:`extractParameter`.
+
+        :param boolean onLand: If ``True``, group the observations
+                               over land, otherwise those over water.
+
+        :returns: the cell number and index of each observation in a
+                  cell, sorted by cell number (observations in the same
+                  cell remain in their original order), and a boolean
+                  array flagging the cells whose observations could not
+                  be determined by binning (where the bounds of
+                  adjacent cells overlap due to rounding).
+
+        """
+        lon = self.lonLat[:,0]
+        lat = self.lonLat[:,1]
+        lsflag = self.lonLat[:,2]
+        param = np.asarray(self.param)
+        valid = (param != self.missingValue) & (param < sys.maxint)
+        if onLand:
+            valid &= (lsflag > 0)
+        else:
+            valid &= (lsflag == 0)
+
+        # Bounds of each column and row of cells (see stats.getCellLonLat):
+        west = np.arange(self.gridLimit['xMin'], self.gridLimit['xMax'],
+                         self.gridSpace['x'])
+        north = np.arange(self.gridLimit['yMax'], self.gridLimit['yMin'],
+                          -self.gridSpace['y'])
+        east = west + self.gridSpace['x']
+        south = north - self.gridSpace['y']
+        nx, ny = len(west), len(north)
+
+        obs = np.flatnonzero(valid)
+        ix = np.searchsorted(west, lon[obs], 'right') - 1
+        iy = ny - np.searchsorted(south[::-1], lat[obs], 'right')
+        inside = (ix >= 0) & (iy < ny)
+        inside[inside] = ((lon[obs][inside] < east[ix[inside]]) &
+                          (lat[obs][inside] < north[iy[inside]]))
+        obs = obs[inside]
+        cells = iy[inside]*nx + ix[inside]
+        order = np.argsort(cells, kind='mergesort')
+
+        # Observations in the overlap of two cells are only assigned
+        # to one of them, so the other must be handled separately:
+        irregular = np.zeros((ny, nx), dtype=bool)
+        irregular[:, :-1] |= (east[:-1] > west[1:])
+        irregular[1:, :] |= (south[:-1] < north[1:])[:, np.newaxis]
+
+        return cells[order], obs[order], irregular.flatten()
+
+    def calculateGrouped(self, onLand):
+        """
+        Calculate the statistics (see :meth:`calculate`) of all cells
+        that contain sufficient observations at once, by grouping the
+        observations by cell.
+
+        :param boolean onLand: If ``True``, then calculate the
+                               statistics of the observations over
+                               land, otherwise over water.
+
+        :returns: arrays of the mean, standard deviation,
+                  autocorrelation, residual correlation and the minimum
+                  parameter value of each cell, and a boolean array
+                  flagging the cells that were calculated. The
+                  remaining cells have too few observations, or
+                  identical values, and must be expanded.
+
+        """
+        ncells = self.maxCell + 1
+        cells, obs, irregular = self.groupObservations(onLand)
+        p = np.asarray(self.param)[obs].astype(float)
+
+        n = np.bincount(cells, minlength=ncells)
+        count = np.maximum(n, 1)
+        nonempty = np.flatnonzero(n)
+        starts = np.concatenate(([0], np.cumsum(n)[:-1]))[nonempty]
+
+        mn = np.zeros(ncells)
+        mx = np.zeros(ncells)
+        if len(p) > 0:
+            mn[nonempty] = np.minimum.reduceat(p, starts)
+            mx[nonempty] = np.maximum.reduceat(p, starts)
+
+        done = (n > self.minSample) & (mx > mn) & ~irregular
+
+        if self.angular:
+            ang = np.radians(p)
+            c = np.bincount(cells, np.cos(ang), ncells)/count
+            s = np.bincount(cells, np.sin(ang), ncells)/count
+            mu = np.arctan2(s, c)
+            mu = np.where(mu < 0, mu + 2*np.pi, mu)
+            sig = np.sqrt(1 - np.hypot(c, s))
+        else:
+            mu = np.bincount(cells, p, ncells)/count
+            anom = p - mu[cells]
+            sig = np.sqrt(np.bincount(cells, anom*anom, ncells)/count)
+
+        # Lag-one autocorrelation, from the products of consecutive
+        # observations in the same cell:
+        same = cells[1:] == cells[:-1]
+        lag1 = np.bincount(cells[1:][same], (p[1:]*p[:-1])[same], ncells)
+        lag0 = np.bincount(cells, p*p, ncells)
+        alpha = np.zeros(ncells)
+        alpha[done] = lag1[done]/lag0[done]
+        phi = np.sqrt(1 - alpha**2)
+
+        return (mu, sig, alpha, phi, mn), done
+
+    def buildIndex(self):
+        """
+        Build the spatial indices (see :class:`Utilities.stats.CellIndex`)
+        of the valid observations over water and over land, so the
+        observations of each (expanded) cell are extracted without
+        scanning all the observations.
+
+        """
+        lon = self.lonLat[:,0]
+        lat = self.lonLat[:,1]
+        lsflag = self.lonLat[:,2]
+        param = np.asarray(self.param)
+        valid = (param != self.missingValue) & (param < sys.maxint)
+        self.index = {}
+        for onLand, mask in [(False, lsflag == 0), (True, lsflag > 0)]:
+            self.index[onLand] = stats.CellIndex(lon, lat, self.gridLimit,
+                                                 self.gridSpace,
+                                                 valid & mask)
+
     def extractParameter(self, cellNum, onLand):
         """
         Extracts the cyclone parameter data for the given cell.
@@ -261,7 +401,8 @@ class GenerateStats:
         PDF, the bounds of the cell are expanded until the population is
         sufficient.
 
-        Null/missing values are removed.
+        Null/missing values are removed. The observations are extracted
+        with the spatial index built by :meth:`buildIndex`.
 
         :param int cellNum: The cell number to process.
         :returns: None. The :attr:`parameter` attribute is updated.
@@ -283,19 +424,11 @@ class GenerateStats:
 
         lon = self.lonLat[:,0]
         lat = self.lonLat[:,1]
-        lsflag = self.lonLat[:,2]
-
-        if onLand:
-            ij = np.where(((lat >= sLat) & (lat < nLat)) &
-                       (lon >= wLon) & (lon < eLon) & (lsflag>0))
-        else:
-            ij = np.where(((lat >= sLat) & (lat < nLat)) &
-                       (lon >= wLon) & (lon < eLon) & (lsflag==0))
-
-        p_ = self.param[ij]
-        p = stats.statRemoveNum(np.array(p_), self.missingValue)
+        if self.index is None:
+            self.buildIndex()
+        index = self.index[bool(onLand)]
 
-        while np.size(p) <= self.minSample:
+        while index.count(wLon, eLon, sLat, nLat) <= self.minSample:
             wLon_last = wLon
             eLon_last = eLon
             nLat_last = nLat
@@ -316,14 +449,8 @@ class GenerateStats:
                     self.logger.critical(errMsg)
                     raise StopIteration, errMsg
 
-            if onLand:
-                ij = np.where(((lat >= sLat) & (lat < nLat)) & (lon >= wLon) &
-                           (lon < eLon) & (lsflag>0))
-            else:
-                ij = np.where(((lat >= sLat) & (lat < nLat)) & (lon >= wLon) &
-                           (lon < eLon) & (lsflag==0))
-            p_ = self.param[ij]
-            p = stats.statRemoveNum(np.array(p_), self.missingValue)
+        p = self.param[index.query(wLon, eLon, sLat, nLat)]
+
 
         # Check to see if all values in the np.array are the same. If the values
         # are the same, bandwidth would be 0, and therefore KDE cannot be generated
@@ -345,15 +472,7 @@ class GenerateStats:
                     errMsg = "Insufficient grid points in selected domain to estimate storm statistics - please select a larger domain."
                     self.logger.critical(errMsg)
                     raise StopIteration, errMsg
-            if onLand:
-                ij = np.where(((lat >= sLat) & (lat < nLat)) &
-                           (lon >= wLon) & (lon < eLon) & (lsflag>0))
-            else:
-                ij = np.where(((lat >= sLat) & (lat < nLat)) &
-                           (lon >= wLon) & (lon < eLon) & (lsflag==0))
-
-            p_ = self.param[ij]
-            p = stats.statRemoveNum(np.array(p_), self.missingValue)
+            p = self.param[index.query(wLon, eLon, sLat, nLat)]
         return p
 
     def _expandCell(self, lon, lat, wLon, eLon, nLat, sLat):
@@ -28,6 +28,8 @@ import sys
 import logging as log
 import math
 import itertools
+import functools
+import multiprocessing
 import numpy as np
 
 from datetime import datetime, timedelta
@@ -40,53 +42,259 @@ import Utilities.Cstats as Cstats
 import Utilities.maputils as maputils
 import Utilities.metutils as metutils
 import Utilities.tcrandom as random
+import Utilities.trackCatalogue as trackCatalogue
 from os.path import join as pjoin
 from netCDF4 import Dataset as netcdf_file
 from scipy.ndimage.interpolation import spline_filter
 
 from StatInterface.generateStats import GenerateStats
-from StatInterface.SamplingOrigin import SamplingOrigin
-from Utilities.files import flLoadFile, flSaveFile
+from StatInterface.SamplingOrigin import SamplingOrigin, transitProbability
+from Utilities.files import flLoadFile, flSaveFile, flGetStat
 
 from DataProcess.CalcFrequency import CalcFrequency
 from DataProcess.CalcTrackDomain import CalcTrackDomain
 from Utilities.config import ConfigParser
 from Utilities.interp3d import interp3d
 from Utilities.parallel import attemptParallel
+from Utilities.AsyncRun import getWriter, flushWriter
 
 class SamplePressure(object):
     """
     Provide a method to get a 3-d interpolated mean sea level
     pressure at a given location
 
+    With the default spline interpolation, the spline coefficients of
+    the MSLP data are stored in a cache file next to the MSLP file
+    (named with the md5sum of the MSLP file), so the spline filter is
+    only calculated once for a given MSLP file. If the cache file
+    cannot be written, the coefficients are calculated each time.
+
     :param str mslp_file: path to a 3-d (time, lat, lon) MSLP
                           netcdf file.
     :param str var: Variable name (assumed 'slp')
-    
+    :param str interpolation: 'spline' (cubic spline interpolation) or
+                              'linear' (trilinear interpolation, which
+                              is faster and requires no spline
+                              coefficients).
+    :param bool cache: If `True`, load (or save) the spline coefficients
+                       from (or to) the cache file.
+
     """
-    def __init__(self, mslp_file, var='slp'):
+    def __init__(self, mslp_file, var='slp', interpolation='spline',
+                 cache=True):
         ncobj = nctools.ncLoadFile(mslp_file)
         data = nctools.ncGetData(ncobj, var)
         slpunits = getattr(ncobj.variables[var],'units')
+        ncobj.close()
 
         data = metutils.convert(data, slpunits, 'hPa')
-        self.data = spline_filter(data)
-        
+
+        if interpolation == 'linear':
+            self.order = 1
+            self.data = data
+        elif interpolation == 'spline':
+            self.order = 3
+            self.data = None
+            if cache:
+                cacheFile = self.cacheFile(mslp_file, var)
+                self.data = self.loadCache(cacheFile, data.shape)
+            if self.data is None:
+                self.data = spline_filter(data)
+                if cache:
+                    self.saveCache(cacheFile, self.data)
+        else:
+            raise ValueError("Unknown MSLP interpolation: %s" %
+                             interpolation)
+
+    @staticmethod
+    def cacheFile(mslp_file, var='slp'):
+        """
+        Name of the cache file for the spline coefficients of an MSLP
+        file. The name includes the md5sum of the MSLP file, so a
+        modified MSLP file does not use out of date coefficients.
+
+        :param str mslp_file: path to the MSLP file.
+        :param str var: Variable name.
+
+        :rtype: str
+        :return: path to the cache file.
+
+        """
+        md5sum = flGetStat(mslp_file)[2]
+        return '%s.%s.%s.npy' % (os.path.splitext(mslp_file)[0], var,
+                                 md5sum)
+
+    @staticmethod
+    def loadCache(cacheFile, shape):
+        """
+        Load spline coefficients from a cache file.
+
+        :param str cacheFile: path to the cache file.
+        :param tuple shape: expected shape of the coefficients.
+
+        :return: the spline coefficients, or `None` if the cache file
+                 does not exist or is not valid.
+
+        """
+        if not os.path.isfile(cacheFile):
+            return None
+        try:
+            data = np.load(cacheFile)
+        except (IOError, ValueError):
+            log.warning('Cannot read MSLP cache file %s', cacheFile)
+            return None
+        if data.shape != shape:
+            log.warning('MSLP cache file %s does not match the MSLP data',
+                        cacheFile)
+            return None
+        log.debug('Loaded MSLP spline coefficients from %s', cacheFile)
+        return data
+
+    @staticmethod
+    def saveCache(cacheFile, data):
+        """
+        Save spline coefficients to a cache file. The coefficients are
+        written to a temporary file which is then renamed, so other
+        processors never read a partially written file.
+
+        :param str cacheFile: path to the cache file.
+        :param data: the spline coefficients.
+
+        """
+        tmpFile = '%s.%d.tmp' % (cacheFile, os.getpid())
+        try:
+            with open(tmpFile, 'wb') as fh:
+                np.save(fh, data)
+            os.rename(tmpFile, cacheFile)
+            log.debug('Saved MSLP spline coefficients to %s', cacheFile)
+        except (IOError, OSError):
+            log.warning('Cannot write MSLP cache file %s', cacheFile)
+            if os.path.exists(tmpFile):
+                os.remove(tmpFile)
+
     def get_pressure(self, coords):
         """
         Interpolate daily long term mean sea level pressure at
-        the given coordinates.
+        the given coordinates. All points are interpolated in a single
+        call, e.g. the positions of many tropical cyclones.
 
-        :param list coords: [day of year, latitude, longitude]
-        :rtype: float
-        :return: long term MSLP
+        :param coords: [day of year, latitude, longitude] -- each
+                       may be an array of values.
+        :type  coords: list or :class:`numpy.ndarray`
+        :rtype: :class:`numpy.ndarray`
+        :return: long term MSLP (same shape as each of the
+                 coordinates)
 
         """
-        
+
+        coords = np.asarray(coords, dtype=float)
+        shape = coords.shape[1:]
         scale = [365., 180., 360.]
         offset = [0., -90., 0.]
-        mslp = interp3d(self.data, coords, scale, offset, prefilter=False)
-        return mslp
+        mslp = interp3d(self.data, coords.reshape((3, -1)), scale, offset,
+                        prefilter=False, order=self.order)
+        return mslp.reshape(shape)
+
+class CellCDF(object):
+    """
+    Empirical CDFs of a parameter for all cells of the domain.
+
+    The rows of the table are sorted by cell number when the CDFs are
+    loaded, and the first and last rows of each cell are stored (a
+    CSR-style index). The CDF of a cell is then a slice of the table,
+    rather than a search of the full table, and the CDFs of many
+    (different) cells can be searched in a single call.
+
+    :type  table: :class:`numpy.ndarray`
+    :param table: the CDFs of all cells, with columns of cell number,
+                  value and CDF (as loaded by
+                  :meth:`TrackGenerator.loadInitialConditionDistributions`).
+    """
+
+    def __init__(self, table):
+        table = np.asarray(table, dtype=float)
+        order = np.argsort(table[:, 0], kind='mergesort')
+        self.table = table[order]
+        cells = self.table[:, 0].astype(int)
+        ncells = cells.max() + 1 if len(cells) > 0 else 0
+        self.start = cells.searchsorted(np.arange(ncells), 'left')
+        self.stop = cells.searchsorted(np.arange(ncells), 'right')
+
+        # Offsets that place the values (and CDFs) of each cell in a
+        # separate, increasing range, so all cells can be searched at
+        # once:
+        self.bounds = []
+        for column in [1, 2]:
+            lo = self.table[:, column].min() if len(cells) > 0 else 0.
+            hi = self.table[:, column].max() if len(cells) > 0 else 0.
+            stride = hi - lo + 1.
+            keys = cells * stride + (self.table[:, column] - lo)
+            self.bounds.append((lo, hi, stride, keys))
+
+    def cdf(self, cellNum):
+        """
+        The empirical CDF of a cell.
+
+        :type  cellNum: int
+        :param cellNum: the cell number.
+
+        :rtype: :class:`numpy.ndarray`
+        :return: the values and CDF of the cell.
+        """
+        if cellNum < 0 or cellNum >= len(self.start):
+            return self.table[0:0, 1:3]
+        return self.table[self.start[cellNum]:self.stop[cellNum], 1:3]
+
+    def searchsorted(self, cellNums, values, column=1):
+        """
+        Find the indices into the CDF of each cell where the values
+        would be inserted to maintain order (as for
+        :meth:`numpy.ndarray.searchsorted` on the CDF of each cell).
+
+        :type  cellNums: :class:`numpy.ndarray`
+        :param cellNums: the cell number of each value.
+
+        :type  values: :class:`numpy.ndarray`
+        :param values: the values to search for.
+
+        :type  column: int
+        :param column: 1 to search the values of the parameter, or 2
+                       to search the CDF.
+
+        :rtype: :class:`numpy.ndarray`
+        :return: the indices into the CDF of each cell.
+        """
+        cellNums = np.asarray(cellNums, dtype=int)
+        lo, hi, stride, keys = self.bounds[column - 1]
+        values = np.clip(values, lo, hi + 0.5)
+        index = keys.searchsorted(cellNums * stride + (values - lo))
+        return index - self.start[cellNums]
+
+    def ppf(self, q, cellNums):
+        """
+        Percentage point function of the empirical CDF of each cell.
+        This is the equivalent of :func:`ppf` applied to the CDF of
+        each cell.
+
+        :type  q: :class:`numpy.ndarray`
+        :param q: the quantiles.
+
+        :type  cellNums: :class:`numpy.ndarray`
+        :param cellNums: the cell number of each quantile.
+
+        :rtype: :class:`numpy.ndarray`
+        :return: the values of the parameter at the quantiles.
+
+        :raises IndexError: if there is no CDF for a cell.
+        """
+        cellNums = np.asarray(cellNums, dtype=int)
+        count = self.stop[cellNums] - self.start[cellNums]
+        if np.any(count == 0):
+            raise IndexError('No CDF for cells %s' %
+                             np.unique(cellNums[count == 0]))
+        i = np.minimum(self.searchsorted(cellNums, q, column=2), count - 1)
+        return self.table[self.start[cellNums] + i, 1]
+
 
 class TrackGenerator(object):
 
@@ -135,6 +343,22 @@ class TrackGenerator(object):
                            longitude and the *y* variable bounds the
                            latitude.
 
+    :type  cullRegion: :class:`dict`
+    :param cullRegion: an optional region (e.g. the wind field domain)
+                       used to cull tropical cyclone tracks that never
+                       pass through it, in the same form as
+                       `innerGridLimit`. The number of tracks culled by
+                       the last call to :meth:`generateTracks` (or for
+                       each simulation by :meth:`generateEnsemble`) is
+                       stored in :attr:`nCulled`.
+
+    If the sampling of the genesis points has been biased (see
+    :meth:`SamplingOrigin.setImportance`), each track is weighted by
+    the likelihood ratio of its genesis point. The weights of the
+    tracks generated by the last call to :meth:`generateTracks` (or for
+    each simulation by :meth:`generateEnsemble`) are stored in
+    :attr:`weight`, in the order of the tracks.
+
     :type  dt: float
     :param dt: the time step used the the track simulation.
 
@@ -160,7 +384,7 @@ class TrackGenerator(object):
 
     def __init__(self, processPath, gridLimit, gridSpace, gridInc, mslp,
                  landfall, innerGridLimit=None, dt=1.0, maxTimeSteps=360,
-                 sizeMean=57.0, sizeStdDev=0.6):
+                 sizeMean=57.0, sizeStdDev=0.6, cullRegion=None):
         self.processPath = processPath
         self.gridLimit = gridLimit
         self.gridSpace = gridSpace
@@ -168,6 +392,9 @@ class TrackGenerator(object):
         self.mslp = mslp
         self.landfall = landfall
         self.innerGridLimit = innerGridLimit
+        self.cullRegion = cullRegion
+        self.nCulled = 0
+        self.weight = np.array([])
         self.dt = dt
         self.maxTimeSteps = maxTimeSteps
         self.sizeMean = sizeMean
@@ -184,6 +411,7 @@ class TrackGenerator(object):
         self.pStats = None
         self.bStats = None
         self.dpStats = None
+        self.dsStats = None
 
         self.dpChi = None
         self.dsChi = None
@@ -235,7 +463,7 @@ class TrackGenerator(object):
                 x = ncdf.variables['x'][:]
                 y = ncdf.variables['CDF'][:]
                 ncdf.close()
-                return np.vstack((i, x, y)).T
+                return CellCDF(np.vstack((i, x, y)).T)
 
             # otherwise, revert to old csv format
 
@@ -243,7 +471,7 @@ class TrackGenerator(object):
                      filename)
 
             try:
-                return flLoadFile(filename, '%', ',')
+                return CellCDF(flLoadFile(filename, '%', ','))
             except IOError:
                 log.critical('CDF file %s does not exist!',
                              filename)
@@ -328,7 +556,7 @@ class TrackGenerator(object):
     def generateTracks(self, nTracks, initLon=None, initLat=None,
                        initSpeed=None, initBearing=None,
                        initPressure=None, initEnvPressure=None,
-                       initRmax=None, initDay=None):
+                       initRmax=None, initDay=None, strata=None):
         """
         Generate tropical cyclone tracks from a single genesis point.
 
@@ -372,6 +600,12 @@ class TrackGenerator(object):
         :param initRmax: the initial maximum radius of the tropical
                          cyclone.
 
+        :type  strata: tuple
+        :param strata: optional lower bounds and widths of the strata
+                       of the genesis longitude, genesis latitude and
+                       initial pressure quantiles of each track, as
+                       returned by :func:`stratifiedQuantiles`.
+
         :rtype :class:`numpy.array`
         :return: the tracks generated.
         """
@@ -379,13 +613,18 @@ class TrackGenerator(object):
         log.debug('Generating %d tropical cyclone tracks', nTracks)
         genesisYear = int(uniform(1900,9998))
         results = []
+        ratio = np.ones(nTracks + 1)
         for j in range(1, nTracks + 1):
 
             if not (initLon and initLat):
                 log.debug('Cyclone origin not given, sampling a' +
                           ' random one instead.')
-                genesisLon, genesisLat = \
-                    self.originSampler.ppf(uniform(), uniform())
+                qx, qy = uniform(), uniform()
+                if strata is not None:
+                    qx, qy = strata[0][j - 1, :2] + \
+                        strata[1][j - 1, :2] * (qx, qy)
+                genesisLon, genesisLat = self.originSampler.ppf(qx, qy)
+                ratio[j] = self.originSampler.weights(genesisLon, genesisLat)
             else:
                 log.debug('Using prescribed initial position' +
                           ' (%6.2f, %6.2f)'.format(initLon, initLat))
@@ -405,8 +644,7 @@ class TrackGenerator(object):
             # Sample an initial bearing if none is provided
 
             if not initBearing:
-                ind = self.allCDFInitBearing[:, 0] == initCellNum
-                cdfInitBearing = self.allCDFInitBearing[ind, 1:3]
+                cdfInitBearing = self.allCDFInitBearing.cdf(initCellNum)
                 genesisBearing = ppf(uniform(), cdfInitBearing)
             else:
                 genesisBearing = initBearing
@@ -414,8 +652,7 @@ class TrackGenerator(object):
             # Sample an initial speed if none is provided
 
             if not initSpeed:
-                ind = self.allCDFInitSpeed[:, 0] == initCellNum
-                cdfInitSpeed = self.allCDFInitSpeed[ind, 1:3]
+                cdfInitSpeed = self.allCDFInitSpeed.cdf(initCellNum)
                 genesisSpeed = ppf(uniform(), cdfInitSpeed)
             else:
                 genesisSpeed = initSpeed
@@ -423,11 +660,10 @@ class TrackGenerator(object):
             # Sample an initial maximum radius if none is provided
 
             if not initRmax:
-                if not self.allCDFInitSize:
+                if self.allCDFInitSize is None:
                     cdfSize = self.cdfSize[:, [0, 2]]
                 else:
-                    ind = self.allCDFInitSize[:, 0] == initCellNum
-                    cdfSize = self.allCDFInitSize[ind, 1:3]
+                    cdfSize = self.allCDFInitSize.cdf(initCellNum)
                 genesisRmax = ppf(uniform(), cdfSize)
             else:
                 genesisRmax = initRmax
@@ -435,8 +671,7 @@ class TrackGenerator(object):
             # Sample an initial day if none is provided
 
             if not initDay:
-                ind = self.allCDFInitDay[:,0] == initCellNum
-                cdfInitDay = self.allCDFInitDay[ind, 1:3]
+                cdfInitDay = self.allCDFInitDay.cdf(initCellNum)
                 genesisDay = ppf(uniform(), cdfInitDay)
             else:
                 genesisDay = initDay
@@ -459,12 +694,13 @@ class TrackGenerator(object):
             if not initPressure:
                 # Sample subject to the constraint initPressure <
                 # initEnvPressure
-                ind = self.allCDFInitPressure[:, 0] == initCellNum
-                cdfInitPressure = self.allCDFInitPressure[ind, 1:3]
+                cdfInitPressure = self.allCDFInitPressure.cdf(initCellNum)
                 ix = cdfInitPressure[:, 0].searchsorted(initEnvPressure)
                 upperProb = cdfInitPressure[ix - 1, 1]
-                genesisPressure = ppf(uniform(0.0, upperProb),
-                                      cdfInitPressure)
+                qp = uniform()
+                if strata is not None:
+                    qp = strata[0][j - 1, 2] + strata[1][j - 1, 2] * qp
+                genesisPressure = ppf(upperProb * qp, cdfInitPressure)
             else:
                 genesisPressure = initPressure
                                                        
@@ -532,6 +768,17 @@ class TrackGenerator(object):
                       for k in range(len(lon))]
             return all(inside)
 
+        def passesRegion(track):
+            """
+            :return: True if the track passes through the region used
+            to cull the tracks. False, otherwise.
+            """
+            index, dates, age, lon, lat, speed, bearing, P, penv, rmax = track
+            return np.any((self.cullRegion['xMin'] <= lon) &
+                          (lon <= self.cullRegion['xMax']) &
+                          (self.cullRegion['yMin'] <= lat) &
+                          (lat <= self.cullRegion['yMax']))
+
         def validPressures(track):
             """
             :return: True if a valid pressure. False, otherwise.
@@ -560,15 +807,355 @@ class TrackGenerator(object):
             log.debug('Removed %i tracks that do not pass inside' +
                       ' domain.', nbefore - len(results))
 
+        self.nCulled = 0
+        if self.cullRegion:
+            nbefore = len(results)
+            results = [track for track in results if passesRegion(track)]
+            self.nCulled = nbefore - len(results)
+            log.debug('Removed %i tracks that do not pass through' +
+                      ' the region.', self.nCulled)
+
+        # The likelihood ratio of the genesis point of each track:
+        self.weight = np.array([ratio[int(track[0][0])] for track in results])
+
         # Return the tracks as a stacked array
         
-        if len(results) > 1:
+        if len(results) > 0:
             return np.hstack([np.vstack(r) for r in results]).T
         else:
             return np.array(results).T
             
         return results
         
+    def generateEnsemble(self, sims):
+        """
+        Generate the tropical cyclone tracks for a block of simulations
+        at once.
+
+        Rather than generating one track at a time (see
+        :meth:`generateTracks`), the genesis conditions of all tracks
+        in the block are sampled together, and all tracks are then
+        advanced through each time step as arrays. Tracks are retired
+        as they leave the domain or decay, and the simulation stops
+        once all tracks have terminated.
+
+        Each simulation draws its random values from its own
+        :class:`numpy.random.RandomState` (see
+        :func:`Utilities.tcrandom.simulationState`), so the tracks of a
+        simulation do not depend on the other simulations in the
+        block. If the simulations have been stratified (see
+        :func:`stratifySimulations`), the genesis position and initial
+        pressure quantiles are drawn from the strata of each track.
+
+        :type  sims: list
+        :param sims: the :class:`Simulation` objects to generate.
+
+        :rtype: list
+        :return: the tracks generated for each simulation, in the
+                 same form as returned by :meth:`generateTracks`.
+        """
+
+        nsteps = self.maxTimeSteps
+        dt = self.dt
+
+        # Draw the random values for each simulation. Random values are
+        # drawn for every time step (whether or not a track lasts that
+        # long), so each track uses a fixed part of the stream.
+
+        owner, number, gyear, genesis, lrvs, nrvs = [], [], [], [], [], []
+        for k, sim in enumerate(sims):
+            rng = random.simulationState(sim.seed, sim.index)
+            gyear.append(int(rng.uniform(1900, 9998)))
+            owner.append(k * np.ones(sim.ntracks, dtype=int))
+            number.append(np.arange(1, sim.ntracks + 1))
+            quantiles = rng.random_sample((sim.ntracks, 8))
+            if sim.strata is not None:
+                # Genesis longitude, latitude and initial pressure:
+                lower, width = sim.strata
+                quantiles[:, [0, 1, 7]] = lower + width * \
+                    quantiles[:, [0, 1, 7]]
+            genesis.append(quantiles)
+            lrvs.append(rng.logistic(size=(sim.ntracks, nsteps, 4))
+                        .astype('f'))
+            nrvs.append(rng.standard_normal((sim.ntracks, nsteps))
+                        .astype('f'))
+
+        results = [[] for sim in sims]
+        weights = [[] for sim in sims]
+        self.nCulled = np.zeros(len(sims), dtype=int)
+        self.weight = [np.array([]) for sim in sims]
+        if sum(sim.ntracks for sim in sims) == 0:
+            return [np.array([]) for sim in sims]
+        owner = np.concatenate(owner)
+
+        number = np.concatenate(number)
+        genesis = np.concatenate(genesis)
+        lrvs = np.concatenate(lrvs)
+        nrvs = np.concatenate(nrvs)
+
+        log.debug('Generating %d tropical cyclone tracks for %d simulations',
+                  len(owner), len(sims))
+
+        # Sample the genesis conditions of all tracks
+
+        glon, glat = self.originSampler.ppf(genesis[:, 0], genesis[:, 1])
+        ratio = self.originSampler.weights(glon, glat)
+        cell = stats.getCellNums(glon, glat, self.gridLimit, self.gridSpace)
+        keep = cell >= 0
+
+        gbearing = np.zeros(len(owner))
+        gspeed = np.zeros(len(owner))
+        grmax = np.zeros(len(owner))
+        gday = np.zeros(len(owner))
+        gpressure = np.zeros(len(owner))
+
+        c = cell[keep]
+        gbearing[keep] = self.allCDFInitBearing.ppf(genesis[keep, 2], c)
+        gspeed[keep] = self.allCDFInitSpeed.ppf(genesis[keep, 3], c)
+        if self.allCDFInitSize is None:
+            grmax[keep] = ppf(genesis[keep, 4], self.cdfSize[:, [0, 2]])
+        else:
+            grmax[keep] = self.allCDFInitSize.ppf(genesis[keep, 4], c)
+        gday[keep] = self.allCDFInitDay.ppf(genesis[keep, 5], c)
+
+        ghour = (24. * genesis[:, 6]).astype(int)
+        gpenv = self.mslp.get_pressure(np.array([gday, glat, glon]))
+
+        # Sample the initial pressure subject to the constraint
+        # initPressure < initEnvPressure
+
+        cdf = self.allCDFInitPressure
+        ix = cdf.searchsorted(c, gpenv[keep])
+        # As for the scalar sampling, an index of -1 refers to the last
+        # row of the CDF of the cell:
+        ix = np.where(ix == 0, cdf.stop[c] - cdf.start[c], ix)
+        upperProb = cdf.table[cdf.start[c] + ix - 1, 2]
+        gpressure[keep] = cdf.ppf(upperProb * genesis[keep, 7], c)
+
+        # Do not generate tracks that exit the domain on the first step
+
+        nextLon, nextLat = maputils.bear2LatLon(gbearing, dt * gspeed,
+                                                glon, glat)
+        keep &= ((self.gridLimit['xMin'] <= nextLon) &
+                 (nextLon <= self.gridLimit['xMax']) &
+                 (self.gridLimit['yMin'] <= nextLat) &
+                 (nextLat <= self.gridLimit['yMax']))
+
+        tracks = np.flatnonzero(keep)
+        ntracks = len(tracks)
+
+        lon = np.zeros((ntracks, nsteps), 'f')
+        lat = np.zeros((ntracks, nsteps), 'f')
+        speed = np.zeros((ntracks, nsteps), 'f')
+        bearing = np.zeros((ntracks, nsteps), 'f')
+        pressure = np.zeros((ntracks, nsteps), 'f')
+        penv = np.zeros((ntracks, nsteps), 'f')
+        rmax = np.zeros((ntracks, nsteps), 'f')
+        age = np.zeros((ntracks, nsteps), 'f')
+        length = nsteps * np.ones(ntracks, dtype=int)
+
+        lon[:, 0] = glon[tracks]
+        lat[:, 0] = glat[tracks]
+        speed[:, 0] = gspeed[tracks]
+        bearing[:, 0] = gbearing[tracks]
+        pressure[:, 0] = gpressure[tracks]
+        penv[:, 0] = gpenv[tracks]
+        rmax[:, 0] = grmax[tracks]
+
+        initTime = []
+        for t in tracks:
+            initTimeStr = "%04d-%03d %d:00" % (gyear[owner[t]], gday[t],
+                                               ghour[t])
+            initTime.append(datetime.strptime(initTimeStr, "%Y-%j %H:%M"))
+        jday = np.array([int(t.strftime("%j")) + t.hour/24.
+                         for t in initTime])
+
+        # Initialise the state of the AR(1) models
+
+        dist = dt * gspeed[tracks]
+        offshorePressure = gpressure[tracks]
+        theta = gbearing[tracks]
+        v = gspeed[tracks]
+        vChi = np.zeros(ntracks)
+        bChi = np.zeros(ntracks)
+        dpChi = np.zeros(ntracks)
+        dsChi = np.zeros(ntracks)
+        dp = np.zeros(ntracks)
+        ds = np.zeros(ntracks)
+        tol = np.zeros(ntracks)
+
+        lrvs = lrvs[tracks]
+        nrvs = nrvs[tracks]
+        pstat = self.pStats.coeffs
+
+        # Advance all active tracks through each time step
+
+        active = np.arange(ntracks)
+        for i in xrange(1, nsteps):
+
+            if len(active) == 0:
+                break
+
+            k = active
+
+            lon[k, i], lat[k, i] = maputils.bear2LatLon(bearing[k, i - 1],
+                                                        dist[k],
+                                                        lon[k, i - 1],
+                                                        lat[k, i - 1])
+            age[k, i] = age[k, i - 1] + dt
+            jday[k] = np.mod(jday[k] + dt/24., 365)
+
+            penv[k, i] = self.mslp.get_pressure(np.array([jday[k],
+                                                          lat[k, i],
+                                                          lon[k, i]]))
+
+            # Terminate tracks that step out of the domain
+
+            outside = ((lon[k, i] < self.gridLimit['xMin']) |
+                       (lon[k, i] >= self.gridLimit['xMax']) |
+                       (lat[k, i] <= self.gridLimit['yMin']) |
+                       (lat[k, i] > self.gridLimit['yMax']))
+            length[k[outside]] = i
+            k = k[~outside]
+
+            c = stats.getCellNums(lon[k, i], lat[k, i],
+                                  self.gridLimit, self.gridSpace)
+            onLand = self.landfall.landMask.onLand(lon[k, i], lat[k, i])
+
+            # Do the real work: generate a step of the model
+
+            dpChi[k], mu, sigma = self._stepEnsemble(
+                self.dpStats, c, onLand, dpChi[k], lrvs[k, i, 0])
+            if i == 1:
+                dp[k] += sigma * dpChi[k]
+            else:
+                dp[k] = mu + sigma * dpChi[k]
+
+            bChi[k], mu, sigma = self._stepEnsemble(
+                self.bStats, c, onLand, bChi[k], lrvs[k, i, 1])
+            if i == 1:
+                theta[k] += np.degrees(sigma * bChi[k])
+            else:
+                theta[k] = np.degrees(mu + sigma * bChi[k])
+            theta[k] = np.mod(theta[k], 360.)
+
+            vChi[k], mu, sigma = self._stepEnsemble(
+                self.vStats, c, onLand, vChi[k], lrvs[k, i, 2])
+            if i == 1:
+                v[k] += np.abs(sigma * vChi[k])
+            else:
+                v[k] = np.abs(mu + sigma * vChi[k])
+
+            # Update bearing, speed and pressure
+
+            bearing[k, i] = theta[k]
+            speed[k, i] = np.abs(v[k])
+
+            # Central pressure over land decays with the time over land:
+
+            tol[k] += np.where(onLand, dt, 0.)
+            deltaP = penv[k, i] - offshorePressure[k]
+            alpha = 0.008 + 0.0008 * deltaP + 0.001 * nrvs[k, i]
+            pland = penv[k, i] - deltaP * np.exp(-alpha * tol[k])
+
+            # If the central pressure of the synthetic storm is more
+            # than 4 std deviations lower than the minimum observed
+            # central pressure, automatically start raising the central
+            # pressure.
+
+            psea = pressure[k, i - 1] + dp[k] * dt
+            low = psea < (pstat.min[c] - 4. * pstat.sig[c])
+            psea[low] = pressure[k[low], i - 1] + np.abs(dp[k[low]]) * dt
+
+            pressure[k, i] = np.where(onLand, pland, psea)
+            offshorePressure[k] = np.where(onLand, offshorePressure[k],
+                                           psea)
+
+            # If the cell statistics of the tropical cyclone size change
+            # are loaded then sample and update the maximum radius.
+            # Otherwise, keep the maximum radius constant.
+
+            if self.dsStats is not None:
+                dsChi[k], mu, sigma = self._stepEnsemble(
+                    self.dsStats, c, onLand, dsChi[k], lrvs[k, i, 3])
+                if i == 1:
+                    ds[k] += sigma * dsChi[k]
+                else:
+                    ds[k] = mu + sigma * dsChi[k]
+                rmax[k, i] = rmax[k, i - 1] + ds[k] * dt
+                # if the radius goes below 1.0, then do an
+                # antithetic increment instead
+                small = rmax[k, i] <= 1.0
+                rmax[k[small], i] = (rmax[k[small], i - 1] -
+                                     ds[k[small]] * dt)
+            else:
+                rmax[k, i] = rmax[k, i - 1]
+
+            # Update the distance travelled in the next step
+
+            dist[k] = dt * speed[k, i]
+
+            # Terminate tracks that no longer satisfy the criteria
+
+            decayed = (age[k, i] > 12) & ((penv[k, i] - pressure[k, i]) < 5.0)
+            length[k[decayed]] = i
+            active = k[~decayed]
+
+        # Filter the generated tracks based on the same criteria as
+        # :meth:`generateTracks`
+
+        step = np.arange(nsteps)
+        valid = step < length[:, np.newaxis]
+
+        died = age[np.arange(ntracks), length - 1] < 12
+        invalidPressure = (valid & (np.round(pressure, 2) >=
+                                    np.round(penv, 2))).any(axis=1)
+        ok = ~died & ~invalidPressure
+        log.debug('Removed %i tracks that died early.', died.sum())
+        log.debug('Removed %i tracks that had incorrect pressures.',
+                  (~died & invalidPressure).sum())
+
+        if self.innerGridLimit:
+            inside = ((lon > self.innerGridLimit['xMin']) &
+                      (lon < self.innerGridLimit['xMax']) &
+                      (lat > self.innerGridLimit['yMin']) &
+                      (lat < self.innerGridLimit['yMax']))
+            outside = (valid & ~inside).any(axis=1)
+            log.debug('Removed %i tracks that do not pass inside' +
+                      ' domain.', (ok & outside).sum())
+            ok &= ~outside
+
+        if self.cullRegion:
+            region = ((self.cullRegion['xMin'] <= lon) &
+                      (lon <= self.cullRegion['xMax']) &
+                      (self.cullRegion['yMin'] <= lat) &
+                      (lat <= self.cullRegion['yMax']))
+            culled = ok & ~(valid & region).any(axis=1)
+            self.nCulled = np.bincount(owner[tracks[culled]],
+                                       minlength=len(sims))
+            log.debug('Removed %i tracks that do not pass through' +
+                      ' the region.', culled.sum())
+            ok &= ~culled
+
+        timestep = timedelta(dt/24.)
+        for n in np.flatnonzero(ok):
+            t = tracks[n]
+            m = length[n]
+            dates = np.array([initTime[n] + j * timestep for j in xrange(m)])
+            index = number[t] * np.ones(m, 'f')
+            results[owner[t]].append((index, dates, age[n, :m], lon[n, :m],
+                                      lat[n, :m], speed[n, :m],
+                                      bearing[n, :m], pressure[n, :m],
+                                      penv[n, :m], rmax[n, :m]))
+            weights[owner[t]].append(ratio[t])
+
+        self.weight = [np.array(w) for w in weights]
+
+        # Return the tracks of each simulation as a stacked array
+
+        return [np.hstack([np.vstack(r) for r in result]).T
+                if len(result) > 0 else np.array([]) for result in results]
+
     def generateTracksToFile(self, outputFile, nTracks, initLon=None,
                              initLat=None, initSpeed=None,
                              initBearing=None, initPressure=None,
@@ -579,6 +1166,8 @@ class TrackGenerator(object):
         and save the tracks to a file.
 
         This is a helper function that calls :meth:`generateTracks`.
+        The file is written in the background by the shared writer (see
+        :func:`Utilities.AsyncRun.getWriter`).
 
         :type  outputFile: str
         :param outputFile: the filename of the file where the tracks
@@ -597,7 +1186,6 @@ class TrackGenerator(object):
 
         if outputFile.endswith("shp"):
             from Utilities.shptools import shpSaveTrackFile
-            from Utilities.AsyncRun import AsyncRun
 
             log.debug('Outputting data into %s', outputFile)
 
@@ -673,11 +1261,7 @@ class TrackGenerator(object):
                 'fields': fields
             }
 
-            thr = AsyncRun(shpSaveTrackFile, args)
-            try:
-                thr.start()
-            except:
-                raise
+            getWriter().submit(shpSaveTrackFile, **args)
         else:
             log.debug('Outputting data into %s', outputFile)
 
@@ -694,8 +1278,7 @@ class TrackGenerator(object):
                 'fmt': '%7.2f'
             }
 
-            fl = AsyncRun(flSaveFile, args)
-            fl.start()
+            getWriter().submit(flSaveFile, **args)
 
     def _singleTrack(self, cycloneNumber, initLon, initLat, initSpeed,
                      initBearing, initPressure, initEnvPressure,
@@ -880,11 +1463,11 @@ class TrackGenerator(object):
 
                 self.offshorePressure = pressure[i]
 
-            # If the empirical distribution of tropical cyclone size is
-            # loaded then sample and update the maximum radius.
+            # If the cell statistics of the tropical cyclone size change
+            # are loaded then sample and update the maximum radius.
             # Otherwise, keep the maximum radius constant.
 
-            if self.allCDFInitSize:
+            if self.dsStats is not None:
                 self._stepSizeChange(cellNum, i, onLand)
                 rmax[i] = rmax[i - 1] + self.ds * self.dt
                 # if the radius goes below 1.0, then do an
@@ -1079,6 +1662,40 @@ class TrackGenerator(object):
         else:
             self.ds = mu[c] + sigma[c] * self.dsChi
 
+    def _stepEnsemble(self, cellStats, c, onLand, chi, rvs):
+        """
+        Take one step of an (inhomogeneous) AR(1) model for an array of
+        tropical cyclones. This is the array equivalent of the step
+        methods (e.g. :meth:`_stepSpeed`).
+
+        :type  cellStats: :class:`StatInterface.generateStats.GenerateStats`
+        :param cellStats: the cell statistics of the parameter.
+
+        :type  c: :class:`numpy.ndarray`
+        :param c: valid cell indices of the tropical cyclones.
+
+        :type  onLand: :class:`numpy.ndarray`
+        :param onLand: True where the tropical cyclone is currently
+                       over land.
+
+        :type  chi: :class:`numpy.ndarray`
+        :param chi: the current value of the AR(1) process.
+
+        :type  rvs: :class:`numpy.ndarray`
+        :param rvs: logistic random values for the step.
+
+        :return: the updated AR(1) process, and the mean and standard
+                 deviation of the parameter in each cell.
+        """
+
+        coeffs = cellStats.coeffs
+        alpha = np.where(onLand, coeffs.lalpha[c], coeffs.alpha[c])
+        phi = np.where(onLand, coeffs.lphi[c], coeffs.phi[c])
+        mu = np.where(onLand, coeffs.lmu[c], coeffs.mu[c])
+        sigma = np.where(onLand, coeffs.lsig[c], coeffs.sig[c])
+
+        return alpha * chi + phi * rvs, mu, sigma
+
     def _notValidTrackStep(self, pressure, penv, age, lon0, lat0,
                            nextlon, nextlat):
         """
@@ -1473,13 +2090,13 @@ class TrackGenerator(object):
                            dtype='f', writedata=True,
                            keepfileopen=False)
 
-# Define a global pseudo-random number generator. This is done to
-# ensure we are sampling correctly across processors when performing
-# the simulation in parallel. We use the inbuilt Python `random`
-# library as it provides the ability to `jumpahead` in the stream (as
-# opposed to `numpy.random`).
+# Define a global pseudo-random number generator. This is reset to the
+# stream of each simulation (keyed by the track seed and the simulation
+# index) before the tracks of the simulation are generated, so each
+# simulation gets the same random values on any processor and in any
+# order.
 
-PRNG = random.Random()
+PRNG = random.SimulationStream()
 
 
 def normal(mean=0.0, stddev=1.0):
@@ -1532,6 +2149,8 @@ class Simulation(object):
     Simulation parameters.
 
     This is used to set the PRNG state before `ntracks` are simulated.
+    The PRNG stream of the simulation is keyed by both `seed` and
+    `index`.
 
     :type  index: int
     :param index: the simulation index number.
@@ -1539,10 +2158,6 @@ class Simulation(object):
     :type  seed: int
     :param seed: the initial seed used for the PRNG.
 
-    :type  jumpahead: int
-    :param jumpahead: the amount to jump ahead from the initial seed in
-                      the PRNG stream.
-
     :type  ntracks: int
     :param ntracks: the number of tracks to be generated during the
                     simulation.
@@ -1551,15 +2166,308 @@ class Simulation(object):
     :param outfile: the filename where the tracks will be saved to.
     """
 
-    def __init__(self, index, seed, jumpahead, ntracks, outfile):
+    def __init__(self, index, seed, ntracks, outfile):
         self.index = index
         self.seed = seed
-        self.jumpahead = jumpahead
         self.ntracks = ntracks
         self.outfile = outfile
+        self.strata = None
+
+
+def stratifiedQuantiles(ntracks, method, rng):
+    """
+    Divide the genesis longitude, genesis latitude and initial pressure
+    quantiles of a set of tracks into strata, so the quantiles of the
+    set cover the unit interval more evenly than independent uniform
+    values. The quantile of each track is then drawn uniformly from its
+    stratum, i.e. `lower + width * u` with `u` uniform on [0, 1).
+
+    With the 'lhs' method, each quantile is divided into `ntracks`
+    strata of equal width, with each track in a different stratum and
+    the strata of the three quantiles randomly paired (a Latin
+    hypercube sample). With the 'stratified' method, the genesis
+    quantiles are divided jointly into a `k` by `k` grid of strata
+    (with `k * k <= ntracks`), with one track in each stratum and any
+    remaining tracks unstratified, and the initial pressure quantile
+    as for the 'lhs' method.
+
+    :param int ntracks: the number of tracks.
+    :param str method: the stratification method, 'lhs' or 'stratified'.
+    :param rng: :class:`numpy.random.RandomState` used to assign the
+                tracks to the strata.
+
+    :returns: the lower bounds and widths of the strata of each track
+              (`ntracks` by 3 :class:`numpy.ndarray` each).
+
+    :raises ValueError: if the method is not known.
+    """
+    if method not in ('lhs', 'stratified'):
+        raise ValueError("Unknown sampling method: %s" % method)
+
+    lower = np.zeros((ntracks, 3))
+    width = np.ones((ntracks, 3))
+    if ntracks == 0:
+        return lower, width
+
+    if method == 'lhs':
+        for d in range(2):
+            lower[:, d] = rng.permutation(ntracks) / float(ntracks)
+        width[:, :2] = 1. / ntracks
+    else:
+        k = int(np.sqrt(ntracks))
+        cell = rng.permutation(ntracks)
+        inside = cell < k * k
+        lower[inside, 0] = (cell[inside] // k) / float(k)
+        lower[inside, 1] = (cell[inside] % k) / float(k)
+        width[inside, :2] = 1. / k
+
+    lower[:, 2] = rng.permutation(ntracks) / float(ntracks)
+    width[:, 2] = 1. / ntracks
+    return lower, width
+
+
+def stratifySimulations(sims, method, blockSize, seed=None):
+    """
+    Stratify the genesis and initial pressure quantiles of the tracks
+    of a set of simulations (see :func:`stratifiedQuantiles`). The
+    simulations are stratified in blocks of `blockSize` consecutive
+    simulations (by simulation index), so the strata of a simulation
+    do not depend on how the simulations are distributed between
+    processors, or generated in batches.
+
+    :type  sims: list
+    :param sims: the :class:`Simulation` objects. The strata of each
+                 simulation are stored in its `strata` attribute.
+
+    :param str method: the stratification method, 'lhs' or 'stratified'.
+    :param int blockSize: the number of simulations stratified together.
+    :param int seed: seed for the assignment of the tracks to the strata.
+    """
+    blocks = {}
+    for sim in sims:
+        blocks.setdefault(sim.index // blockSize, []).append(sim)
+
+    for b, block in blocks.items():
+        if seed is None:
+            rng = np.random.RandomState()
+        else:
+            rng = np.random.RandomState([seed, b, blockSize])
+        lower, width = stratifiedQuantiles(sum(sim.ntracks for sim in block),
+                                           method, rng)
+        start = 0
+        for sim in block:
+            stop = start + sim.ntracks
+            sim.strata = (lower[start:stop], width[start:stop])
+            start = stop
+
+
+def saveTracks(trackFile, tracks, simulation=0, culled=None, weights=None):
+    """
+    Save the tracks of a simulation to a file. If `trackFile` has the
+    `nc` extension, the tracks are saved to a netCDF4 track catalogue
+    (see :mod:`Utilities.trackCatalogue`). Otherwise, the tracks are
+    saved in csv format.
+
+    :type  trackFile: str
+    :param trackFile: the filename of the track file.
+
+    :type  tracks: :class:`numpy.ndarray`
+    :param tracks: the tracks generated by
+                   :meth:`TrackGenerator.generateTracks`.
+
+    :type  simulation: int
+    :param simulation: the simulation index of the tracks.
+
+    :type  culled: int
+    :param culled: optional number of tracks of the simulation that were
+                   culled because they do not pass through the region
+                   of interest. This is recorded in a comment line of a
+                   csv file (or an attribute of a track catalogue).
+
+    :type  weights: :class:`numpy.ndarray`
+    :param weights: optional likelihood ratio of each track, when the
+                    genesis points are importance sampled. This is
+                    recorded in a comment line of a csv file (or a
+                    variable of a track catalogue).
+    """
+    if trackCatalogue.isCatalogue(trackFile):
+        trackCatalogue.saveTrackCatalogue(trackFile, tracks, simulation,
+                                          culled, weights)
+        return
+
+    with open(trackFile, 'w') as fp:
+        fp.write('%' + trackCatalogue.TRACKFILE_HEADER)
+        if culled is not None:
+            fp.write('%%Culled=%i\n' % culled)
+        if weights is not None:
+            fp.write('%%Weights=%s\n' % ','.join('%.10g' % w
+                                                  for w in weights))
+        if len(tracks) > 0:
+            np.savetxt(fp, tracks, fmt=trackCatalogue.TRACKFILE_FMT)
+
+
+def simulateBlock(tg, block, trackPath, ensemble=False, save=True,
+                  windfield=None):
+    """
+    Generate the tracks for a block of simulations and save them. The
+    track files are written in the background by the shared writer (see
+    :func:`Utilities.AsyncRun.getWriter`), so the next simulation can be
+    generated while the tracks are saved.
+
+    The PRNG stream of each simulation is keyed by the simulation, so
+    the tracks do not depend on which process generates the block.
+
+    :type  tg: :class:`TrackGenerator`
+    :param tg: the loaded track generator.
+
+    :type  block: list
+    :param block: the :class:`Simulation` instances to generate.
+
+    :type  trackPath: str
+    :param trackPath: the directory where the track files are saved.
+
+    :type  ensemble: bool
+    :param ensemble: if `True`, generate the block with
+                     :meth:`TrackGenerator.generateEnsemble`.
 
+    :type  save: bool
+    :param save: if `False`, the track files are not written.
 
-def run(configFile, callback=None):
+    :type  windfield: function
+    :param windfield: optional function called with the tracks, the
+                      track file name and the likelihood ratio of each
+                      track once the tracks of a simulation are
+                      generated, e.g. to calculate the wind fields
+                      without reading the tracks back from the file.
+    """
+
+    def output(sim, tracks, culled, weights):
+        trackFile = pjoin(trackPath, sim.outfile)
+        if not tg.cullRegion:
+            culled = None
+        if tg.originSampler.ratio is None:
+            weights = None
+        if save:
+            getWriter().submit(saveTracks, trackFile, tracks, sim.index,
+                               culled, weights)
+        if windfield is not None:
+            windfield(tracks, trackFile, weights=weights)
+
+    if ensemble:
+        results = tg.generateEnsemble(block)
+        for k, sim in enumerate(block):
+            output(sim, results[k], tg.nCulled[k], tg.weight[k])
+        return
+
+    for sim in block:
+        PRNG.seed(sim.seed, sim.index)
+        log.debug('seed %s simulation %i', sim.seed, sim.index)
+
+        tracks = tg.generateTracks(sim.ntracks, strata=sim.strata)
+        output(sim, tracks, tg.nCulled, tg.weight)
+
+
+def _initWorker(tg, trackPath, ensemble, save, windfield, writer):
+    """
+    Initialise a worker process of the local process pool by storing the
+    loaded :class:`TrackGenerator` as a module-level global. This avoids
+    sending the track generator to the worker with every block.
+
+    :param tg: :class:`TrackGenerator` instance.
+    :param str trackPath: the directory where the track files are saved.
+    :param bool ensemble: use the ensemble generator.
+    :param bool save: write the track files.
+    :param windfield: optional function to calculate the wind fields of
+                      each simulation (see :func:`simulateBlock`).
+    :param tuple writer: the number of threads and queue size of the
+                         output writer.
+    """
+
+    global _worker
+    _worker = (tg, trackPath, ensemble, save, windfield)
+    getWriter(*writer)
+
+
+def _simulateBlock(block):
+    """
+    Generate and save a block of simulations in a worker process. The
+    output of the block is written before returning, so errors writing
+    the track files are raised in the parent process.
+
+    :param list block: the :class:`Simulation` instances to generate.
+
+    :returns: the index of the first simulation in the block.
+    """
+
+    tg, trackPath, ensemble, save, windfield = _worker
+    simulateBlock(tg, block, trackPath, ensemble, save, windfield)
+    flushWriter()
+    return block[0].index
+
+
+def simulateBlocks(tg, blocks, trackPath, ensemble=False, save=True,
+                   windfield=None, writer=(1, 8), nProcesses=1,
+                   callback=None):
+    """
+    Generate and save blocks of simulations (see :func:`simulateBlock`),
+    either in this process or with a pool of `nProcesses` local worker
+    processes. The tracks do not depend on the number of processes.
+
+    :type  tg: :class:`TrackGenerator`
+    :param tg: the loaded track generator.
+
+    :type  blocks: list
+    :param blocks: the blocks of :class:`Simulation` instances to
+                   generate.
+
+    :param str trackPath: the directory where the track files are saved.
+    :param bool ensemble: use the ensemble generator.
+    :param bool save: write the track files.
+    :param windfield: optional function to calculate the wind fields of
+                      each simulation (see :func:`simulateBlock`).
+    :param tuple writer: the number of threads and queue size of the
+                         output writer of each worker process.
+    :param int nProcesses: the number of local processes.
+
+    :type  callback: function
+    :param callback: optional function called with the number of
+                     blocks started (or, with a pool, completed) and the
+                     total number of blocks.
+    """
+
+    if nProcesses > 1:
+        # The loaded track generator is passed to the worker processes
+        # once, and the blocks are handed out to the workers as they
+        # finish:
+        log.info('Simulating tropical cyclone tracks with %d local '
+                 'processes', nProcesses)
+        pool = multiprocessing.Pool(nProcesses, initializer=_initWorker,
+                                    initargs=(tg, trackPath, ensemble, save,
+                                              windfield, writer))
+        try:
+            results = pool.imap_unordered(_simulateBlock, blocks)
+            for i, index in enumerate(results):
+                log.debug('Simulating tropical cyclone tracks:' +
+                          ' %3.0f percent complete' % ((i + 1) /
+                                                       float(len(blocks))
+                                                       * 100.))
+                if callback is not None:
+                    callback(i + 1, len(blocks))
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        for i, block in enumerate(blocks):
+            log.debug('Simulating tropical cyclone tracks:' +
+                      ' %3.0f percent complete' % (i / float(len(blocks))
+                                                   * 100.))
+            if callback is not None:
+                callback(i, len(blocks))
+
+            simulateBlock(tg, block, trackPath, ensemble, save, windfield)
+
+
+def run(configFile, callback=None, simRange=None, windfield=False):
     """
     Run the tropical cyclone track generation.
 
@@ -1569,6 +2477,19 @@ def run(configFile, callback=None):
     :type  configFile: str
     :param configFile: the filename of the configuration file to load
                        the track generation configuration from.
+
+    :type  simRange: tuple
+    :param simRange: optional (start, stop) indices of the simulations to
+                     generate. The number of tracks and the random
+                     number streams of each simulation are set up for all
+                     `NumSimulations`, so the simulations are identical to
+                     those generated in a single run.
+
+    :type  windfield: bool
+    :param windfield: if `True`, the wind fields of each simulation are
+                      calculated (with :mod:`wind`) by the same process,
+                      straight after its tracks are generated. The track
+                      files are then only written if `SaveTracks` is set.
     """
 
     log.info('Loading track generation settings')
@@ -1588,6 +2509,24 @@ def run(configFile, callback=None):
     gridInc = config.geteval('Region', 'GridInc')
     gridLimit = config.geteval('Region', 'gridLimit')
     mslpFile = config.get('Input', 'MSLPFile')
+    ensemble = config.getboolean('TrackGenerator', 'Ensemble')
+    ensembleSize = config.getint('TrackGenerator', 'EnsembleSize')
+    mslpInterpolation = config.get('TrackGenerator',
+                                   'PressureInterpolation').lower()
+    mslpCache = config.getboolean('TrackGenerator', 'PressureCache')
+    nProcesses = config.getint('TrackGenerator', 'NumProcesses')
+    save = config.getboolean('TrackGenerator', 'SaveTracks') or not windfield
+    writer = (config.getint('Output', 'WriterThreads'),
+              config.getint('Output', 'WriterQueueSize'))
+    cullTracks = config.getboolean('TrackGenerator', 'CullTracks')
+    cullMargin = config.getfloat('TrackGenerator', 'CullMargin')
+    sampling = config.get('TrackGenerator', 'Sampling').lower()
+    samplingBlock = config.getint('TrackGenerator', 'SamplingBlock')
+    importance = config.getboolean('TrackGenerator', 'ImportanceSampling')
+    importanceFraction = config.getfloat('TrackGenerator',
+                                         'ImportanceFraction')
+    importanceBandwidth = config.getfloat('TrackGenerator',
+                                          'ImportanceBandwidth')
     seasonSeed = None
     trackSeed = None
     trackPath = pjoin(outputPath, 'tracks')
@@ -1601,6 +2540,29 @@ def run(configFile, callback=None):
         CalcTD = CalcTrackDomain(configFile)
         gridLimit = CalcTD.calcDomainFromFile()
 
+    # Tracks that never pass through the wind field domain (extended by
+    # `CullMargin` degrees) do not contribute to the hazard
+
+    windLimit = config.geteval('Region', 'gridLimit')
+    if config.has_option('WindfieldInterface', 'gridLimit'):
+        windLimit = config.geteval('WindfieldInterface', 'gridLimit')
+
+    # The evaluation statistics (track and genesis densities, pressure
+    # distributions and landfall rates) need all of the tracks
+
+    if cullTracks and config.getboolean('Actions', 'ExecuteEvaluate'):
+        log.critical('CullTracks cannot be used with ExecuteEvaluate, as'
+                     ' the culled tracks are missing from the evaluation')
+        sys.exit(1)
+
+    cullRegion = None
+    if cullTracks:
+        cullRegion = {'xMin': windLimit['xMin'] - cullMargin,
+                      'xMax': windLimit['xMax'] + cullMargin,
+                      'yMin': windLimit['yMin'] - cullMargin,
+                      'yMax': windLimit['yMax'] + cullMargin}
+        log.info('Culling tracks that do not pass through %s', cullRegion)
+
     if config.has_option('TrackGenerator', 'Frequency'):
         meanFreq = config.getfloat('TrackGenerator', 'Frequency')
     else:
@@ -1625,7 +2587,16 @@ def run(configFile, callback=None):
                      ' for parallel runs!')
         sys.exit(1)
 
-    mslp = SamplePressure(mslpFile)
+    # Load the MSLP on the first processor, so the spline coefficients
+    # are cached before the other processors load them
+
+    if pp.rank() == 0:
+        mslp = SamplePressure(mslpFile, interpolation=mslpInterpolation,
+                              cache=mslpCache)
+    pp.barrier()
+    if pp.rank() > 0:
+        mslp = SamplePressure(mslpFile, interpolation=mslpInterpolation,
+                              cache=mslpCache)
     
     # Initialise the landfall tracking
 
@@ -1652,15 +2623,6 @@ def run(configFile, callback=None):
     nCyclones = np.random.poisson(
         np.floor(yrsPerSim) * meanFreq, nSimulations)
 
-    # Estimate the maximum number of random values to be drawn from the
-    # PRNG for each track and calculate how much each track simulation
-    # should jump ahead in the PRNG stream to ensure that it is
-    # independent of all other simulations.
-
-    maxRvsPerTrack = 5 * (maxTimeSteps + 2)
-    jumpAhead = np.hstack([[0],
-                          np.cumsum(nCyclones * maxRvsPerTrack)[:-1]])
-
     log.info('Generating %i total events for %i simulations',
               sum(nCyclones), nSimulations)
 
@@ -1668,63 +2630,80 @@ def run(configFile, callback=None):
 
     sims = []
     for i, n in enumerate(nCyclones):
-        sims.append(Simulation(i, trackSeed, jumpAhead[i], n,
-                               trackFilename % i))
+        sims.append(Simulation(i, trackSeed, n, trackFilename % i))
+
+    # Stratify the genesis and initial pressure quantiles of the tracks.
+    # This is done before selecting the simulations to generate, so the
+    # strata are the same for every processor and batch
+
+    if sampling != 'random':
+        log.info('Stratifying the genesis points (%s sampling)', sampling)
+        stratifySimulations(sims, sampling, samplingBlock, trackSeed)
+
+    if simRange is not None:
+        sims = sims[simRange[0]:simRange[1]]
 
     # Load the track generator
 
     tg = TrackGenerator(processPath, gridLimit, gridSpace, gridInc,
                         mslp, landfall, dt=dt,
-                        maxTimeSteps=maxTimeSteps)
+                        maxTimeSteps=maxTimeSteps, cullRegion=cullRegion)
 
     tg.loadInitialConditionDistributions()
     tg.loadCellStatistics()
 
+    # Bias the genesis points toward the origins of the historical
+    # tracks that pass through the wind field domain
+
+    if importance:
+        log.info('Importance sampling the genesis points')
+        bias = transitProbability(pjoin(processPath, 'cyclone_tracks'),
+                                  tg.originSampler.x, tg.originSampler.y,
+                                  windLimit, importanceBandwidth)
+        tg.originSampler.setImportance(bias, importanceFraction)
+
+    # Set up the wind field calculations, if they are done as the
+    # tracks are generated
+
+    windfieldCallback = None
+    if windfield:
+        import wind
+        if config.has_option('Timeseries', 'Extract') and \
+           config.getboolean('Timeseries', 'Extract'):
+            log.warning('Timeseries are not extracted when the wind '
+                        'fields are calculated with the tracks')
+        wfg = wind.loadWindfieldGenerator(config)
+        windfieldCallback = functools.partial(
+            wfg.dumpGustsFromTrackArray,
+            windfieldPath=pjoin(outputPath, 'windfield'))
+
     # Hold until all processors are ready
 
+    getWriter(*writer)
     pp.barrier()
 
-    N = sims[-1].index
-
-    # Balance the simulations over the number of processors and do it
+    # Balance the simulations over the number of processors. With the
+    # ensemble generator, the simulations are then generated in blocks
 
-    for sim in balanced(sims):
-        log.debug('Simulating tropical cyclone tracks:' +
-                  ' %3.0f percent complete' % (sim.index / float(N)
-                                               * 100.))
-        if callback is not None:
-            callback(sim.index, N)
+    mysims = list(balanced(sims))
+    if ensemble:
+        blocks = [mysims[b:b + ensembleSize]
+                  for b in xrange(0, len(mysims), ensembleSize)]
+    else:
+        blocks = [[sim] for sim in mysims]
 
-        if sim.seed:
-            PRNG.seed(sim.seed)
-            PRNG.jumpahead(sim.jumpahead)
-            log.debug('seed %i jumpahead %i', sim.seed, sim.jumpahead)
+    if pp.size() > 1:
+        nProcesses = 1
+    simulateBlocks(tg, blocks, trackPath, ensemble, save, windfieldCallback,
+                   writer, nProcesses, callback)
 
-        trackFile = pjoin(trackPath, sim.outfile)
-        tracks = tg.generateTracks(sim.ntracks)
+    # Make sure all the output has been written
 
-        header = 'CycloneNumber,Datetime,TimeElapsed,Longitude,' + \
-                 'Latitude,Speed,Bearing,' + \
-                 'CentralPressure,EnvPressure,rMax\n'
-        fmt = '%i,%s,%7.3f,%8.3f,%8.3f,%6.2f,%6.2f,%7.2f,%7.2f,%6.2f'
-        
-        """
-        for i, track in enumerate(tracks):
-            trackFile = pjoin(trackPath, sim.outfile % (i + 1))
-            with open (trackFile, 'w') as fp:
-                fp.write('%' + header)
-                if len(track) > 0:
-                    np.savetxt(fp, np.array(track).T, fmt=fmt)
-        """            
-        with open(trackFile, 'w') as fp:
-            fp.write('%' + header)
-            if len(tracks) > 0:
-                np.savetxt(fp, tracks, fmt=fmt)
+    flushWriter()
 
     log.info('Simulating tropical cyclone tracks:' +
              ' 100 percent complete')
 
-
 if __name__ == "__main__":
     try:
         configFile = sys.argv[1]
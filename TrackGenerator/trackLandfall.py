@@ -22,7 +22,7 @@ import logging
 
 import numpy as np
 
-from Utilities.grid import SampleGrid
+from Utilities.grid import LandMask
 from Utilities import pathLocator
 from Utilities.config import ConfigParser
 
@@ -42,8 +42,9 @@ class LandfallDecay:
 
     Members:
     dt - time step of the generated cyclone tracks
-    landMask - 2D array of 0/1 indicating ocean/land respectively (any
-    positive non-zero value can be used to indicate land points)
+    landMask - :class:`Utilities.grid.LandMask` indicating ocean/land
+    points (any positive non-zero value in the land mask file can be
+    used to indicate land points)
 
     Methods:
     onLand - Determine if a cyclone centred at (cLon, cLat) is over land
@@ -67,7 +68,7 @@ class LandfallDecay:
 
         landMaskFile = config.get('Input', 'LandMask')
 
-        self.landMask = SampleGrid(landMaskFile)
+        self.landMask = LandMask(landMaskFile)
         self.tol = 0 # Time over land
         self.dt = dt
 
@@ -83,10 +84,10 @@ class LandfallDecay:
         
         """
 
-        if self.landMask.sampleGrid(cLon, cLat) > 0.0:
+        if self.landMask.onLand(cLon, cLat):
             self.tol += self.dt
-            log.debug("Storm centre: %6.2f, %6.2f"%(cLon, cLat))
-            log.debug("Time over land: %d hours"%self.tol)
+            log.debug("Storm centre: %6.2f, %6.2f", cLon, cLat)
+            log.debug("Time over land: %d hours", self.tol)
             return True
         else:
             self.tol = 0
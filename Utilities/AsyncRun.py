@@ -34,6 +34,8 @@ filename = os.environ.get('PYTHONSTARTUP')
 if filename and os.path.isfile(filename):
     execfile(filename)
 import threading
+import atexit
+import Queue
 __version__ = '$Id: AsyncRun.py 642 2012-02-21 07:54:04Z nsummons $'
 class AsyncRun(threading.Thread):
     """
@@ -58,3 +60,118 @@ class AsyncRun(threading.Thread):
     def run(self):
         self.function(**self.args)
 
+
+class AsyncWriter(object):
+    """
+    A bounded pool of threads that write output files in the background,
+    so the calculations can continue while the output of earlier
+    calculations is written to disk.
+
+    Jobs are held in a queue of at most `maxsize` jobs. When the queue
+    is full, :meth:`submit` waits for a writer thread to take a job
+    (back-pressure), so the memory held by pending output is bounded.
+    If `nthreads` is 0, jobs are run as they are submitted.
+
+    Input: nthreads - number of writer threads
+           maxsize - maximum number of pending jobs
+    Example:  writer = AsyncWriter(1, 8)
+              writer.submit(function, arg1, arg2, key=value)
+              # Wait for all submitted jobs to complete:
+              writer.flush()
+
+    Errors raised by a job are logged, and the first error is raised
+    again by the next call to :meth:`flush`.
+    """
+    def __init__(self, nthreads=1, maxsize=8):
+        self.nthreads = nthreads
+        self.queue = Queue.Queue(maxsize)
+        self.error = None
+        self.threads = []
+        for i in range(nthreads):
+            thread = threading.Thread(target=self._run)
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def _run(self):
+        while True:
+            job = self.queue.get()
+            try:
+                if job is None:
+                    return
+                function, args, kwargs = job
+                function(*args, **kwargs)
+            except Exception as err:
+                logging.getLogger().exception("Error writing output")
+                if self.error is None:
+                    self.error = err
+            finally:
+                self.queue.task_done()
+
+    def submit(self, function, *args, **kwargs):
+        """
+        Queue a call of `function` with the given arguments. The
+        arguments must not be modified until the job has completed.
+        """
+        if self.nthreads == 0:
+            function(*args, **kwargs)
+        else:
+            self.queue.put((function, args, kwargs))
+
+    def flush(self):
+        """
+        Wait for all submitted jobs to complete, and raise the first
+        error raised by a job (if any).
+        """
+        self.queue.join()
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def close(self):
+        """
+        Flush the pending jobs and stop the writer threads.
+        """
+        try:
+            self.flush()
+        finally:
+            for thread in self.threads:
+                self.queue.put(None)
+            for thread in self.threads:
+                thread.join()
+            self.threads = []
+            self.nthreads = 0
+
+_writer = None
+_writerPid = None
+
+def getWriter(nthreads=None, maxsize=None):
+    """
+    Get the writer shared by all output of the process. The writer is
+    created (or replaced, once its pending jobs are written) if the
+    number of threads or the queue size is given and differs from the
+    current writer. Each process (e.g. a worker of a
+    :class:`multiprocessing.Pool`) has its own writer.
+    """
+    global _writer, _writerPid
+    if _writer is not None and _writerPid == os.getpid():
+        if nthreads is None or (nthreads == _writer.nthreads and
+                                maxsize in (None, _writer.queue.maxsize)):
+            return _writer
+        _writer.close()
+    if nthreads is None:
+        nthreads = 1
+    if maxsize is None:
+        maxsize = 8
+    _writer = AsyncWriter(nthreads, maxsize)
+    _writerPid = os.getpid()
+    return _writer
+
+def flushWriter():
+    """
+    Wait for all output submitted to the shared writer to be written.
+    """
+    if _writer is not None and _writerPid == os.getpid():
+        _writer.flush()
+
+atexit.register(flushWriter)
@@ -0,0 +1,234 @@
+"""
+:mod:`binnedKDE` -- binned kernel density estimation
+====================================================
+
+.. module:: binnedKDE
+    :synopsis: Kernel density estimates on regular grids, calculated by
+               linear binning of the data and FFT convolution with
+               the kernel.
+
+Calculate kernel density estimates on regular grids. The data are
+linearly binned onto a (refined) copy of the grid, which is then
+convolved with the kernel using FFTs. The cost is proportional to the
+number of observations plus the number of grid points (times a log
+factor), rather than their product as for the direct estimators in
+:mod:`Utilities.KPDF`.
+
+The kernels (and their normalisation) are identical to those of the
+corresponding :mod:`Utilities.KPDF` estimators, so the results agree
+with the direct estimators to within the binning error. Kernels with
+infinite support are truncated where they fall below :data:`TOLERANCE`
+of their peak value.
+
+With the default number of bins per bandwidth, univariate estimates
+agree with the direct estimates to within about 0.1% of the peak
+density (0.01% for the smooth kernels). Bivariate estimates agree to
+within about 0.05% (Gaussian kernel) and 2% (Epanechnikov kernel,
+whose gradient is discontinuous at the edge of its support) of the
+peak density.
+
+"""
+
+import numpy as np
+from scipy.signal import fftconvolve
+
+# Relative value at which kernels with infinite support are truncated:
+TOLERANCE = 1e-8
+
+# Default number of bins per bandwidth for univariate and bivariate
+# estimates (the grid is refined until there are at least this many):
+UBINS_PER_BANDWIDTH = 20
+MBINS_PER_BANDWIDTH = 10
+
+SQRT5 = np.sqrt(5.)
+SQRT2PI = np.sqrt(2. * 3.141592658)
+
+
+def _epanechnikov(u):
+    """Univariate Epanechnikov kernel (as in :mod:`Utilities.KPDF`)."""
+    t = u / SQRT5
+    return np.where(np.abs(u) <= SQRT5, (1. - t) * (1. + t), 0.)
+
+def _biweight(u):
+    """Univariate biweight kernel."""
+    return np.where(np.abs(u) <= 1., ((1. - u) * (1. + u))**2, 0.)
+
+def _triangular(u):
+    """Univariate triangular kernel."""
+    return np.where(np.abs(u) <= 1., 1. - np.abs(u), 0.)
+
+def _gaussian(u):
+    """Univariate 'Gaussian' kernel (as in :mod:`Utilities.KPDF`)."""
+    return np.exp(-0.5 * np.abs(u))
+
+def _mepanechnikov(u2):
+    """Multivariate Epanechnikov kernel, of the squared distance."""
+    return np.where(u2 < 1., 1. - u2, 0.)
+
+def _mgaussian(u2):
+    """Multivariate Gaussian kernel, of the squared distance."""
+    return np.exp(-0.5 * u2)
+
+# Kernel function, normalising constant and half-width of the support
+# (in bandwidths) of the univariate and bivariate kernels:
+UKERNELS = {
+    'Epanechnikov': (_epanechnikov, 3. / 4. / SQRT5, SQRT5),
+    'Biweight': (_biweight, 15. / 16., 1.),
+    'Triangular': (_triangular, 1., 1.),
+    'Gaussian': (_gaussian, 1. / SQRT2PI, -2. * np.log(TOLERANCE))
+    }
+
+MKERNELS = {
+    'Epanechnikov': (_mepanechnikov, 0.5 * 4. / np.pi, 1.),
+    'Gaussian': (_mgaussian, 1. / (2. * np.pi),
+                 np.sqrt(-2. * np.log(TOLERANCE)))
+    }
+
+
+def isRegular(grid):
+    """
+    Determine whether the points of a grid are equally spaced.
+
+    :param grid: 1-d :class:`numpy.ndarray` of grid points.
+
+    :returns: ``True`` if the grid has at least two points, which are
+              equally spaced.
+
+    """
+    grid = np.asarray(grid, dtype=float)
+    if grid.size < 2:
+        return False
+    step = grid[1] - grid[0]
+    return step != 0 and np.allclose(np.diff(grid), step,
+                                     rtol=1e-6, atol=0.)
+
+def _axis(grid, bw, support, binsPerBandwidth):
+    """
+    Define the refined and extended axis onto which the data are binned
+    for a regular grid.
+
+    :returns: the origin and step of the refined axis, the refinement
+              factor, the number of refined points that extend the grid
+              on each side, and the total number of refined points.
+
+    """
+    grid = np.asarray(grid, dtype=float)
+    n = grid.size
+    step = (grid[-1] - grid[0]) / (n - 1)
+    refine = int(np.ceil(abs(step) * binsPerBandwidth / bw))
+    refine = max(refine, 1)
+    fine = step / refine
+    pad = int(np.ceil(support * bw / abs(fine)))
+    origin = grid[0] - pad * fine
+    return origin, fine, refine, pad, (n - 1) * refine + 2 * pad + 1
+
+def _linearBin(pos, n):
+    """
+    Linearly bin data onto the integer positions 0, ..., n - 1. Each
+    datum is shared between the bins either side of it, in proportion
+    to its distance from the other bin.
+
+    :param pos: Positions of the data (in units of the bin spacing).
+    :param int n: Number of bins.
+
+    :returns: the index of the lower bin of each datum, and the weight
+              given to the upper bin (data outside the bins are
+              excluded).
+
+    """
+    lower = np.floor(pos).astype(int)
+    frac = pos - lower
+    inside = (lower >= 0) & (lower < n - 1)
+    lower = lower[inside]
+    frac = frac[inside]
+    return lower, frac
+
+def UPDF(data, grid, bw, kdeType='Gaussian',
+         binsPerBandwidth=UBINS_PER_BANDWIDTH):
+    """
+    Univariate binned kernel density estimate.
+
+    :param data: 1-d :class:`numpy.ndarray` of observations.
+    :param grid: 1-d :class:`numpy.ndarray` of equally spaced points at
+                 which to evaluate the PDF.
+    :param float bw: Bandwidth of the kernel.
+    :param str kdeType: Name of the kernel. Must be one of
+                        ``Epanechnikov``, ``Gaussian``, ``Biweight`` or
+                        ``Triangular``.
+    :param int binsPerBandwidth: Minimum number of bins per bandwidth.
+                                 The grid is refined to achieve this.
+
+    :returns: :class:`numpy.ndarray` of the PDF at the grid points.
+
+    :raises ValueError: if the grid is not equally spaced, or the
+                        bandwidth is not positive.
+    :raises KeyError: if the kernel is not available.
+
+    """
+    if bw <= 0:
+        raise ValueError, 'bw = %f. Bandwidth cannot be negative or zero' % bw
+    if not isRegular(grid):
+        raise ValueError, 'Binned KDE requires an equally spaced grid'
+    kernel, const, support = UKERNELS[kdeType]
+    data = np.asarray(data, dtype=float).ravel()
+
+    origin, step, refine, pad, n = _axis(grid, bw, support,
+                                         binsPerBandwidth)
+    lower, frac = _linearBin((data - origin) / step, n)
+    counts = (np.bincount(lower, 1. - frac, n) +
+              np.bincount(lower + 1, frac, n))
+
+    weights = kernel(np.arange(-pad, pad + 1) * step / bw)
+    pdf = fftconvolve(counts, weights, 'valid')[::refine]
+    return np.maximum(pdf, 0.) * const / data.size / bw
+
+def MPDF(data, x, y, bw, kdeType='Gaussian',
+         binsPerBandwidth=MBINS_PER_BANDWIDTH):
+    """
+    Bivariate binned kernel density estimate, using the same
+    (isotropic) bandwidth in both dimensions.
+
+    :param data: 2-d :class:`numpy.ndarray` of observations, with the
+                 *x* and *y* values in the columns.
+    :param x: 1-d :class:`numpy.ndarray` of equally spaced *x* values.
+    :param y: 1-d :class:`numpy.ndarray` of equally spaced *y* values.
+    :param float bw: Bandwidth of the kernel.
+    :param str kdeType: Name of the kernel. Must be one of
+                        ``Epanechnikov`` or ``Gaussian``.
+    :param int binsPerBandwidth: Minimum number of bins per bandwidth.
+                                 The grid is refined to achieve this.
+
+    :returns: :class:`numpy.ndarray` of the PDF, with shape
+              ``(len(y), len(x))``.
+
+    :raises ValueError: if the grid is not equally spaced, or the
+                        bandwidth is not positive.
+    :raises KeyError: if the kernel is not available.
+
+    """
+    if bw <= 0:
+        raise ValueError, 'bw = %f. Bandwidth cannot be negative or zero' % bw
+    if not (isRegular(x) and isRegular(y)):
+        raise ValueError, 'Binned KDE requires an equally spaced grid'
+    kernel, const, support = MKERNELS[kdeType]
+    data = np.asarray(data, dtype=float)
+
+    x0, dx, xrefine, xpad, nx = _axis(x, bw, support, binsPerBandwidth)
+    y0, dy, yrefine, ypad, ny = _axis(y, bw, support, binsPerBandwidth)
+    xpos = (data[:, 0] - x0) / dx
+    ypos = (data[:, 1] - y0) / dy
+    valid = ((xpos >= 0) & (xpos < nx - 1) & (ypos >= 0) & (ypos < ny - 1))
+    i, fx = _linearBin(xpos[valid], nx)
+    j, fy = _linearBin(ypos[valid], ny)
+
+    counts = np.zeros(nx * ny)
+    for dj, wy in [(0, 1. - fy), (1, fy)]:
+        for di, wx in [(0, 1. - fx), (1, fx)]:
+            counts += np.bincount((j + dj) * nx + i + di, wy * wx, nx * ny)
+    counts = counts.reshape((ny, nx))
+
+    u = np.arange(-xpad, xpad + 1) * dx / bw
+    v = np.arange(-ypad, ypad + 1) * dy / bw
+    weights = kernel(v[:, np.newaxis]**2 + u[np.newaxis, :]**2)
+    pdf = fftconvolve(counts, weights, 'valid')[::yrefine, ::xrefine]
+    return np.maximum(pdf, 0.) * const / data.shape[0] / bw**2
@@ -70,6 +70,11 @@ PARSERS = {
     'Actions_plothazard': parseBool,
     'Actions_downloaddata': parseBool,
     'Actions_executeevaluate': parseBool,
+    'Actions_executeconvergence': parseBool,
+    'Convergence_batchsize': int,
+    'Convergence_samplepoints': int,
+    'Convergence_tolerance': float,
+    'Convergence_years': parseList,
     'DataProcess_inputfile': str,
     'DataProcess_source': str,
     'DataProcess_startseason': int,
@@ -80,6 +85,12 @@ PARSERS = {
     'Hazard_years': parseList,
     'Hazard_samplesize': int,
     'Hazard_percentilerange': int,
+    'Hazard_numprocesses': int,
+    'Hazard_method': str,
+    'Hazard_gpdthreshold': float,
+    'Hazard_incremental': parseBool,
+    'Hazard_minimumpressure': parseBool,
+    'Hazard_directionalsectors': int,
     'Input_landmask': str,
     'Input_mslpgrid': parseList,
     'Logging_logfile': str,
@@ -88,6 +99,8 @@ PARSERS = {
     'Logging_verbose': parseBool,
     'Logging_datestamp':parseBool,
     'Output_path': str,
+    'Output_writerqueuesize': int,
+    'Output_writerthreads': int,
     'Process_datfile': str,
     'Process_excludepastprocessed': parseBool,
     'RMW_getrmwdistfrominputdata': parseBool,
@@ -98,19 +111,35 @@ PARSERS = {
     'Region_gridinc': eval,
     'Region_localityid': int,
     'Region_localityname': str,
+    'StatInterface_binnedkde': parseBool,
     'StatInterface_gridinc': eval,
     'StatInterface_gridspace': eval,
     'StatInterface_kde2dtype': str,
     'StatInterface_kdestep': float,
     'StatInterface_kdetype': str,
     'StatInterface_minsamplescell': int,
+    'StatInterface_numprocesses': int,
     'TCRM_columns': parseList,
     'TCRM_fielddelimiter': str,
     'TCRM_numberofheadinglines': int,
     'TCRM_pressureunits': str,
     'TCRM_speedunits': str,
+    'TrackGenerator_cullmargin': float,
+    'TrackGenerator_culltracks': parseBool,
+    'TrackGenerator_ensemble': parseBool,
+    'TrackGenerator_ensemblesize': int,
+    'TrackGenerator_importancebandwidth': float,
+    'TrackGenerator_importancefraction': float,
+    'TrackGenerator_importancesampling': parseBool,
+    'TrackGenerator_numprocesses': int,
     'TrackGenerator_numsimulations': int,
+    'TrackGenerator_pressurecache': parseBool,
+    'TrackGenerator_pressureinterpolation': str,
+    'TrackGenerator_sampling': str,
+    'TrackGenerator_samplingblock': int,
+    'TrackGenerator_savetracks': parseBool,
     'TrackGenerator_seasonseed': int,
+    'TrackGenerator_streamwindfield': parseBool,
     'TrackGenerator_trackseed': int,
     'TrackGenerator_yearspersimulation': int,
     'TrackGenerator_numtimesteps': int,
@@ -136,6 +165,7 @@ ExecuteTrackGenerator=True
 ExecuteWindfield=True
 ExecuteHazard=True
 ExecuteEvaluate=True
+ExecuteConvergence=False
 PlotData=True
 PlotHazard=True
 DownloadData=True
@@ -155,6 +185,8 @@ kdeType=Gaussian
 kde2DType=Gaussian
 kdeStep=0.2
 minSamplesCell=100
+NumProcesses=1
+BinnedKDE=False
 
 [TrackGenerator]
 NumSimulations=500
@@ -164,6 +196,20 @@ TimeStep=1.0
 Format=csv
 SeasonSeed=1
 TrackSeed=1
+Ensemble=False
+EnsembleSize=100
+PressureInterpolation=spline
+PressureCache=True
+NumProcesses=1
+StreamWindfield=False
+SaveTracks=True
+CullTracks=False
+CullMargin=0.0
+ImportanceSampling=False
+ImportanceFraction=0.5
+ImportanceBandwidth=5.0
+Sampling=random
+SamplingBlock=100
 
 [WindfieldInterface]
 profileType=holland
@@ -184,6 +230,18 @@ CalculateCI=True
 PercentileRange=90
 SampleSize=50
 PlotSpeedUnits=mps
+NumProcesses=1
+Method=GEV
+GPDThreshold=90
+Incremental=False
+MinimumPressure=False
+DirectionalSectors=0
+
+[Convergence]
+BatchSize=500
+SamplePoints=1000
+Tolerance=0.01
+Years=100,500
 
 [RMW]
 GetRMWDistFromInputData=False
@@ -196,6 +254,8 @@ Datasets=IBTRACS,LTMSLP
 [Output]
 Path=output
 Format=txt
+WriterThreads=1
+WriterQueueSize=8
 
 [Logging]
 ProgressBar=False
@@ -24,6 +24,7 @@ ascii files are assumend to have and ArcGIS GIRD format::
 """
 
 import os, sys
+import bisect
 import logging as log
 
 import numpy
@@ -256,3 +257,190 @@ class SampleGrid:
         indj = self.lat.searchsorted(lat)
 
         return self.grid[indj, indi]
+
+class LandMask(object):
+    """
+    Land-sea mask with fast lookup of many points. The mask is read
+    from a gridded data file (as for :class:`SampleGrid`) and any
+    positive value indicates a land point. The mask is stored as a
+    bit-packed array, and points are converted to grid indices by
+    arithmetic on the regular grid rather than by searching the
+    coordinate arrays.
+
+    The grid point chosen for a given location is the same as that
+    chosen by :meth:`SampleGrid.sampleGrid`.
+
+    :param str filename: Path to a file containing the land-sea mask.
+
+    Example::
+
+          >>> mask = LandMask('/foo/bar/landmask.nc')
+          >>> mask.onLand(lons, lats)
+          array([False,  True,  True], dtype=bool)
+
+    """
+
+    def __init__(self, filename):
+        if filename.endswith('nc'):
+            lon, lat, data = grdReadFromNetcdf(filename)
+        else:
+            lon, lat, data = grdRead(filename)
+        data = numpy.flipud(data)
+
+        self.lon = numpy.array(lon, dtype=float)
+        self.lat = numpy.array(lat, dtype=float)
+        mask = numpy.asarray(data) > 0.
+        if self.lat[0] > self.lat[-1]:
+            self.lat = self.lat[::-1]
+            mask = mask[::-1, :]
+        self.shape = mask.shape
+        self.packed = numpy.packbits(mask.astype(numpy.uint8), axis=1)
+        self._lonAxis = self._axis(self.lon)
+        self._latAxis = self._axis(self.lat)
+        self._lonList = self.lon.tolist()
+        self._latList = self.lat.tolist()
+        self._coast = None
+
+    @staticmethod
+    def _axis(x):
+        """
+        Return the origin, spacing and length of a coordinate array, or
+        ``None`` if the array is not regularly spaced.
+
+        """
+        if len(x) < 2:
+            return None
+        dx = float(x[-1] - x[0]) / (len(x) - 1)
+        if not numpy.allclose(numpy.diff(x), dx):
+            return None
+        return float(x[0]), dx, len(x)
+
+    @staticmethod
+    def _index(x, coords, axis):
+        """
+        Return the indices of the first elements of `coords` that are
+        not less than `x`, clipped to the extent of the grid. This is
+        the same as :meth:`numpy.ndarray.searchsorted` for points
+        within the grid.
+
+        """
+        if axis is None:
+            idx = coords.searchsorted(x)
+        else:
+            x0, dx, n = axis
+            idx = numpy.ceil((numpy.asarray(x) - x0) / dx).astype(int)
+            idx = numpy.clip(idx, 0, n - 1)
+            # Correct any rounding at the grid points:
+            idx = idx - ((idx > 0) & (coords[idx - 1] >= x))
+            idx = idx + ((idx < n - 1) & (coords[idx] < x))
+        return numpy.clip(idx, 0, len(coords) - 1)
+
+    @staticmethod
+    def _scalarIndex(x, coords):
+        """
+        As for :meth:`_index`, for a single point. Bisecting a list of the
+        coordinates is quicker than the arithmetic for a single point,
+        and avoids the overhead of array operations when stepping
+        individual tracks.
+
+        """
+        return min(bisect.bisect_left(coords, x), len(coords) - 1)
+
+    def indices(self, lon, lat):
+        """
+        Return the grid indices of the given points.
+
+        :param lon: Longitude of the point(s).
+        :param lat: Latitude of the point(s).
+
+        :returns: row and column indices of the grid points.
+
+        """
+        if isinstance(lon, float) and isinstance(lat, float):
+            return (self._scalarIndex(lat, self._latList),
+                    self._scalarIndex(lon, self._lonList))
+        indj = self._index(lat, self.lat, self._latAxis)
+        indi = self._index(lon, self.lon, self._lonAxis)
+        return indj, indi
+
+    def onLand(self, lon, lat):
+        """
+        Determine if the given points are over land.
+
+        :param lon: Longitude of the point(s).
+        :param lat: Latitude of the point(s).
+
+        :returns: `True` for points over land, `False` otherwise.
+
+        """
+        if isinstance(lon, float) and isinstance(lat, float):
+            j = self._scalarIndex(lat, self._latList)
+            i = self._scalarIndex(lon, self._lonList)
+            return bool((self.packed.item(j, i >> 3) >> (7 - (i & 7))) & 1)
+        indj, indi = self.indices(lon, lat)
+        bits = self.packed[indj, indi >> 3] >> (7 - (indi & 7))
+        return (bits & 1).astype(bool)
+
+    def sampleGrid(self, lon, lat):
+        """
+        Sample the land-sea mask at the given points, returning 1 for
+        land points and 0 for ocean points. This provides the same
+        interface as :meth:`SampleGrid.sampleGrid`.
+
+        :param lon: Longitude of the point(s).
+        :param lat: Latitude of the point(s).
+
+        """
+        return numpy.uint8(self.onLand(lon, lat))
+
+    def distanceToCoast(self, lon, lat):
+        """
+        Calculate the great circle distance from the given points to
+        the nearest coastal grid point (a land point adjacent to an
+        ocean point). The coastal points are indexed on the first call.
+
+        :param lon: Longitude of the point(s).
+        :param lat: Latitude of the point(s).
+
+        :returns: distance to the coast (km), or `numpy.inf` if the mask
+                  contains no coastline.
+
+        """
+        if self._coast is None:
+            self._coast = self._coastTree()
+        lon = numpy.asarray(lon, dtype=float)
+        lat = numpy.asarray(lat, dtype=float)
+        if self._coast is False:
+            return numpy.inf * numpy.ones(lon.shape)
+        radius = 6367.0 # Earth radius (km)
+        chord, idx = self._coast.query(_unitVector(lon.ravel(), lat.ravel()))
+        angle = 2. * numpy.arcsin(numpy.minimum(chord / 2., 1.))
+        return (radius * angle).reshape(lon.shape)
+
+    def _coastTree(self):
+        """
+        Build a :class:`scipy.spatial.cKDTree` of the coastal grid
+        points, or return `False` if there are none.
+
+        """
+        from scipy.ndimage import binary_erosion
+        from scipy.spatial import cKDTree
+
+        mask = numpy.unpackbits(self.packed, axis=1)[:, :self.shape[1]]
+        mask = mask.astype(bool)
+        coast = mask & ~binary_erosion(mask, border_value=1)
+        indj, indi = numpy.nonzero(coast)
+        if len(indj) == 0:
+            return False
+        return cKDTree(_unitVector(self.lon[indi], self.lat[indj]))
+
+def _unitVector(lon, lat):
+    """
+    Convert longitude and latitude (degrees) to unit vectors.
+
+    """
+    lon = numpy.radians(lon)
+    lat = numpy.radians(lat)
+    return numpy.column_stack([numpy.cos(lat) * numpy.cos(lon),
+                               numpy.cos(lat) * numpy.sin(lon),
+                               numpy.sin(lat)])
@@ -18,7 +18,7 @@ from scipy.ndimage.interpolation import map_coordinates
 def interp3d(input_array, coords, 
              scale=[360., 180., 365.],
              offset=[0.,-90.,0.],
-             prefilter=True):
+             prefilter=True, order=3):
     """
     Wrapper to :func:`scipy.ndimage.interpolation.map_coordinates`, which
     converts coordinates of points to indices that correspond to the
@@ -41,6 +41,9 @@ def interp3d(input_array, coords,
                               spline interpolation of order > 1).  If
                               ``False``, it is assumed that the input is
                               already filtered. Default is ``True``.
+    :param int order: Order of the spline interpolation (default 3).
+                      Use 1 for trilinear interpolation, which does not
+                      require the spline filter.
 
     :returns: 1-d array of values corresponding to the interpolated
               values at the points given in ``coords``.
@@ -62,7 +65,7 @@ def interp3d(input_array, coords,
                zip(dims, coords, offset, scale)]
 
     values = map_coordinates(input_array, indices, mode='wrap',
-                             prefilter=prefilter)
+                             prefilter=prefilter, order=order)
     dtype = input_array.dtype
     return np.array(values, dtype)
 
@@ -10,7 +10,9 @@
 
 Two functions {pelgev, samlmu} from the LMOMENTS Fortran package
 ported to Python to fit a Generalised Extreme Value Distribution
-function. Original code developed by: J. R. M. HOSKING, IBM RESEARCH
+function. The functions :func:`samlmu2d`, :func:`pelgev2d` and
+:func:`pelgpa2d` are vectorised equivalents that process many samples
+(e.g. all grid points of a tile) at once. Original code developed by: J. R. M. HOSKING, IBM RESEARCH
 DIVISION, T. J. WATSON RESEARCH CENTER, YORKTOWN HEIGHTS, NEW YORK
 10598, U.S.A.
 
@@ -345,3 +347,212 @@ def samlmu3(X):
         XMOM[2] = XMOM[2] - COEF12*X[NHALF]
     XMOM = [XMOM[0]/N, XMOM[1]/N, XMOM[2]/XMOM[1]]
     return numpy.array(XMOM)
+
+
+def samlmu2d(X, NMOM=3, counts=None, axis=0):
+    """
+    Sample L-moments for each column of a 2-D array. This is a
+    vectorised equivalent of :func:`samlmu`, which calculates the
+    unbiased probability weighted moments of all columns at once.
+
+    :param X: 2-D array of data. Each column (or row, see `axis`)
+              must be sorted in ascending order.
+    :type  X: :class:`numpy.ndarray`
+    :param int NMOM: Number of L-moments to be found.
+    :param counts: Optional number of valid values in each column. Only
+                   the largest `counts` values (i.e. the last values) of
+                   each column are used, so invalid values must sort
+                   before the valid values (e.g. zeros when only positive
+                   values are valid). By default all values are used.
+    :type  counts: :class:`numpy.ndarray` or int
+    :param int axis: Axis along which the samples are sorted.
+
+    :returns: Array of shape (NMOM, number of columns) containing the
+              L-moments Lambda-1, Lambda-2 and the L-moment ratios
+              TAU3, TAU4, ... of each column. The values are NaN for
+              columns with fewer than NMOM valid values, and the
+              L-moment ratios are NaN if all valid values are equal.
+    :rtype: :class:`numpy.ndarray`
+
+    """
+
+    X = numpy.asarray(X, dtype=float)
+    if X.ndim == 1:
+        X = X[:, numpy.newaxis]
+    elif axis != 0:
+        X = X.T
+    N, M = X.shape
+    NMOM = int(NMOM)
+
+    if counts is None:
+        n = N * numpy.ones(M)
+    else:
+        n = numpy.asarray(counts, dtype=float) * numpy.ones(M)
+
+    # Rank of each value within the valid values of its column (from
+    # zero); invalid values have a negative rank:
+    rank = numpy.arange(N, dtype=float)[:, numpy.newaxis] - (N - n)
+    valid = rank >= 0.
+    X = numpy.where(valid, X, 0.)
+
+    XMOM = numpy.zeros((NMOM, M))
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        # Unbiased probability weighted moments b_0 ... b_(NMOM-1):
+        B = numpy.zeros((NMOM, M))
+        W = valid.astype(float)
+        for K in xrange(NMOM):
+            if K > 0:
+                W = W * (rank - (K - 1)) / (n - K)
+            B[K] = (W * X).sum(axis=0) / n
+
+        # L-moments are linear combinations of the PWMs:
+        for K in xrange(NMOM):
+            for J in xrange(K + 1):
+                P = (-1)**(K - J) * _comb(K, J) * _comb(K + J, J)
+                XMOM[K] += P * B[J]
+
+        # L-moment ratios:
+        if NMOM > 2:
+            XMOM[2:] = XMOM[2:] / XMOM[1]
+
+    XMOM[:, n < max(NMOM, 2)] = numpy.nan
+    return XMOM
+
+
+def _comb(N, K):
+    """Binomial coefficient N choose K"""
+    result = 1
+    for I in xrange(1, K + 1):
+        result = result * (N - K + I) // I
+    return result
+
+
+def pelgev2d(XMOM):
+    """
+    Parameter estimation via L-moments for the Generalised Extreme
+    Value Distribution for many sets of L-moments at once. This is a
+    vectorised equivalent of :func:`pelgev`.
+
+    :param XMOM: Array with first dimension of length 3, containing the
+                 L-moments Lambda-1, Lambda-2 and TAU3 (e.g. as returned
+                 by :func:`samlmu2d`).
+    :type  XMOM: :class:`numpy.ndarray`
+
+    :returns: Location, scale and shape parameters of the GEV
+              distribution, with the same shape as `XMOM`. The
+              parameters are zero for invalid L-moments, as for
+              :func:`pelgev`.
+    :rtype: :class:`numpy.ndarray`
+
+    """
+
+    XMOM = numpy.asarray(XMOM, dtype=float)
+    shape = XMOM.shape
+    XMOM = XMOM.reshape((3, -1))
+    L1, L2, T3 = XMOM
+    PARA = numpy.zeros(XMOM.shape)
+
+    P8 = 0.8
+    P97 = 0.97
+    SMALL = 1E-5
+    EPS = 1E-6
+    MAXIT = 20
+    EU = 0.57721566
+    DL2 = 0.69314718
+    DL3 = 1.0986123
+    A0 = 0.28377530
+    A1 = -1.21096399
+    A2 = -2.50728214
+    A3 = -1.13455566
+    A4 = -0.07138022
+    B1 = 2.06189696
+    B2 = 1.31912239
+    B3 = 0.25077104
+    C1 = 1.59921491
+    C2 = -0.48832213
+    C3 = 0.01573152
+    D1 = -0.64363929
+    D2 = 0.08985247
+
+    valid = (L2 > 0.0) & (numpy.abs(T3) < 1.0)
+
+    with numpy.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        # Rational-function approximations for TAU3 between 0 and 1,
+        # and between -0.8 and 0:
+        Z = 1.0 - T3
+        G = numpy.where(T3 > 0.0,
+                        (-1.0+Z*(C1+Z*(C2+Z*C3)))/(1.0+Z*(D1+Z*D2)),
+                        (A0+T3*(A1+T3*(A2+T3*(A3+T3*A4))))/
+                        (1.0+T3*(B1+T3*(B2+T3*B3))))
+
+        # Newton-Raphson iteration for TAU3 less than -0.8:
+        nr = valid & (T3 < -P8)
+        if nr.any():
+            T3nr = T3[nr]
+            Gnr = numpy.where(T3nr <= -P97,
+                              1.0 - numpy.log(1.0 + T3nr)/DL2, G[nr])
+            T0 = (T3nr + 3.0)*0.5
+            active = numpy.ones(Gnr.shape, dtype=bool)
+            for IT in xrange(MAXIT):
+                X2 = 2.0**(-Gnr)
+                X3 = 3.0**(-Gnr)
+                XX2 = 1.0 - X2
+                XX3 = 1.0 - X3
+                T = XX3/XX2
+                DERIV = (XX2*X3*DL3 - XX3*X2*DL2)/(XX2*XX2)
+                GNEW = Gnr - (T - T0)/DERIV
+                converged = numpy.abs(GNEW - Gnr) <= EPS*GNEW
+                Gnr = numpy.where(active, GNEW, Gnr)
+                active &= ~converged
+                if not active.any():
+                    break
+            G[nr] = Gnr
+
+        # Estimate alpha, xi:
+        GAM = special.gamma(1.0+G)
+        PARA[2] = G
+        PARA[1] = L2*G/(GAM*(1.0-2.0**(-G)))
+        PARA[0] = L1-PARA[1]*(1.0-GAM)/G
+
+    # Estimated K effectively zero:
+    zero = valid & (T3 > 0.0) & (numpy.abs(G) < SMALL)
+    PARA[2, zero] = 0.0
+    PARA[1, zero] = L2[zero]/DL2
+    PARA[0, zero] = L1[zero] - EU*PARA[1, zero]
+
+    PARA[:, ~valid] = 0.0
+    return PARA.reshape(shape)
+
+
+def pelgpa2d(XMOM):
+    """
+    Parameter estimation via L-moments for the Generalised Pareto
+    Distribution for many sets of L-moments at once. This is a
+    vectorised equivalent of :func:`pelgpa`.
+
+    :param XMOM: Array with first dimension of length 3, containing the
+                 L-moments Lambda-1, Lambda-2 and TAU3.
+    :type  XMOM: :class:`numpy.ndarray`
+
+    :returns: Location, scale and shape parameters of the GPD, with the
+              same shape as `XMOM`. The parameters are zero for invalid
+              L-moments, as for :func:`pelgpa`.
+    :rtype: :class:`numpy.ndarray`
+
+    """
+
+    XMOM = numpy.asarray(XMOM, dtype=float)
+    shape = XMOM.shape
+    XMOM = XMOM.reshape((3, -1))
+    L1, L2, T3 = XMOM
+    PARA = numpy.zeros(XMOM.shape)
+
+    valid = (L2 > 0.0) & (numpy.abs(T3) < 1.0)
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        G = (1.0 - 3.0 * T3) / (1.0 + T3)
+        PARA[2] = G
+        PARA[1] = (1.0 + G) * (2.0 + G) * L2
+        PARA[0] = L1 - PARA[1] / (1.0 + G)
+
+    PARA[:, ~valid] = 0.0
+    return PARA.reshape(shape)
@@ -96,6 +96,9 @@ def bear2LatLon(bearing, distance, oLon, oLat):
     Calculate the longitude and latitude of a new point from an origin
     point given a distance and bearing.
 
+    The inputs can be scalars or arrays (e.g. the positions of many
+    tropical cyclones at the same time step).
+
     :param bearing: Direction to new position (degrees, +ve clockwise
                     from north).
     :param distance: Distance to new position (km).
@@ -105,18 +108,18 @@ def bear2LatLon(bearing, distance, oLon, oLat):
     :returns: new longitude and latitude (in degrees)
     """
     radius = 6367.0 # Earth radius (km)
-    oLon = math.radians(oLon)
-    oLat = math.radians(oLat)
-    bear = math.radians(bearing)
+    oLon = np.radians(oLon)
+    oLat = np.radians(oLat)
+    bear = np.radians(bearing)
 
-    nLat = math.asin(np.sin(oLat) * np.cos(distance / radius) + \
+    nLat = np.arcsin(np.sin(oLat) * np.cos(distance / radius) + \
             np.cos(oLat) * np.sin(distance / radius) * np.cos(bear))
     aa = np.sin(bear) * np.sin(distance / radius) * np.cos(oLat)
     bb = np.cos(distance / radius) - np.sin(oLat) * np.sin(nLat)
 
     nLon = oLon + np.arctan2(aa, bb)
 
-    return math.degrees(nLon), math.degrees(nLat)
+    return np.degrees(nLon), np.degrees(nLat)
 
 def latLon2XY(xr, yr, lat, lon, ieast=1, azimuth=0):
     """
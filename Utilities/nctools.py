@@ -300,7 +300,10 @@ def ncSaveGrid(filename, dimensions, variables, nodata=-9999,
                              ...}
     
         The value for the 'dims' key must be a tuple that is a subset of
-        the dimensions specified above.
+        the dimensions specified above. Optional keys
+        'least_significant_digit' and 'chunksizes' set the precision
+        and the HDF5 chunk shape (a tuple with one entry per dimension)
+        of an individual variable.
     
     :param float nodata: Value to assign to missing data, default is -9999.
     :param str datatitle: Optional title to give the stored dataset.
@@ -368,11 +371,17 @@ def ncSaveGrid(filename, dimensions, variables, nodata=-9999,
         else:
             varlsd = lsd
 
+        if v.has_key('chunksizes'):
+            varchunks = v['chunksizes']
+        else:
+            varchunks = None
+
         var = ncobj.createVariable(v['name'], v['dtype'],
                                    v['dims'], 
                                    zlib=zlib,
                                    complevel=complevel,
                                    least_significant_digit=varlsd,
+                                   chunksizes=varchunks,
                                    fill_value=nodata)
 
         if (writedata and v['values'] is not None):
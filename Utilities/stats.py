@@ -16,6 +16,7 @@ import logging
 import math
 from scipy import array, arange, size, zeros
 from numpy import *
+import numpy as np
 
 from grid import grdRead
 
@@ -32,6 +33,8 @@ cdf2d(x,y,z): 2D array of float
 getCellNum(lon, lat, gridLimit, gridSpace): int
     Determine the cell number based on the lat/lon, the grid bounds
     and the grid spacing.
+getCellNums(lon, lat, gridLimit, gridSpace): 1D array of int
+    Array version of getCellNum.
 getCellLonLat(cellNum, gridLimit, gridSpace): 2D float
     Determine the lat/lon  of the northwestern corner of
     cellNum
@@ -40,6 +43,9 @@ validCellNum(cellNum, gridLimit, gridSpace): boolean
     the bounds of the region defined by gridSpace and gridLimit
 maxCellNum(gridLimit, gridSpace): int
     Determine maximum cell number based on grid limits and spacing.
+CellIndex(lon, lat, gridLimit, gridSpace, mask): object
+    Spatial index of observations, for extracting the observations
+    within (expanded) grid cells.
 """
 def cdf(x, y):
     """
@@ -69,13 +75,10 @@ def cdf2d(x, y, z):
     grid_area = abs(x[1] - x[0])*abs(y[1] - y[0])
     grid_volume = grid_area*z
 
+    # Cumulative sum along both axes, i.e. the sum of the volume below
+    # and to the left of each point:
     cz = zeros([x.size, y.size], 'd')
-    cz[:, 0] = (grid_volume[:,0]).cumsum()
-    cz[0, :] = (grid_volume[0,:]).cumsum()
-
-    for i in xrange(1, len(x)):
-        for j in xrange(1, len(y)):
-            cz[i,j] = cz[i-1,j] + cz[i,j-1] - cz[i-1,j-1] + grid_volume[i,j]
+    cz[:, :] = grid_volume.cumsum(axis=0).cumsum(axis=1)
 
     if cz[-1,-1] == 0:
         return cz
@@ -99,6 +102,24 @@ def getCellNum(lon, lat, gridLimit, gridSpace):
 
     return int(i*abs((gridLimit['xMax'] - gridLimit['xMin'])/gridSpace['x']) + j)
 
+def getCellNums(lon, lat, gridLimit, gridSpace):
+    """
+    Return the cell numbers for arrays of longitude and latitude. This
+    is the array equivalent of :func:`getCellNum`, except that points
+    outside the grid are assigned a cell number of -1.
+    """
+    lon = floor(asarray(lon, dtype=float))
+    lat = ceil(asarray(lat, dtype=float))
+
+    outside = ((lon < gridLimit['xMin']) | (lon >= gridLimit['xMax']) |
+               (lat <= gridLimit['yMin']) | (lat > gridLimit['yMax']))
+
+    j = absolute((absolute(lon) - abs(gridLimit['xMin'])))//abs(gridSpace['x'])
+    i = absolute((absolute(lat) - abs(gridLimit['yMax'])))//abs(gridSpace['y'])
+    nx = abs((gridLimit['xMax'] - gridLimit['xMin'])//gridSpace['x'])
+
+    return where(outside, -1, i*nx + j).astype(int)
+
 def getCellLonLat(cellNum, gridLimit, gridSpace):
     """
     Return the lon/lat of a given cell, based on gridLimit and gridSpace
@@ -137,6 +158,132 @@ def maxCellNum(gridLimit, gridSpace):
 
     return latCells*lonCells - 1
 
+class CellIndex(object):
+    """
+    Spatial index of a set of observations, used to extract the
+    observations that lie within a rectangle (e.g. a grid cell, or a
+    grid cell expanded to include more observations) without testing
+    every observation.
+
+    The observations are binned on the grid cells defined by `gridLimit`
+    and `gridSpace` (see :func:`getCellLonLat`), and sorted by bin, so
+    the observations of each row of bins are contiguous. As for the
+    cells, the rows of bins are counted down from the northern limit, so
+    the bottom row extends below the southern limit if the grid does not
+    span a whole number of rows. The observations in the bins that lie
+    entirely within a rectangle are taken without testing them, and only
+    the observations in the bins on the edges of the rectangle are
+    tested. The number of observations in the interior bins is obtained
+    from 2-d cumulative counts. Observations outside the grid are not
+    indexed.
+
+    :param lon: array of longitudes of the observations.
+    :param lat: array of latitudes of the observations.
+    :param dict gridLimit: the bounds of the grid.
+    :param dict gridSpace: the size of the bins.
+    :param mask: optional boolean array selecting the observations to
+                 index (e.g. the valid observations over land).
+
+    """
+
+    # Tolerance (in bins) for treating the edge of a rectangle as the
+    # edge of a bin:
+    eps = 1e-6
+
+    def __init__(self, lon, lat, gridLimit, gridSpace, mask=None):
+        self.lon = np.asarray(lon, dtype=float)
+        self.lat = np.asarray(lat, dtype=float)
+        self.dx = float(gridSpace['x'])
+        self.dy = float(gridSpace['y'])
+        self.nx = int(np.ceil((gridLimit['xMax'] - gridLimit['xMin']) /
+                              self.dx - self.eps))
+        self.ny = int(np.ceil((gridLimit['yMax'] - gridLimit['yMin']) /
+                              self.dy - self.eps))
+        self.x0 = gridLimit['xMin']
+        self.y0 = gridLimit['yMax'] - self.ny * self.dy
+
+        x = (self.lon - self.x0) / self.dx
+        y = (self.lat - self.y0) / self.dy
+        valid = ((x >= 0) & (x < self.nx) & (y >= 0) & (y < self.ny))
+        if mask is not None:
+            valid &= np.asarray(mask, dtype=bool)
+        obs = np.flatnonzero(valid)
+
+        bins = (np.floor(y[obs]).astype(int) * self.nx +
+                np.floor(x[obs]).astype(int))
+        order = np.argsort(bins, kind='mergesort')
+        self.obs = obs[order]
+
+        counts = np.bincount(bins, minlength=self.nx * self.ny)
+        self.start = np.zeros(self.nx * self.ny + 1, dtype=int)
+        self.start[1:] = np.cumsum(counts)
+        self.cumcount = np.zeros((self.ny + 1, self.nx + 1), dtype=int)
+        self.cumcount[1:, 1:] = counts.reshape((self.ny, self.nx)) \
+                                      .cumsum(axis=0).cumsum(axis=1)
+
+    def _range(self, lo, hi, origin, step, n):
+        """
+        Return the range of bins that overlap [lo, hi), and the range
+        of bins that lie entirely within it.
+        """
+        a = (lo - origin) / step
+        b = (hi - origin) / step
+        outer = (int(np.clip(np.floor(a - self.eps), 0, n)),
+                 int(np.clip(np.ceil(b + self.eps), 0, n)))
+        i0 = int(np.clip(np.ceil(a + self.eps), outer[0], outer[1]))
+        i1 = int(np.clip(np.floor(b - self.eps), i0, outer[1]))
+        return outer, (i0, i1)
+
+    def _edges(self, wLon, eLon, sLat, nLat):
+        """
+        Return the observations in the bins on the edges of a rectangle
+        that lie within it, and the ranges of the interior bins.
+        """
+        (x0, x1), (i0, i1) = self._range(wLon, eLon, self.x0, self.dx,
+                                         self.nx)
+        (y0, y1), (j0, j1) = self._range(sLat, nLat, self.y0, self.dy,
+                                         self.ny)
+        slices = []
+        for j in range(y0, y1):
+            row = j * self.nx
+            if j0 <= j < j1:
+                slices.append(self.obs[self.start[row + x0]:
+                                       self.start[row + i0]])
+                slices.append(self.obs[self.start[row + i1]:
+                                       self.start[row + x1]])
+            else:
+                slices.append(self.obs[self.start[row + x0]:
+                                       self.start[row + x1]])
+        edge = np.concatenate(slices) if slices else \
+            np.zeros(0, dtype=int)
+        lon = self.lon[edge]
+        lat = self.lat[edge]
+        inside = ((lon >= wLon) & (lon < eLon) &
+                  (lat >= sLat) & (lat < nLat))
+        return edge[inside], (i0, i1), (j0, j1)
+
+    def count(self, wLon, eLon, sLat, nLat):
+        """
+        Count the observations within the rectangle
+        [wLon, eLon) x [sLat, nLat).
+        """
+        edge, (i0, i1), (j0, j1) = self._edges(wLon, eLon, sLat, nLat)
+        c = self.cumcount
+        return len(edge) + c[j1, i1] - c[j0, i1] - c[j1, i0] + c[j0, i0]
+
+    def query(self, wLon, eLon, sLat, nLat):
+        """
+        Return the (sorted) indices of the observations within the
+        rectangle [wLon, eLon) x [sLat, nLat).
+        """
+        edge, (i0, i1), (j0, j1) = self._edges(wLon, eLon, sLat, nLat)
+        slices = [edge]
+        for j in range(j0, j1):
+            row = j * self.nx
+            slices.append(self.obs[self.start[row + i0]:
+                                   self.start[row + i1]])
+        return np.sort(np.concatenate(slices))
+
 def getOccurence(occurList, indList):
     """
     Returns an array of indices corresponding to cyclone observations that
@@ -6,6 +6,8 @@
     :synopsis: Provides additional random variates beyond those in the `random` libray.
                - logisticvariate
                - cauchyvariate
+               Also provides independent random number streams for
+               each simulation (:class:`SimulationStream`).
 
 .. moduleauthor:: Craig Arthur <craig.arthur@ga.gov.au>
 .. |mu| unicode:: U+003BC .. GREEK SMALL LETTER MU
@@ -15,6 +17,7 @@
 """
 import random
 import math
+import numpy as np
 
 class Random(random.Random):
     """
@@ -52,3 +55,93 @@ class Random(random.Random):
         """
         u1 = self.random()
         return x0 + gamma * math.tan(math.pi * (u1 - 0.5))
+
+def simulationState(seed=None, index=0):
+    """
+    Create the random number generator for a simulation.
+
+    The state is keyed by both the seed and the simulation index, so
+    each simulation has an independent and reproducible stream of
+    random values, regardless of the processor (or the order) in which
+    the simulations are run.
+
+    :param int seed: Seed for the set of simulations. If `None`, the
+                     generator is seeded from the system.
+    :param int index: Simulation index.
+
+    :returns: :class:`numpy.random.RandomState` for the simulation.
+
+    """
+    if seed is None:
+        return np.random.RandomState()
+    return np.random.RandomState([seed, index])
+
+class SimulationStream(object):
+    """
+    An independent stream of random values for a simulation, with the
+    same interface as :class:`Random` for drawing single values.
+
+    Values are drawn from a :class:`numpy.random.RandomState` (see
+    :func:`simulationState`) in blocks of `blocksize` values, and
+    returned one at a time.
+
+    :param int seed: Seed for the set of simulations.
+    :param int index: Simulation index.
+    :param int blocksize: Number of values to draw at a time.
+
+    """
+
+    def __init__(self, seed=None, index=0, blocksize=1024):
+        self.blocksize = blocksize
+        self.seed(seed, index)
+
+    def seed(self, seed=None, index=0):
+        """
+        Reset the stream to the start of the stream for a simulation.
+
+        :param int seed: Seed for the set of simulations.
+        :param int index: Simulation index.
+
+        """
+        self.generator = simulationState(seed, index)
+        self._uniform = []
+        self._normal = []
+
+    def random(self):
+        """
+        Random variate from the uniform distribution on [0, 1).
+        """
+        if not self._uniform:
+            block = self.generator.random_sample(self.blocksize)
+            self._uniform = block.tolist()[::-1]
+        return self._uniform.pop()
+
+    def uniform(self, a, b):
+        """
+        Random variate from the uniform distribution on [a, b).
+        """
+        return a + (b - a) * self.random()
+
+    def normalvariate(self, mu, sigma):
+        """
+        Random variate from the normal distribution.
+
+        :param float mu: Mean.
+        :param float sigma: Standard deviation.
+
+        """
+        if not self._normal:
+            block = self.generator.standard_normal(self.blocksize)
+            self._normal = block.tolist()[::-1]
+        return mu + sigma * self._normal.pop()
+
+    def logisticvariate(self, mu, sigma):
+        """
+        Random variate from the logistic distribution.
+
+        :param float mu: Location parameter (|mu| real).
+        :param float sigma: Scale parameter (|sigma| > 0).
+
+        """
+        u1 = self.random()
+        return mu + sigma * math.log(u1 / (1 - u1))
@@ -0,0 +1,416 @@
+"""
+:mod:`trackCatalogue` -- read and write binary track catalogues
+===============================================================
+
+.. module:: trackCatalogue
+    :synopsis: Store tropical cyclone tracks in a netCDF4 file as
+               contiguous ragged arrays.
+
+The track files written by :mod:`TrackGenerator` can be stored as a
+netCDF4 track catalogue instead of a csv file. The observations of all
+tracks are stored along the ``obs`` dimension as contiguous ragged
+arrays (following the CF conventions for discrete sampling
+geometries). For each track (along the ``event`` dimension), the
+``row_size`` variable gives the number of observations, the ``event``
+variable gives the cyclone number and the ``simulation`` variable gives
+the simulation index, so the tracks of several simulations can be held
+in one catalogue.
+
+The values are stored in the same units as the csv track files (km/hr,
+degrees, hPa and km), and the catalogue can be exported to a csv track
+file with :func:`exportCSV`.
+
+The csv track files can be read with :func:`readCSV`, which parses and
+converts each column of the file at once (as :func:`trackRecords` does
+for tracks held in memory), and the observations split into individual
+tracks with :func:`splitTracks`.
+
+"""
+
+import logging
+
+import numpy as np
+from datetime import datetime
+
+from Utilities import nctools
+from Utilities.metutils import convert
+from Utilities.maputils import bearing2theta
+
+log = logging.getLogger(__name__)
+log.addHandler(logging.NullHandler())
+
+TRACKFILE_COLS = ('CycloneNumber', 'Datetime', 'TimeElapsed', 'Longitude',
+                  'Latitude', 'Speed', 'Bearing', 'CentralPressure',
+                  'EnvPressure', 'rMax')
+
+TRACKFILE_HEADER = ','.join(TRACKFILE_COLS) + '\n'
+
+TRACKFILE_FMT = '%i,%s,%7.3f,%8.3f,%8.3f,%6.2f,%6.2f,%7.2f,%7.2f,%6.2f'
+
+# Variables stored along the `obs` dimension, in the order of the
+# track file columns (excluding the cyclone number):
+OBS_VARIABLES = (
+    ('Datetime', 'time', 'f8',
+     {'long_name': 'Time', 'units': 'hours since 1900-01-01 00:00:00',
+      'calendar': 'standard'}),
+    ('TimeElapsed', 'time_elapsed', 'f8',
+     {'long_name': 'Time since genesis', 'units': 'hr'}),
+    ('Longitude', 'lon', 'f8',
+     {'long_name': 'Longitude', 'units': 'degrees_east'}),
+    ('Latitude', 'lat', 'f8',
+     {'long_name': 'Latitude', 'units': 'degrees_north'}),
+    ('Speed', 'speed', 'f8',
+     {'long_name': 'Forward speed', 'units': 'km/hr'}),
+    ('Bearing', 'bearing', 'f8',
+     {'long_name': 'Bearing', 'units': 'degrees'}),
+    ('CentralPressure', 'pressure', 'f8',
+     {'long_name': 'Central pressure', 'units': 'hPa'}),
+    ('EnvPressure', 'env_pressure', 'f8',
+     {'long_name': 'Environmental pressure', 'units': 'hPa'}),
+    ('rMax', 'rmax', 'f8',
+     {'long_name': 'Radius to maximum winds', 'units': 'km'}),
+)
+
+# Conversions applied to the track data when the tracks are loaded,
+# matching the converters used for the csv track files:
+CONVERTERS = {
+    'Speed': lambda v: convert(v, 'kph', 'mps'),
+    'Bearing': lambda v: bearing2theta(v * np.pi / 180.),
+    'CentralPressure': lambda v: convert(v, 'hPa', 'Pa'),
+    'EnvPressure': lambda v: convert(v, 'hPa', 'Pa'),
+}
+
+EPOCH = np.datetime64(datetime(1900, 1, 1), 's')
+
+
+def isCatalogue(trackfile):
+    """
+    Determine if a track file is a netCDF4 track catalogue (based on the
+    file extension).
+
+    :param str trackfile: the track data filename.
+
+    :returns: `True` if the file is a track catalogue.
+
+    """
+    return trackfile.endswith('.nc')
+
+
+def saveTrackCatalogue(filename, tracks, simulation=0, culled=None,
+                       weights=None):
+    """
+    Save the tracks generated for a simulation to a track catalogue.
+
+    :param str filename: path to the output file.
+    :param tracks: :class:`numpy.ndarray` of tracks, with the columns
+                   given by `TRACKFILE_COLS` (as returned by
+                   :meth:`TrackGenerator.generateTracks`). The
+                   observations of each track must be contiguous.
+    :param int simulation: the simulation index of the tracks.
+    :param int culled: optional number of tracks of the simulation that
+                       were culled (see :class:`TrackGenerator`), stored
+                       in the `culled_tracks` attribute.
+    :param weights: optional :class:`numpy.ndarray` of the likelihood
+                    ratio of each track, stored in the `weight`
+                    variable.
+
+    """
+
+    tracks = np.asarray(tracks)
+    if len(tracks) == 0:
+        tracks = np.empty((0, len(TRACKFILE_COLS)), dtype=object)
+
+    number = tracks[:, 0].astype(int)
+    starts = np.flatnonzero(np.diff(number) != 0) + 1
+    starts = np.concatenate([[0], starts]) if len(number) > 0 else starts
+    rowSize = np.diff(np.concatenate([starts, [len(number)]]))
+
+    dates = np.array(tracks[:, 1], dtype='datetime64[s]')
+    hours = (dates - EPOCH).astype(np.int64) / 3600.
+
+    dimensions = {
+        0: {'name': 'event', 'values': number[starts], 'dtype': 'i',
+            'atts': {'long_name': 'Cyclone number'}},
+        1: {'name': 'obs', 'values': np.arange(len(number)), 'dtype': 'i',
+            'atts': {'long_name': 'Observation number'}}
+    }
+
+    variables = {
+        0: {'name': 'row_size', 'dims': ('event',), 'values': rowSize,
+            'dtype': 'i',
+            'atts': {'long_name': 'Number of observations for each track',
+                     'sample_dimension': 'obs'}},
+        1: {'name': 'simulation', 'dims': ('event',),
+            'values': simulation * np.ones(len(starts), dtype=int),
+            'dtype': 'i',
+            'atts': {'long_name': 'Simulation number'}},
+        2: {'name': 'time', 'dims': ('obs',), 'values': hours,
+            'dtype': 'f8', 'atts': OBS_VARIABLES[0][3]}
+    }
+
+    for col, (column, name, dtype, atts) in enumerate(OBS_VARIABLES[1:]):
+        variables[col + 3] = {'name': name, 'dims': ('obs',),
+                              'values': tracks[:, col + 2].astype(dtype),
+                              'dtype': dtype, 'atts': atts}
+
+    if weights is not None:
+        variables[len(variables)] = {
+            'name': 'weight', 'dims': ('event',),
+            'values': np.asarray(weights, dtype='f8'), 'dtype': 'f8',
+            'atts': {'long_name': 'Likelihood ratio of the genesis point'}}
+
+    gatts = {'featureType': 'trajectory'}
+    if culled is not None:
+        gatts['culled_tracks'] = int(culled)
+    nctools.ncSaveGrid(filename, dimensions, variables, gatts=gatts)
+
+
+def readTrackCatalogue(filename, names=TRACKFILE_COLS, formats=None,
+                       converters=CONVERTERS):
+    """
+    Read the observations of all tracks in a track catalogue into a
+    :class:`numpy.ndarray`.
+
+    :param str filename: path to the track catalogue.
+    :param tuple names: names of the fields to load.
+    :param tuple formats: formats of the fields (default is 'i' for the
+                          cyclone number, `object` for the dates and 'f8'
+                          for the remaining fields).
+    :param dict converters: functions to convert each field from the
+                            units of the catalogue (applied to the whole
+                            field at once).
+
+    :returns: structured array of the track observations, and the number
+              of observations of each track.
+
+    """
+
+    if formats is None:
+        formats = [{'CycloneNumber': 'i',
+                    'Datetime': object}.get(name, 'f8') for name in names]
+    dtype = {'names': names, 'formats': formats}
+
+    ncobj = nctools.ncLoadFile(filename)
+    rowSize = np.asarray(ncobj.variables['row_size'][:], dtype=int)
+    number = np.asarray(ncobj.variables['event'][:], dtype=int)
+
+    data = np.empty(rowSize.sum(), dtype=dtype)
+    varnames = dict((v[0], v[1]) for v in OBS_VARIABLES)
+
+    for name in names:
+        if name == 'CycloneNumber':
+            data[name] = np.repeat(number, rowSize)
+            continue
+
+        values = np.asarray(ncobj.variables[varnames[name]][:])
+        if name == 'Datetime':
+            seconds = np.round(values * 3600.).astype(np.int64)
+            values = EPOCH + seconds.astype('timedelta64[s]')
+            values = values.astype(object)
+        elif converters and name in converters:
+            values = converters[name](values)
+        data[name] = values
+
+    ncobj.close()
+    return data, rowSize
+
+
+def readTracks(filename, names=TRACKFILE_COLS, formats=None,
+               converters=CONVERTERS):
+    """
+    Read the tracks from a track catalogue into a list of
+    :class:`numpy.ndarray` (one for each track). The arguments are as for
+    :func:`readTrackCatalogue`.
+
+    As for the csv track files, an empty catalogue returns a list holding
+    a single empty array.
+
+    :returns: list of structured arrays.
+
+    """
+
+    data, rowSize = readTrackCatalogue(filename, names, formats, converters)
+    if len(rowSize) == 0:
+        return [data]
+    return np.split(data, np.cumsum(rowSize)[:-1])
+
+
+def parseDates(values):
+    """
+    Convert an array of date strings in the format of the track files
+    (e.g. '2000-01-01 06:00:00') to `datetime64[s]` values.
+
+    The date and the time of day are converted separately, as numpy
+    (before version 1.11) converts a date and time without a time zone
+    from the local time zone, which would shift the dates by its UTC
+    offset.
+
+    :param values: :class:`numpy.ndarray` of date strings.
+
+    :returns: :class:`numpy.ndarray` of `datetime64[s]` values.
+
+    """
+
+    values = np.asarray(values)
+    if len(values) == 0:
+        return values.astype('datetime64[s]')
+    if (np.char.str_len(values) != 19).any():
+        raise ValueError("Dates must have the format 'YYYY-MM-DD HH:MM:SS'")
+
+    values = values.astype('S19')
+    digits = values.view(np.uint8).reshape(len(values), 19).astype(int)
+    digits -= ord('0')
+    hours = 10 * digits[:, 11] + digits[:, 12]
+    minutes = 10 * digits[:, 14] + digits[:, 15]
+    seconds = 10 * digits[:, 17] + digits[:, 18]
+    days = values.astype('S10').astype('datetime64[D]')
+    return (days.astype('datetime64[s]') +
+            (3600 * hours + 60 * minutes + seconds).astype('timedelta64[s]'))
+
+
+def trackRecords(tracks, names=TRACKFILE_COLS, formats=None,
+                 converters=CONVERTERS):
+    """
+    Convert an array of track observations, with one row for each
+    observation and the columns in the order of the track files (as
+    returned by :meth:`TrackGenerator.generateTracks`), into a
+    structured :class:`numpy.ndarray`. The remaining arguments are as
+    for :func:`readTrackCatalogue`.
+
+    Each column is converted in a single operation: the dates are
+    converted to `datetime64[s]` values (see :func:`parseDates`), and
+    only converted to :class:`datetime.datetime` objects if the format
+    of the field is `object`, and the `converters` are applied to whole
+    columns.
+
+    :returns: structured array of the track observations.
+
+    """
+
+    if formats is None:
+        formats = [{'CycloneNumber': 'i',
+                    'Datetime': object}.get(name, 'f8') for name in names]
+    dtype = np.dtype({'names': names, 'formats': formats})
+
+    data = np.empty(len(tracks), dtype=dtype)
+    if len(tracks) == 0:
+        return data
+
+    for col, name in enumerate(names):
+        values = tracks[:, col]
+        if name == 'Datetime':
+            if values.dtype.kind in 'SU':
+                values = parseDates(values)
+            else:
+                values = values.astype('datetime64[s]')
+            if dtype[name] == np.dtype(object):
+                values = values.astype(object)
+        else:
+            if values.dtype.kind in 'SU':
+                values = np.where(values == '', '0', values)
+            values = values.astype(float)
+            if converters and name in converters:
+                values = converters[name](values)
+        data[name] = values
+
+    return data
+
+
+def readCSV(filename, names=TRACKFILE_COLS, formats=None,
+            converters=CONVERTERS):
+    """
+    Read a csv format track file into a :class:`numpy.ndarray`. The
+    arguments are as for :func:`readTrackCatalogue`, with the fields
+    taken from the columns of the file in order.
+
+    Rather than converting each value of the file separately, the file
+    is split into columns of strings which are then converted with
+    :func:`trackRecords`.
+
+    :returns: structured array of the track observations.
+
+    """
+
+    with open(filename) as fp:
+        rows = [line.rstrip().split(',') for line in fp
+                if line.strip() and not line.startswith('%')]
+
+    if len(rows) == 0:
+        return trackRecords([], names, formats, converters)
+
+    columns = np.char.strip(np.array(rows))
+    return trackRecords(columns, names, formats, converters)
+
+
+def splitTracks(data):
+    """
+    Split the observations of a track file into individual tracks, based
+    on changes in the cyclone number. The observations of each track must
+    be contiguous (as in the files written by :mod:`TrackGenerator`).
+
+    As for the track catalogues, an empty array returns a list holding
+    the empty array.
+
+    :param data: structured :class:`numpy.ndarray` of track observations,
+                 as returned by :func:`readCSV`.
+
+    :returns: list of structured arrays.
+
+    """
+
+    if len(data) == 0:
+        return [data]
+    starts = np.flatnonzero(np.diff(data['CycloneNumber'])) + 1
+    return np.split(data, starts)
+
+
+def readWeights(trackfile):
+    """
+    Read the likelihood ratio of each track of a track file (or track
+    catalogue), recorded when the genesis points of the tracks are
+    importance sampled.
+
+    :param str trackfile: the track data filename.
+
+    :returns: :class:`numpy.ndarray` of the likelihood ratio of each
+              track (in the order of the file), or `None` if they are
+              not recorded.
+
+    """
+
+    if isCatalogue(trackfile):
+        ncobj = nctools.ncLoadFile(trackfile)
+        weights = None
+        if 'weight' in ncobj.variables:
+            weights = np.array(ncobj.variables['weight'][:], dtype=float)
+        ncobj.close()
+        return weights
+
+    with open(trackfile) as fp:
+        for line in fp:
+            if not line.startswith('%'):
+                break
+            if line.startswith('%Weights='):
+                values = line[len('%Weights='):].strip()
+                if len(values) == 0:
+                    return np.array([])
+                return np.array(values.split(','), dtype=float)
+    return None
+
+
+def exportCSV(filename, csvfile):
+    """
+    Export a track catalogue to a csv format track file.
+
+    :param str filename: path to the track catalogue.
+    :param str csvfile: path to the output csv file.
+
+    """
+
+    data, rowSize = readTrackCatalogue(filename, converters=None)
+    with open(csvfile, 'w') as fp:
+        fp.write('%' + TRACKFILE_HEADER)
+        if len(data) > 0:
+            columns = [data[name] for name in TRACKFILE_COLS]
+            tracks = np.array(columns, dtype=object).T
+            np.savetxt(fp, tracks, fmt=TRACKFILE_FMT)
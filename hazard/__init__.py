@@ -14,6 +14,27 @@ Hazard calculations can be run in parallel using MPI if the
 
     mpirun -n 10 python tcrm.py cairns.ini
 
+Without MPI, the tiles can instead be processed by a pool of local
+worker processes by setting the ``NumProcesses`` option in the
+``Hazard`` section of the configuration file.
+
+If the ``Incremental`` option is set, the sorted wind speed records at
+each grid point are retained in a state file (``hazard/state.nc``).
+When further simulations are added to the event set, only the new
+wind field files are read and merged into the stored records before
+the distributions are refitted.
+
+The output file ``hazard.nc`` is chunked so that each chunk holds the
+complete set of return periods for a small block of grid points.
+Return period curves for individual locations can be extracted
+efficiently with :mod:`hazard.query`.
+
+Setting the ``MinimumPressure`` option also calculates return period
+minimum sea level pressures, and ``DirectionalSectors`` calculates
+return period wind speeds for each direction sector. These are fitted
+to the ``slp``, ``ua`` and ``va`` variables of the wind field files,
+which are read in the same pass as the maximum wind speeds.
+
 :class:`hazard` can be correctly initialised and started by
 calling the :meth: `run` with the location of a *configFile*::
 
@@ -25,9 +46,9 @@ calling the :meth: `run` with the location of a *configFile*::
 import os
 import sys
 import itertools
+import multiprocessing
 import numpy as np
 import logging
-import random
 
 from os.path import join as pjoin
 from scipy.stats import scoreatpercentile as percentile
@@ -44,6 +65,16 @@ import pdb
 log = logging.getLogger(__name__)
 log.addHandler(logging.NullHandler())
 
+# Number of grid points along each spatial dimension in a single chunk
+# of the hazard output file:
+POINT_CHUNK = 16
+
+# Reference pressure (Pa) for converting minimum sea level pressures to
+# pressure deficits. This is above any sea level pressure, so the
+# deficits are all positive and the fitted distributions do not depend
+# on the value chosen:
+SLP_REFERENCE = 110000.
+
 def setDomain(inputPath):
     """
     Establish the full extent of input wind field files
@@ -213,12 +244,13 @@ class TileGrid(object):
 
 class HazardCalculator(object):
     """
-    Calculate return period wind speeds using GEV fitting
+    Calculate return period wind speeds using GEV fitting (default),
+    GPD fitting to peaks over a threshold or empirical return levels.
 
     """
 
     def __init__(self, configFile, tilegrid, numSim, minRecords, yrsPerSim,
-                 calcCI=False):
+                 calcCI=False, numProcesses=1):
         """
         Initialise HazardCalculator object.
 
@@ -228,6 +260,11 @@ class HazardCalculator(object):
         :param int minRecords: minimum number of valid wind speed values required
                                to do fitting.
         :param int yrsPerSim:
+        :param bool calcCI: if ``True``, calculate bootstrap confidence
+                            intervals for the return period values.
+        :param int numProcesses: number of local worker processes to use
+                                 when running without MPI (default 1, i.e.
+                                 process tiles serially).
         """
         config = ConfigParser()
         config.read(configFile)
@@ -243,6 +280,53 @@ class HazardCalculator(object):
         self.minRecords = minRecords
         self.yrsPerSim = yrsPerSim
         self.calcCI = calcCI
+        self.numProcesses = numProcesses
+        self.method = config.get('Hazard', 'Method').lower()
+        if self.method not in ('gev', 'gpd', 'empirical'):
+            raise ValueError("Unknown hazard method: %s" %
+                             config.get('Hazard', 'Method'))
+        self.threshold = config.getfloat('Hazard', 'GPDThreshold')
+        log.debug("Hazard method: %s" % self.method)
+
+        self.incremental = config.getboolean('Hazard', 'Incremental')
+        self.stateFile = pjoin(self.outputPath, 'state.nc')
+        self.state = None
+        self.files = getFileList(self.inputPath)
+        self.processed = []
+        if self.incremental:
+            self.processed = loadStateFileList(self.stateFile, tilegrid,
+                                               self.inputPath)
+            previous = set(self.processed)
+            self.files = [f for f in self.files
+                          if os.path.basename(f) not in previous]
+            log.info("Incremental update: %d wind field files previously "
+                     "processed, %d new files" % (len(self.processed),
+                                                  len(self.files)))
+
+        # Additional variables fitted from the same read of each tile:
+        self.minPressure = config.getboolean('Hazard', 'MinimumPressure')
+        self.nsectors = config.getint('Hazard', 'DirectionalSectors')
+        self.variables = ['vmax']
+        if self.minPressure:
+            self.variables.append('slp')
+        if self.nsectors > 0:
+            self.variables.extend(['ua', 'va'])
+        if self.incremental and len(self.variables) > 1:
+            raise ValueError("Incremental hazard updates are only "
+                             "available for the wind speed hazard")
+
+        # Simulations with importance sampled genesis points store the
+        # maxima and the likelihood ratio of each event in the wind
+        # field files:
+        self.weights = getFileWeights(self.files)
+        if self.weights is not None:
+            if self.incremental:
+                raise ValueError("Incremental hazard updates are not "
+                                 "available for weighted simulations")
+            if self.method != 'empirical':
+                log.warning("Wind field files are weighted - calculating "
+                            "return period values from the weighted "
+                            "events instead of the %s method" % self.method)
         if self.calcCI:
             log.debug("Bootstrap confidence intervals will be calculated")
             self.sample_size = config.getint('Hazard', 'SampleSize')
@@ -260,6 +344,18 @@ class HazardCalculator(object):
         self.RPupper = np.zeros((len(self.years), len(lat), len(lon)), dtype='f')
         self.RPlower = np.zeros((len(self.years), len(lat), len(lon)), dtype='f')
 
+        self.extra = {}
+        if self.minPressure:
+            names = ['slp']
+            if self.calcCI:
+                names += ['slpupper', 'slplower']
+            for name in names:
+                self.extra[name] = np.zeros((len(self.years), len(lat),
+                                             len(lon)), dtype='f')
+        if self.nsectors > 0:
+            self.extra['wspddir'] = np.zeros((self.nsectors, len(self.years),
+                                              len(lat), len(lon)), dtype='f')
+
         self.global_atts = {'title': ('TCRM hazard simulation - '
                             'return period wind speeds'),
                             'tcrm_version': flProgramVersion(),
@@ -280,19 +376,203 @@ class HazardCalculator(object):
 
         :param tilelimits: `tuple` of tile limits
         """
-        Vr = loadFilesFromPath(self.inputPath, tilelimits)
+        if self.weights is not None:
+            data = loadTileEvents(self.files, tilelimits, self.variables)
+        else:
+            data = loadTileData(self.files, tilelimits, self.variables)
+        Vr = data['vmax']
+
+        if self.extra:
+            extra = self.calculateVariables(data, tilelimits)
+        del data
+
+        if self.incremental:
+            # Merge the new records into the previously stored records:
+            if len(self.processed) > 0:
+                Vr = np.concatenate([self.loadStateTile(tilelimits), Vr])
+            Vr.sort(axis=0)
+            state = Vr.copy()
 
         Rp, loc, scale, shp = calculate(Vr, self.years, self.nodata,
-                                        self.minRecords, self.yrsPerSim)
+                                        self.minRecords, self.yrsPerSim,
+                                        self.method, self.threshold,
+                                        self.weights, len(self.files))
 
         if self.calcCI:
             RpUpper, RpLower = calculateCI(Vr, self.years, self.nodata,
                                            self.minRecords, self.yrsPerSim,
-                                           self.sample_size, self.prange)
+                                           self.sample_size, self.prange,
+                                           self.method, self.threshold,
+                                           self.weights,
+                                           tileRandomState(tilelimits),
+                                           len(self.files))
 
-            return (tilelimits, Rp, loc, scale, shp, RpUpper, RpLower)
+            result = (tilelimits, Rp, loc, scale, shp, RpUpper, RpLower)
         else:
-            return (tilelimits, Rp, loc, scale, shp)
+            result = (tilelimits, Rp, loc, scale, shp)
+
+        if self.extra:
+            result = result + (extra,)
+
+        if self.incremental:
+            result = result + (state,)
+
+        return result
+
+    def calculateVariables(self, data, tilelimits):
+        """
+        Calculate return period values of the additional variables
+        (minimum sea level pressure and directional wind speeds) for a
+        tile.
+
+        :param dict data: 3-D `numpy.ndarray` of records for each
+                          variable read from the wind field files.
+        :param tuple tilelimits: tuple of index limits of the tile.
+
+        :returns: `dict` of return period values for each additional
+                  output variable.
+
+        """
+
+        extra = {}
+        if self.minPressure:
+            Pd = pressureDeficit(data['slp'])
+            Rp, loc, scale, shp = calculate(Pd, self.years, self.nodata,
+                                            self.minRecords, self.yrsPerSim,
+                                            self.method, self.threshold,
+                                            self.weights, len(self.files))
+            extra['slp'] = deficitToPressure(Rp, self.nodata)
+
+            if self.calcCI:
+                RpUpper, RpLower = calculateCI(Pd, self.years, self.nodata,
+                                               self.minRecords,
+                                               self.yrsPerSim,
+                                               self.sample_size, self.prange,
+                                               self.method, self.threshold,
+                                               self.weights,
+                                               tileRandomState(tilelimits),
+                                               len(self.files))
+                # The largest deficits are the lowest pressures:
+                extra['slpupper'] = deficitToPressure(RpLower, self.nodata)
+                extra['slplower'] = deficitToPressure(RpUpper, self.nodata)
+
+        if self.nsectors > 0:
+            sector = directionSector(data['ua'], data['va'], self.nsectors)
+            Rpdir = np.zeros(self.extra['wspddir'].shape[:2] +
+                             sector.shape[1:], dtype='f')
+            for s in range(self.nsectors):
+                Vs = np.where(sector == s, data['vmax'], 0.).astype('f')
+                Rpdir[s] = calculate(Vs, self.years, self.nodata,
+                                     self.minRecords, self.yrsPerSim,
+                                     self.method, self.threshold,
+                                     self.weights, len(self.files))[0]
+            extra['wspddir'] = Rpdir
+
+        return extra
+
+    def loadStateTile(self, tilelimits):
+        """
+        Load the previously stored (sorted) wind speed records for a tile
+        from the state file.
+
+        :param tuple tilelimits: tuple of index limits of a tile.
+
+        :returns: 3-D `numpy.ndarray` of wind speed records.
+
+        """
+
+        (xmin, xmax, ymin, ymax) = tilelimits
+        xmin -= self.tilegrid.imin
+        xmax -= self.tilegrid.imin
+        ymin -= self.tilegrid.jmin
+        ymax -= self.tilegrid.jmin
+
+        ncobj = nctools.ncLoadFile(self.stateFile)
+        data = ncobj.variables['wspd'][:, ymin:ymax, xmin:xmax]
+        ncobj.close()
+        return np.array(data, dtype='f')
+
+    def createState(self):
+        """
+        Create a new state file to hold the merged, sorted wind speed
+        records. The file is written to a temporary location and only
+        replaces the existing state file once all tiles are complete.
+
+        """
+
+        lon, lat = self.tilegrid.getDomainExtent()
+        files = self.processed + [os.path.basename(f) for f in self.files]
+
+        dimensions = {
+            0: {
+                'name': 'record',
+                'values': np.arange(len(files)),
+                'dtype': 'i',
+                'atts': {
+                    'long_name': 'Rank of the wind speed record'
+                }
+            },
+            1: {
+                'name': 'lat',
+                'values': lat,
+                'dtype': 'f',
+                'atts': {
+                    'long_name': 'Latitude',
+                    'standard_name': 'latitude',
+                    'units': 'degrees_north',
+                    'axis': 'Y'
+                }
+            },
+            2: {
+                'name': 'lon',
+                'values': lon,
+                'dtype': 'd',
+                'atts': {
+                    'long_name': 'Longitude',
+                    'standard_name': 'longitude',
+                    'units': 'degrees_east',
+                    'axis': 'X'
+                }
+            }
+        }
+
+        variables = {
+            0: {
+                'name': 'wspd',
+                'dims': ('record', 'lat', 'lon'),
+                'values': None,
+                'dtype': 'f',
+                'atts': {
+                    'long_name': ('Maximum gust wind speed records, '
+                                  'sorted in ascending order'),
+                    'units': 'm/s'
+                }
+            }
+        }
+
+        gatts = {'title': 'TCRM hazard simulation - hazard state',
+                 'tcrm_version': flProgramVersion(),
+                 'processed_files': '\n'.join(files),
+                 'processed_mtimes': getFileTimes(self.inputPath, files)}
+
+        self.state = nctools.ncSaveGrid(self.stateFile + '.tmp',
+                                        dimensions, variables,
+                                        nodata=self.nodata,
+                                        gatts=gatts, writedata=False,
+                                        keepfileopen=True)
+
+    def closeState(self):
+        """
+        Close the new state file and replace the existing state file.
+
+        """
+
+        self.state.close()
+        self.state = None
+        if os.path.exists(self.stateFile):
+            os.remove(self.stateFile)
+        os.rename(self.stateFile + '.tmp', self.stateFile)
+        log.info("Saved hazard state to %s" % self.stateFile)
 
     def dumpHazardFromTiles(self, tiles, progressCallback=None):
         """
@@ -302,6 +582,9 @@ class HazardCalculator(object):
 
         """
 
+        if self.incremental and pp.rank() == 0:
+            self.createState()
+
         work_tag = 0
         result_tag = 1
         if (pp.rank() == 0) and (pp.size() > 1):
@@ -324,27 +607,7 @@ class HazardCalculator(object):
                 result, status = pp.receive(pp.any_source, tag=result_tag,
                                              return_status=True)
 
-                if self.calcCI:
-                    limits, Rp, loc, scale, shp, RPupper, RPlower = result
-                else:
-                    limits, Rp, loc, scale, shp = result
-
-
-                # Reset the min/max bounds for the output array:
-                (xmin, xmax, ymin, ymax) = limits
-                xmin -= self.tilegrid.imin
-                xmax -= self.tilegrid.imin
-                ymin -= self.tilegrid.jmin
-                ymax -= self.tilegrid.jmin
-
-                self.loc[ymin:ymax, xmin:xmax] = loc
-                self.scale[ymin:ymax, xmin:xmax] = scale
-                self.shp[ymin:ymax, xmin:xmax] = shp
-                self.Rp[:, ymin:ymax, xmin:xmax] = Rp[:, :, :]
-
-                if self.calcCI:
-                    self.RPupper[:, ymin:ymax, xmin:xmax] = RPupper[:, :, :]
-                    self.RPlower[:, ymin:ymax, xmin:xmax] = RPlower[:, :, :]
+                self.storeResult(result)
 
                 d = status.source
 
@@ -368,34 +631,85 @@ class HazardCalculator(object):
                 results = self.calculateHazard(W)
                 pp.send(results, destination=0, tag=result_tag)
 
+        elif pp.size() == 1 and self.numProcesses > 1:
+            # No Pypar, but multiple local cores are available. Tiles
+            # are streamed to a pool of worker processes and the
+            # results are collected in the order they complete:
+            log.debug("Processing %d tiles with %d local processes" %
+                      (len(tiles), self.numProcesses))
+            pool = multiprocessing.Pool(self.numProcesses,
+                                        initializer=_initWorker,
+                                        initargs=(self,))
+            try:
+                results = pool.imap_unordered(_calculateTile, tiles)
+                for i, result in enumerate(results):
+                    self.storeResult(result)
+                    log.debug("Completed tile %d of %d" % (i + 1, len(tiles)))
+                    if progressCallback:
+                        progressCallback(i + 1)
+            finally:
+                pool.close()
+                pool.join()
+
         elif pp.size() == 1 and pp.rank() == 0:
             # Assumed no Pypar - helps avoid the need to extend DummyPypar()
             for i, tile in enumerate(tiles):
                 log.debug("Processing tile %d of %d" % (i, len(tiles)))
                 result = self.calculateHazard(tile)
-                if self.calcCI:
-                    limits, Rp, loc, scale, shp, RPupper, RPlower = result
-                else:
-                    limits, Rp, loc, scale, shp = result
-
-                # Reset the min/max bounds for the output array:
-                (xmin, xmax, ymin, ymax) = limits
-                xmin -= self.tilegrid.imin
-                xmax -= self.tilegrid.imin
-                ymin -= self.tilegrid.jmin
-                ymax -= self.tilegrid.jmin
-
-                self.loc[ymin:ymax, xmin:xmax] = loc
-                self.scale[ymin:ymax, xmin:xmax] = scale
-                self.shp[ymin:ymax, xmin:xmax] = shp
-                self.Rp[:, ymin:ymax, xmin:xmax] = Rp[:, :, :]
-                if self.calcCI:
-                    self.RPupper[:, ymin:ymax, xmin:xmax] = RPupper[:, :, :]
-                    self.RPlower[:, ymin:ymax, xmin:xmax] = RPlower[:, :, :]
+                self.storeResult(result)
 
                 if progressCallback:
                     progressCallback(i)
 
+        if self.incremental and pp.rank() == 0:
+            self.closeState()
+
+    def storeResult(self, result):
+        """
+        Insert the results for a single tile into the output arrays.
+
+        :param tuple result: tuple returned by :meth:`calculateHazard`,
+                             i.e. (limits, Rp, loc, scale, shp[, RpUpper,
+                             RpLower][, extra][, state]).
+
+        """
+
+        if self.incremental:
+            state = result[-1]
+            result = result[:-1]
+
+        if self.extra:
+            extra = result[-1]
+            result = result[:-1]
+
+        if self.calcCI:
+            limits, Rp, loc, scale, shp, RPupper, RPlower = result
+        else:
+            limits, Rp, loc, scale, shp = result
+
+        # Reset the min/max bounds for the output array:
+        (xmin, xmax, ymin, ymax) = limits
+        xmin -= self.tilegrid.imin
+        xmax -= self.tilegrid.imin
+        ymin -= self.tilegrid.jmin
+        ymax -= self.tilegrid.jmin
+
+        self.loc[ymin:ymax, xmin:xmax] = loc
+        self.scale[ymin:ymax, xmin:xmax] = scale
+        self.shp[ymin:ymax, xmin:xmax] = shp
+        self.Rp[:, ymin:ymax, xmin:xmax] = Rp[:, :, :]
+
+        if self.calcCI:
+            self.RPupper[:, ymin:ymax, xmin:xmax] = RPupper[:, :, :]
+            self.RPlower[:, ymin:ymax, xmin:xmax] = RPlower[:, :, :]
+
+        if self.extra:
+            for name, values in extra.items():
+                self.extra[name][..., ymin:ymax, xmin:xmax] = values
+
+        if self.incremental:
+            self.state.variables['wspd'][:, ymin:ymax, xmin:xmax] = state
+
 
     @disableOnWorkers
     def saveHazard(self):
@@ -407,6 +721,14 @@ class HazardCalculator(object):
         log.info("Saving hazard data file")
         # FIXME: need to ensure CF-1.6 and OGC compliance in output files.
         lon, lat = self.tilegrid.getDomainExtent()
+        distName = {'gev': 'GEV', 'gpd': 'GPD',
+                    'empirical': 'empirical'}[self.method]
+
+        # Store all return periods for a block of grid points in each
+        # chunk, so reading the curve at a point decompresses one chunk
+        # rather than one chunk per return period:
+        gridChunks = (min(len(lat), POINT_CHUNK), min(len(lon), POINT_CHUNK))
+        curveChunks = (len(self.years),) + gridChunks
 
         dimensions = {
             0: {
@@ -447,10 +769,12 @@ class HazardCalculator(object):
             0: {
                 'name': 'loc',
                 'dims': ('lat', 'lon'),
+                'chunksizes': gridChunks,
                 'values': self.loc,
                 'dtype': 'f',
                 'atts': {
-                    'long_name': 'Location parameter for GEV distribution',
+                    'long_name': ('Location parameter for %s distribution'
+                                  % distName),
                     'units': 'm/s',
                     'actual_range': (np.min(self.loc), np.max(self.loc)),
                     'valid_range': (0.0, 200.),
@@ -460,10 +784,12 @@ class HazardCalculator(object):
             1: {
                 'name': 'scale',
                 'dims': ('lat', 'lon'),
+                'chunksizes': gridChunks,
                 'values': self.scale,
                 'dtype': 'f',
                 'atts': {
-                    'long_name': 'Scale parameter for GEV distribution',
+                    'long_name': ('Scale parameter for %s distribution'
+                                  % distName),
                     'units': '',
                     'grid_mapping': 'crs'
                 }
@@ -471,11 +797,13 @@ class HazardCalculator(object):
             2: {
                 'name': 'shp',
                 'dims': ('lat', 'lon'),
+                'chunksizes': gridChunks,
                 'values': self.shp,
                 'dtype': 'f',
                 'least_significant_digit': 5,
                 'atts': {
-                    'long_name': 'Shape parameter for GEV distribution',
+                    'long_name': ('Shape parameter for %s distribution'
+                                  % distName),
                     'units': '',
                     'grid_mapping': 'crs'
                 }
@@ -483,6 +811,7 @@ class HazardCalculator(object):
             3: {
                 'name': 'wspd',
                 'dims': ('years', 'lat', 'lon'),
+                'chunksizes': curveChunks,
                 'values': self.Rp,
                 'dtype': 'f',
                 'atts': {
@@ -496,6 +825,7 @@ class HazardCalculator(object):
             4: {
                 'name': 'wspdupper',
                 'dims': ('years', 'lat', 'lon'),
+                'chunksizes': curveChunks,
                 'values': self.RPupper,
                 'dtype': 'f',
                 'atts': {
@@ -509,6 +839,7 @@ class HazardCalculator(object):
             5: {
                 'name': 'wspdlower',
                 'dims': ('years', 'lat', 'lon'),
+                'chunksizes': curveChunks,
                 'values': self.RPlower,
                 'dtype': 'f',
                 'atts': {
@@ -533,6 +864,65 @@ class HazardCalculator(object):
             }
         }
 
+        if self.minPressure:
+            slpatts = {
+                'slp': ('Return period minimum sea level pressure', None)
+            }
+            if self.calcCI:
+                slpatts['slpupper'] = ('Upper percentile return period '
+                                       'minimum sea level pressure',
+                                       50 + self.prange / 2.)
+                slpatts['slplower'] = ('Lower percentile return period '
+                                       'minimum sea level pressure',
+                                       50 - self.prange / 2.)
+            for name in ['slp', 'slpupper', 'slplower']:
+                if name not in self.extra:
+                    continue
+                atts = {
+                    'long_name': slpatts[name][0],
+                    'standard_name': 'air_pressure_at_sea_level',
+                    'units': 'Pa',
+                    'cell_methods': 'time: minimum',
+                    'valid_range': (70000., 115000.),
+                    'grid_mapping': 'crs'
+                }
+                if slpatts[name][1] is not None:
+                    atts['percentile'] = slpatts[name][1]
+                variables[len(variables)] = {
+                    'name': name,
+                    'dims': ('years', 'lat', 'lon'),
+                    'chunksizes': curveChunks,
+                    'values': self.extra[name],
+                    'dtype': 'f',
+                    'atts': atts
+                }
+
+        if self.nsectors > 0:
+            dimensions[3] = {
+                'name': 'sector',
+                'values': np.arange(self.nsectors) * 360. / self.nsectors,
+                'dtype': 'f',
+                'atts': {
+                    'long_name': ('Central direction of direction sector '
+                                  '(direction wind is blowing from)'),
+                    'units': 'degrees'
+                }
+            }
+            variables[len(variables)] = {
+                'name': 'wspddir',
+                'dims': ('sector', 'years', 'lat', 'lon'),
+                'chunksizes': (1,) + curveChunks,
+                'values': self.extra['wspddir'],
+                'dtype': 'f',
+                'atts': {
+                    'long_name': ('Return period wind speed for each '
+                                  'direction sector'),
+                    'units': 'm/s',
+                    'valid_range': (0.0, 200.),
+                    'grid_mapping': 'crs'
+                }
+            }
+
         # Create output file for return-period gust wind speeds and
         # GEV parameters
         nctools.ncSaveGrid(pjoin(self.outputPath, 'hazard.nc'),
@@ -543,14 +933,58 @@ class HazardCalculator(object):
                            keepfileopen=False)
 
 
-def calculate(Vr, years, nodata, minRecords, yrsPerSim):
+def _initWorker(hc):
+    """
+    Initialise a worker process of the local process pool by storing the
+    :class:`HazardCalculator` instance as a module-level global. This
+    avoids sending the calculator to the worker with every tile.
+
+    :param hc: :class:`HazardCalculator` instance.
+
+    """
+
+    global _hc
+    _hc = hc
+
+def _calculateTile(tilelimits):
+    """
+    Calculate the hazard for a single tile in a worker process.
+
+    :param tuple tilelimits: tuple of index limits of a tile.
+
+    :returns: tuple returned by :meth:`HazardCalculator.calculateHazard`.
+
+    """
+
+    return _hc.calculateHazard(tilelimits)
+
+def calculate(Vr, years, nodata, minRecords, yrsPerSim, method='gev',
+              threshold=90., weights=None, nsims=None):
     """
     Fit a GEV to the wind speed records for a 2-D extent of
-    wind speed values
+    wind speed values. Alternatively, fit a GPD to the peaks over a
+    threshold or calculate empirical return period values. All grid
+    points of the tile are fitted at once.
 
     :param Vr: `numpy.ndarray` of wind speeds (3-D - event, lat, lon)
     :param years: `numpy.ndarray` of years for which to evaluate
                   return period values
+    :param float nodata: missing data value.
+    :param int minRecords: minimum number of valid wind speed values required
+                           to calculate return period values.
+    :param int yrsPerSim: Values represent block maxima - this value indicates
+                          the time span of the block.
+    :param str method: one of 'gev' (default), 'gpd' or 'empirical'.
+    :param float threshold: percentile of the valid values used as the
+                            threshold for the 'gpd' method.
+    :param weights: optional `numpy.ndarray` of weights of the records.
+                    If given, the records are the maxima of weighted
+                    events, and the return period values are calculated
+                    from the weighted rate of events (see
+                    :func:`evd.estimateWeightedEvents`), whatever the
+                    `method`.
+    :param int nsims: the number of simulations the weighted events
+                      were drawn from.
 
     Returns:
     --------
@@ -562,31 +996,58 @@ def calculate(Vr, years, nodata, minRecords, yrsPerSim):
 
     """
 
-    Vr.sort(axis=0)
-    Rp = np.zeros((len(years),) + Vr.shape[1:], dtype='f')
-    loc = np.zeros(Vr.shape[1:], dtype='f')
-    scale = np.zeros(Vr.shape[1:], dtype='f')
-    shp = np.zeros(Vr.shape[1:], dtype='f')
+    if weights is not None:
+        return _fitTile(Vr, evd.estimateWeightedEvents, years, nodata,
+                        minRecords, yrsPerSim, weights=weights, nsims=nsims)
+    elif method == 'empirical':
+        return _fitTile(Vr, evd.estimateEmpirical, years, nodata,
+                        minRecords, yrsPerSim)
+    elif method == 'gpd':
+        return _fitTile(Vr, evd.estimateGPD, years, nodata,
+                        minRecords, yrsPerSim, threshold=threshold)
+
+    return _fitTile(Vr, evd.estimateEVD, years, nodata, minRecords,
+                    yrsPerSim)
 
-    for i in xrange(Vr.shape[1]):
-        for j in xrange(Vr.shape[2]):
-            if Vr[:,i,j].max() > 0.0:
-                w, l, sc, sh = evd.estimateEVD(Vr[:,i,j],
-                                               years,
-                                               nodata,
-                                               minRecords,
-                                               yrsPerSim)
 
-                Rp[:, i, j] = w
-                loc[i, j] = l
-                scale[i, j] = sc
-                shp[i, j] = sh
+def _fitTile(Vr, func, years, nodata, minRecords, yrsPerSim, **kwargs):
+    """
+    Apply a vectorised fitting function (e.g. :func:`evd.estimateGPD`)
+    to all grid points of a tile at once.
+
+    As for the GEV fit, grid points that have no non-zero wind speed
+    values are assigned zero return period values and parameters.
+
+    :param Vr: `numpy.ndarray` of wind speeds (3-D - event, lat, lon)
+    :param func: function that takes the wind speed array and returns
+                 the return period values, location, scale and shape
+                 parameters for every grid point.
+    :param years: `numpy.ndarray` of years for which to evaluate
+                  return period values
+    :param float nodata: missing data value.
+    :param int minRecords: minimum number of valid wind speed values
+                           required to calculate return period values.
+    :param int yrsPerSim: Values represent block maxima - this value
+                          indicates the time span of the block.
+
+    :returns: return period values, location, scale and shape parameters.
+
+    """
+
+    w, l, sc, sh = func(Vr, years, nodata, minRecords, yrsPerSim, **kwargs)
+
+    active = Vr.max(axis=0) > 0.0
+    Rp = np.where(active, w, 0.0).astype('f')
+    loc = np.where(active, l, 0.0).astype('f')
+    scale = np.where(active, sc, 0.0).astype('f')
+    shp = np.where(active, sh, 0.0).astype('f')
 
     return Rp, loc, scale, shp
 
 
 def calculateCI(Vr, years, nodata, minRecords, yrsPerSim=1,
-                sample_size=50, prange=90):
+                sample_size=50, prange=90, method='gev', threshold=90.,
+                weights=None, rng=None, nsims=None):
     """
     Fit a GEV to the wind speed records for a 2-D extent of
     wind speed values, providing a confidence range by resampling at
@@ -603,7 +1064,19 @@ def calculateCI(Vr, years, nodata, minRecords, yrsPerSim=1,
     :param int sample_size: number of records to randomly sample for calculating
                             confidence interval of the fit.
     :param float prange: percentile range.
-
+    :param str method: one of 'gev' (default), 'gpd' or 'empirical'.
+    :param float threshold: percentile of the valid values used as the
+                            threshold for the 'gpd' method.
+    :param weights: optional `numpy.ndarray` of weights of the records.
+                    If given, the records are the maxima of weighted
+                    events (see :func:`calculate`), and each subsample
+                    of the events stands for the same fraction of the
+                    `nsims` simulations.
+    :param rng: optional :class:`numpy.random.RandomState` used to
+                resample the records (see :func:`tileRandomState`).
+                The global `numpy.random` state is used by default.
+    :param int nsims: the number of simulations the weighted events
+                      were drawn from.
 
     :return: `numpy.ndarray` of return period wind speed values
 
@@ -614,38 +1087,173 @@ def calculateCI(Vr, years, nodata, minRecords, yrsPerSim=1,
 
     nrecords = Vr.shape[0]
     nsamples = nrecords / sample_size
-    RpUpper = nodata*np.ones((len(years), Vr.shape[1], Vr.shape[2]), dtype='f')
-    RpLower = nodata*np.ones((len(years), Vr.shape[1], Vr.shape[2]), dtype='f')
-
-    w = np.zeros((len(years), nsamples), dtype='f')
-    wUpper = np.zeros((len(years)), dtype='f')
-    wLower = np.zeros((len(years)), dtype='f')
-
-    for i in xrange(Vr.shape[1]):
-        for j in xrange(Vr.shape[2]):
-            if Vr[:, i, j].max() > 0.0:
-                random.shuffle(Vr[:, i, j])
-                for n in xrange(nsamples):
-                    nstart = n*sample_size
-                    nend  = (n + 1)*sample_size - 1
-                    vsub = Vr[nstart:nend, i, j]
-
-                    vsub.sort()
-                    if vsub.max( ) > 0.:
-                        w[:, n], loc, scale, shp = evd.estimateEVD(vsub, years, nodata,
-                                                                   minRecords/10, yrsPerSim)
-
-                for n in range(len(years)):
-                    wUpper[n] = percentile(w[n,:], upper)
-                    wLower[n] = percentile(w[n,:], lower)
-
-                RpUpper[:, i, j] = wUpper
-                RpLower[:, i, j] = wLower
 
+    func = {'gev': evd.estimateEVD,
+            'gpd': evd.estimateGPD,
+            'empirical': evd.estimateEmpirical}[method]
+    kwargs = {'threshold': threshold} if method == 'gpd' else {}
+
+    # Shuffle the records independently at each grid point, then
+    # fit all grid points of each subsample at once:
+    if rng is None:
+        rng = np.random
+    order = np.argsort(rng.random_sample(Vr.shape), axis=0)
+    jj, ii = np.ogrid[0:Vr.shape[1], 0:Vr.shape[2]]
+    Vs = Vr[order, jj, ii]
+
+    if weights is not None:
+        func = evd.estimateWeightedEvents
+        Ws = np.asarray(weights)[order]
+        if nsims is None:
+            nsims = nrecords
+
+    w = np.zeros((nsamples, len(years)) + Vr.shape[1:], dtype='f')
+    for n in xrange(nsamples):
+        nstart = n*sample_size
+        nend = (n + 1)*sample_size - 1
+        if weights is not None:
+            kwargs = {'weights': Ws[nstart:nend],
+                      'nsims': nsims * (nend - nstart) / float(nrecords)}
+        w[n], loc, scale, shp = func(Vs[nstart:nend], years, nodata,
+                                     minRecords/10, yrsPerSim, **kwargs)
+
+    RpUpper = percentile(w, upper, axis=0).astype('f')
+    RpLower = percentile(w, lower, axis=0).astype('f')
+    empty = Vr.max(axis=0) <= 0.0
+    RpUpper[:, empty] = nodata
+    RpLower[:, empty] = nodata
     return RpUpper, RpLower
 
 
 
+def tileRandomState(tilelimits):
+    """
+    Get the random number generator used to resample the records of a
+    tile for the confidence intervals. The generator is seeded with the
+    limits of the tile, so the confidence intervals do not depend on
+    the process (or the order) in which the tiles are calculated.
+
+    :param tuple tilelimits: tuple of index limits of a tile.
+
+    :returns: :class:`numpy.random.RandomState` instance.
+
+    """
+
+    return np.random.RandomState([int(i) for i in tilelimits])
+
+def getFileList(inputPath):
+    """
+    Get the sorted list of wind field files in a folder.
+
+    :param str inputPath: str path to wind field files.
+
+    :returns: list of full paths to the wind field files.
+
+    """
+
+    fileList = os.listdir(inputPath)
+    files = [pjoin(inputPath, f) for f in fileList]
+    files = [f for f in files if os.path.isfile(f)]
+    return sorted(files)
+
+def getFileWeights(files):
+    """
+    Get the likelihood ratio of each event of the wind field files,
+    stored in the `event_weight` variable when the genesis points of
+    the tracks are importance sampled. The weights are in the same
+    order as the events loaded by :func:`loadTileEvents`.
+
+    :param list files: list of full paths to the wind field files.
+
+    :returns: `numpy.ndarray` of the weight of each event, or ``None``
+              if none of the files are weighted.
+
+    :raises ValueError: if only some of the files are weighted.
+
+    """
+
+    weights = []
+    for filename in sorted(files):
+        ncobj = nctools.ncLoadFile(filename)
+        if 'event_weight' in ncobj.variables:
+            weights.append(np.array(ncobj.variables['event_weight'][:],
+                                    dtype=float))
+        ncobj.close()
+
+    if len(weights) == 0:
+        return None
+    if len(weights) != len(files):
+        raise ValueError("Only %d of the %d wind field files are weighted"
+                         % (len(weights), len(files)))
+    return np.concatenate(weights)
+
+def getFileTimes(inputPath, files):
+    """
+    Get the modification times of wind field files.
+
+    :param str inputPath: path to the wind field files.
+    :param list files: list of wind field file names (without the path).
+
+    :returns: `numpy.ndarray` of the modification time of each file
+              (-1 for files that do not exist).
+
+    """
+
+    mtimes = np.empty(len(files), dtype='d')
+    for n, f in enumerate(files):
+        filename = pjoin(inputPath, f)
+        if os.path.isfile(filename):
+            mtimes[n] = os.path.getmtime(filename)
+        else:
+            mtimes[n] = -1.
+    return mtimes
+
+def loadStateFileList(stateFile, tilegrid, inputPath):
+    """
+    Get the list of wind field files that have been merged into a
+    hazard state file. If the state file does not exist, does not
+    match the domain of the tile grid, or any of the files it lists
+    have since been removed or modified, an empty list is returned (and
+    all wind field files will be processed).
+
+    :param str stateFile: path to the hazard state file.
+    :param tilegrid: :class:`TileGrid` instance
+    :param str inputPath: path to the wind field files.
+
+    :returns: list of wind field file names (without the path).
+
+    """
+
+    if not os.path.isfile(stateFile):
+        log.info("No hazard state file found - processing all files")
+        return []
+
+    ncobj = nctools.ncLoadFile(stateFile)
+    lon = nctools.ncGetDims(ncobj, 'lon')
+    lat = nctools.ncGetDims(ncobj, 'lat')
+    files = getattr(ncobj, 'processed_files', '')
+    mtimes = getattr(ncobj, 'processed_mtimes', None)
+    ncobj.close()
+
+    dlon, dlat = tilegrid.getDomainExtent()
+    if (len(lon) != len(dlon) or len(lat) != len(dlat) or
+            not np.allclose(lon, dlon) or not np.allclose(lat, dlat)):
+        log.warning("Hazard state file %s does not match the model domain "
+                    "- processing all files" % stateFile)
+        return []
+
+    if len(files) == 0:
+        return []
+    files = files.split('\n')
+
+    if (mtimes is None or np.size(mtimes) != len(files) or
+            np.any(np.atleast_1d(mtimes) != getFileTimes(inputPath, files))):
+        log.warning("Wind field files listed in the hazard state file %s "
+                    "have been removed or modified - processing all files"
+                    % stateFile)
+        return []
+    return files
+
 def loadFilesFromPath(inputPath, tilelimits):
     """
     Load wind field data for each subset into a 3-D array.
@@ -658,9 +1266,21 @@ def loadFilesFromPath(inputPath, tilelimits):
 
     """
 
-    fileList = os.listdir(inputPath)
-    files = [pjoin(inputPath, f) for f in fileList]
-    files = [f for f in files if os.path.isfile(f)]
+    return loadFiles(getFileList(inputPath), tilelimits)
+
+def loadFiles(files, tilelimits):
+    """
+    Load wind field data for each subset of the given files into a
+    3-D array.
+
+    :param list files: list of paths to wind field files.
+
+    :param tuple tilelimits: tuple of index limits of a tile.
+
+    :returns: 3-D `numpy.narray` of wind field records.
+
+    """
+
     log.debug("Loading data from %d files" % (len(files)))
 
     ysize = tilelimits[3] - tilelimits[2]
@@ -672,6 +1292,67 @@ def loadFilesFromPath(inputPath, tilelimits):
 
     return Vr
 
+def loadTileData(files, tilelimits, varnames):
+    """
+    Load a subset of several variables from each of the given files
+    into 3-D arrays. Each file is opened only once.
+
+    :param list files: list of paths to wind field files.
+    :param tuple tilelimits: tuple of index limits of a tile.
+    :param list varnames: names of the variables to load.
+
+    :returns: `dict` of 3-D `numpy.ndarray` of records for each variable.
+
+    """
+
+    if list(varnames) == ['vmax']:
+        return {'vmax': loadFiles(files, tilelimits)}
+
+    log.debug("Loading %s from %d files" % (", ".join(varnames),
+                                            len(files)))
+
+    (xmin, xmax, ymin, ymax) = tilelimits
+    data = {}
+    for v in varnames:
+        data[v] = np.empty((len(files), ymax - ymin, xmax - xmin), dtype='f')
+
+    for n, f in enumerate(sorted(files)):
+        ncobj = nctools.ncLoadFile(f)
+        for v in varnames:
+            data[v][n,:,:] = nctools.ncGetVar(ncobj, v)[ymin:ymax, xmin:xmax]
+        ncobj.close()
+
+    return data
+
+def loadTileEvents(files, tilelimits, varnames):
+    """
+    Load a subset of the maxima of each event of weighted wind field
+    files (the `event_` variables, see :func:`getFileWeights`) for
+    several variables. The events of all the files are concatenated.
+
+    :param list files: list of paths to wind field files.
+    :param tuple tilelimits: tuple of index limits of a tile.
+    :param list varnames: names of the variables to load.
+
+    :returns: `dict` of 3-D `numpy.ndarray` of event records for each
+              variable.
+
+    """
+
+    log.debug("Loading the events of %d files" % (len(files)))
+
+    (xmin, xmax, ymin, ymax) = tilelimits
+    data = dict((v, []) for v in varnames)
+
+    for f in sorted(files):
+        ncobj = nctools.ncLoadFile(f)
+        for v in varnames:
+            var = nctools.ncGetVar(ncobj, 'event_' + v)
+            data[v].append(np.array(var[:, ymin:ymax, xmin:xmax], dtype='f'))
+        ncobj.close()
+
+    return dict((v, np.concatenate(data[v])) for v in varnames)
+
 def loadFile(filename, limits):
     """
     Load a subset of the data from the given file, with the extent
@@ -693,6 +1374,54 @@ def loadFile(filename, limits):
     ncobj.close()
     return data_subset
 
+def pressureDeficit(slp):
+    """
+    Convert minimum sea level pressure records to pressure deficits
+    relative to :data:`SLP_REFERENCE`, so that the lowest pressures
+    become the largest values. Missing (non-positive) pressures are set
+    to zero.
+
+    :param slp: `numpy.ndarray` of minimum sea level pressures (Pa).
+
+    :returns: `numpy.ndarray` of pressure deficits (Pa).
+
+    """
+
+    Pd = np.where(slp > 0., SLP_REFERENCE - slp, 0.)
+    return np.maximum(Pd, 0.).astype('f')
+
+def deficitToPressure(Rp, nodata):
+    """
+    Convert return period pressure deficits back to sea level pressures.
+
+    :param Rp: `numpy.ndarray` of return period pressure deficits (Pa).
+    :param float nodata: missing data value.
+
+    :returns: `numpy.ndarray` of return period sea level pressures (Pa).
+
+    """
+
+    return np.where(Rp > 0., SLP_REFERENCE - Rp, nodata).astype('f')
+
+def directionSector(ua, va, nsectors):
+    """
+    Determine the direction sector of the maximum wind speed from the
+    wind components. Sectors are numbered clockwise from the sector
+    centred on north, based on the direction the wind is blowing from.
+
+    :param ua: `numpy.ndarray` of eastward wind components.
+    :param va: `numpy.ndarray` of northward wind components.
+    :param int nsectors: number of direction sectors.
+
+    :returns: `numpy.ndarray` of sector numbers (0 to `nsectors` - 1).
+
+    """
+
+    direction = np.mod(np.degrees(np.arctan2(-ua, -va)), 360.)
+    width = 360. / nsectors
+    sector = (np.mod(direction + width / 2., 360.) // width).astype(int)
+    return np.mod(sector, nsectors)
+
 def getTiles(tilegrid):
     """
     Helper to obtain a generator that yields tile numbers
@@ -742,6 +1471,7 @@ def run(configFile, callback=None):
     yrsPerSim = config.getint('TrackGenerator', 'YearsPerSimulation')
     minRecords = config.getint('Hazard', 'MinimumRecords')
     calculate_confidence = config.getboolean('Hazard', 'CalculateCI')
+    numProcesses = config.getint('Hazard', 'NumProcesses')
 
     wf_lon, wf_lat = setDomain(inputPath)
 
@@ -752,20 +1482,21 @@ def run(configFile, callback=None):
     TG = TileGrid(gridLimit, wf_lon, wf_lat)
     tiles = getTiles(TG)
 
-    #def progress(i):
-    #    callback(i, len(tiles))
+    def progress(i):
+        callback(i, len(tiles))
 
     pp.barrier()
     hc = HazardCalculator(configFile, TG,
                           numsimulations,
                           minRecords,
                           yrsPerSim,
-                          calculate_confidence)
-
-
-
+                          calculate_confidence,
+                          numProcesses)
 
-    hc.dumpHazardFromTiles(tiles)
+    if callback is not None:
+        hc.dumpHazardFromTiles(tiles, progress)
+    else:
+        hc.dumpHazardFromTiles(tiles)
 
     pp.barrier()
 
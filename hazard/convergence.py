@@ -0,0 +1,343 @@
+"""
+:mod:`convergence` -- Run simulations until return periods converge
+===================================================================
+
+.. module:: convergence
+    :synopsis: Generate the event set in batches of simulations, and
+               stop once the return period wind speeds have converged.
+
+.. moduleauthor:: Craig Arthur <craig.arthur@ga.gov.au>
+
+Instead of generating a fixed number of simulations, the track
+generation and wind field calculations are run in batches of
+``BatchSize`` simulations. After each batch, the return period wind
+speeds are calculated at a random sample of grid points and compared
+to the values from the previous batch. The simulation stops when the
+mean relative change in the return period wind speeds (for each of the
+return periods in ``Years``) is less than ``Tolerance``, or once
+``NumSimulations`` simulations have been generated.
+
+The return period wind speeds after each batch are stored in
+``hazard/convergence.csv`` so the convergence can be reviewed.
+
+"""
+
+import os
+import logging
+import numpy as np
+
+from os.path import join as pjoin
+
+from Utilities.config import ConfigParser
+from Utilities.parallel import attemptParallel
+import Utilities.nctools as nctools
+from hazard import calculate, getFileWeights
+
+log = logging.getLogger(__name__)
+log.addHandler(logging.NullHandler())
+
+class ConvergenceMonitor(object):
+    """
+    Track the convergence of return period wind speeds at a random
+    sample of grid points as wind field files are added to the event set.
+
+    :param lon: `numpy.ndarray` of longitudes of the wind field grid.
+    :param lat: `numpy.ndarray` of latitudes of the wind field grid.
+    :param years: `numpy.ndarray` of return periods to monitor.
+    :param int npoints: number of grid points to sample.
+    :param int minRecords: minimum number of valid wind speed values
+                           required to calculate return period values.
+    :param int yrsPerSim: number of years in each simulation.
+    :param str method: hazard calculation method (gev, gpd or empirical).
+    :param float threshold: threshold percentile for the GPD method.
+    :param float nodata: missing data value.
+    :param int seed: seed for selecting the sample of grid points.
+
+    """
+
+    def __init__(self, lon, lat, years, npoints, minRecords, yrsPerSim,
+                 method='gev', threshold=90., nodata=-9999., seed=1):
+
+        self.lon = lon
+        self.lat = lat
+        self.years = years
+        self.minRecords = minRecords
+        self.yrsPerSim = yrsPerSim
+        self.method = method
+        self.threshold = threshold
+        self.nodata = nodata
+
+        # Sample the grid points without replacement:
+        ncells = len(lat) * len(lon)
+        npoints = min(npoints, ncells)
+        rng = np.random.RandomState(seed)
+        cells = np.sort(rng.permutation(ncells)[:npoints])
+        self.j, self.i = np.unravel_index(cells, (len(lat), len(lon)))
+        self.uj, self.jinv = np.unique(self.j, return_inverse=True)
+        self.ui, self.iinv = np.unique(self.i, return_inverse=True)
+
+        self.records = np.empty((0, npoints), dtype='f')
+        self.weights = None
+        self.nsims = 0
+        self.numSims = []
+        self.returnLevels = []
+        self.changes = []
+
+    def loadPoints(self, filename):
+        """
+        Load the maximum wind speeds at the sampled grid points from a
+        wind field file. For a weighted wind field file, the maximum
+        wind speeds of each event are loaded.
+
+        :param str filename: path to a wind field file.
+
+        :returns: `numpy.ndarray` of wind speeds at the sampled points
+                  (event, point for a weighted file).
+
+        """
+
+        ncobj = nctools.ncLoadFile(filename)
+        if 'event_vmax' in ncobj.variables:
+            vmax = nctools.ncGetVar(ncobj, 'event_vmax')
+            data = np.array(vmax[:, self.uj, self.ui], dtype='f')
+            ncobj.close()
+            return data[:, self.jinv, self.iinv]
+
+        vmax = nctools.ncGetVar(ncobj, 'vmax')
+        data = np.array(vmax[self.uj, self.ui], dtype='f')
+        ncobj.close()
+        return data[self.jinv, self.iinv]
+
+    def loadWeights(self, files):
+        """
+        Load the weights of the events of a batch of wind field files
+        (see :func:`hazard.getFileWeights`).
+
+        :param list files: list of paths to the wind field files.
+
+        :returns: `numpy.ndarray` of the weight of each event, or
+                  ``None`` if the files are not weighted.
+
+        """
+
+        return getFileWeights(files)
+
+    def update(self, files):
+        """
+        Add a batch of wind field files to the records, and recalculate
+        the return period wind speeds at the sampled grid points.
+
+        :param list files: list of paths to the new wind field files.
+
+        :returns: the mean relative change in the return period wind
+                  speed for each return period (`numpy.nan` for the
+                  first batch).
+
+        """
+
+        files = sorted(files)
+        weights = self.loadWeights(files)
+        if self.nsims > 0 and (weights is None) != (self.weights is None):
+            raise ValueError("The wind field files of every batch must "
+                             "be weighted, or none of them")
+
+        data = [self.loadPoints(f) for f in files]
+        self.records = np.vstack([self.records] + data)
+        if weights is not None:
+            if self.weights is not None:
+                weights = np.concatenate([self.weights, weights])
+            self.weights = weights
+        self.nsims += len(files)
+
+        Vr = self.records[:, np.newaxis, :]
+        Rp, loc, scale, shp = calculate(Vr, self.years, self.nodata,
+                                        self.minRecords, self.yrsPerSim,
+                                        self.method, self.threshold,
+                                        self.weights, self.nsims)
+        Rp = Rp[:, 0, :]
+
+        if len(self.returnLevels) > 0:
+            change = relativeChange(self.returnLevels[-1], Rp, self.nodata)
+        else:
+            change = np.nan * np.ones(len(self.years))
+
+        self.numSims.append(self.nsims)
+        self.returnLevels.append(Rp)
+        self.changes.append(change)
+        return change
+
+    def converged(self, tolerance):
+        """
+        Determine if the return period wind speeds have converged.
+
+        :param float tolerance: maximum allowable mean relative change
+                                in the return period wind speeds.
+
+        :returns: `True` if the mean relative change for every return
+                  period is less than `tolerance`.
+
+        """
+
+        if len(self.changes) < 2:
+            return False
+        change = self.changes[-1]
+        return bool(np.all(np.isfinite(change)) and
+                    np.all(change < tolerance))
+
+    def save(self, filename):
+        """
+        Save the convergence curve (the mean return period wind speed over
+        the sampled points and the mean relative change for each return
+        period after each batch) to a csv file.
+
+        :param str filename: path to the output file.
+
+        """
+
+        header = ['NumSimulations']
+        header += ['Mean%d' % y for y in self.years]
+        header += ['Change%d' % y for y in self.years]
+
+        rows = []
+        for n, Rp, change in zip(self.numSims, self.returnLevels,
+                                 self.changes):
+            mRp = np.ma.masked_less_equal(Rp, 0.).mean(axis=1)
+            rows.append(np.hstack([[n], mRp.filled(np.nan), change]))
+
+        fmt = ['%d'] + ['%.3f'] * len(self.years) + \
+              ['%.5f'] * len(self.years)
+        with open(filename, 'w') as fp:
+            fp.write('%' + ','.join(header) + '\n')
+            np.savetxt(fp, np.array(rows), fmt=fmt, delimiter=',')
+
+def relativeChange(old, new, nodata=-9999.):
+    """
+    Calculate the mean relative change in return period values between
+    successive estimates. Only points with valid (positive) values in
+    both estimates are included.
+
+    :param old: `numpy.ndarray` of previous return period values
+                (return period, point).
+    :param new: `numpy.ndarray` of new return period values.
+    :param float nodata: missing data value.
+
+    :returns: `numpy.ndarray` of the mean absolute relative change for
+              each return period (`numpy.nan` where there are no valid
+              points).
+
+    """
+
+    valid = (old > 0.) & (new > 0.) & (old != nodata) & (new != nodata)
+    change = np.nan * np.ones(old.shape[0])
+    for k in range(old.shape[0]):
+        v = valid[k]
+        if v.any():
+            change[k] = np.mean(np.abs(new[k, v] - old[k, v]) / old[k, v])
+    return change
+
+def run(configFile, callback=None):
+    """
+    Generate the event set in batches of simulations until the return
+    period wind speeds have converged.
+
+    :param str configFile: path to configuration file.
+    :param func callback: optional callback function to track progress.
+
+    :returns: the number of simulations generated.
+
+    """
+
+    import TrackGenerator
+    import wind
+
+    log.info("Loading convergence settings")
+
+    config = ConfigParser()
+    config.read(configFile)
+
+    outputPath = config.get('Output', 'Path')
+    trackPath = pjoin(outputPath, 'tracks')
+    windfieldPath = pjoin(outputPath, 'windfield')
+    fmt = config.get('TrackGenerator', 'Format')
+    maxSims = config.getint('TrackGenerator', 'NumSimulations')
+    yrsPerSim = config.getint('TrackGenerator', 'YearsPerSimulation')
+    minRecords = config.getint('Hazard', 'MinimumRecords')
+    method = config.get('Hazard', 'Method').lower()
+    threshold = config.getfloat('Hazard', 'GPDThreshold')
+    batchSize = config.getint('Convergence', 'BatchSize')
+    npoints = config.getint('Convergence', 'SamplePoints')
+    tolerance = config.getfloat('Convergence', 'Tolerance')
+    years = np.array(config.get('Convergence',
+                                'Years').split(',')).astype('f')
+
+    # Each batch should contain whole blocks of stratified simulations:
+    sampling = config.get('TrackGenerator', 'Sampling').lower()
+    samplingBlock = config.getint('TrackGenerator', 'SamplingBlock')
+    log.info("Track sampling method: %s" % sampling)
+    if sampling != 'random' and batchSize % samplingBlock != 0:
+        log.warning("BatchSize (%d) is not a multiple of SamplingBlock "
+                    "(%d) - the strata of some batches are incomplete" %
+                    (batchSize, samplingBlock))
+
+    global pp
+    pp = attemptParallel()
+
+    if len(os.listdir(windfieldPath)) > 0:
+        log.warning("Wind field path %s is not empty - existing files "
+                    "will be included in the hazard calculation" %
+                    windfieldPath)
+
+    # The track generator reports the progress through each batch:
+    def status(done, total):
+        if callback is not None:
+            callback(start + (stop - start) * done / float(max(total, 1)),
+                     maxSims)
+
+    monitor = None
+    start = 0
+    while start < maxSims:
+        stop = min(start + batchSize, maxSims)
+        log.info("Generating simulations %d to %d" % (start, stop - 1))
+
+        TrackGenerator.run(configFile, status, simRange=(start, stop))
+        pp.barrier()
+
+        trackfiles = [pjoin(trackPath, 'tracks.%05i.%s' % (n, fmt))
+                      for n in range(start, stop)]
+        wind.run(configFile, lambda i, n: None, trackfiles=trackfiles)
+        pp.barrier()
+
+        gustfiles = [pjoin(windfieldPath, 'gust.%05i.nc' % n)
+                     for n in range(start, stop)]
+        gustfiles = [f for f in gustfiles if os.path.exists(f)]
+
+        if monitor is None:
+            ncobj = nctools.ncLoadFile(gustfiles[0])
+            lon = nctools.ncGetDims(ncobj, 'lon')
+            lat = nctools.ncGetDims(ncobj, 'lat')
+            ncobj.close()
+            monitor = ConvergenceMonitor(lon, lat, years, npoints,
+                                         minRecords, yrsPerSim,
+                                         method, threshold)
+
+        # Every processor evaluates the sampled points, so all reach the
+        # same decision to stop:
+        change = monitor.update(gustfiles)
+        log.info("%d simulations: relative change in return period wind "
+                 "speeds: %s" % (stop, ", ".join(["%d-year: %.4f" % (y, c)
+                                                  for y, c in zip(years,
+                                                                  change)])))
+        start = stop
+        if monitor.converged(tolerance):
+            log.info("Return period wind speeds converged after %d "
+                     "simulations" % stop)
+            break
+    else:
+        log.warning("Return period wind speeds did not converge within "
+                    "%d simulations" % maxSims)
+
+    if pp.rank() == 0 and monitor is not None:
+        monitor.save(pjoin(outputPath, 'hazard', 'convergence.csv'))
+
+    pp.barrier()
+    return start
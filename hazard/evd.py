@@ -24,20 +24,18 @@ of the Royal Statistical Society, 52, 1, 105-124.
 import logging as log
 import numpy as np
 
-try:
-    import lmoments as lmom
-except ImportError:
-    # If not, load ported python version of required functions
-    # (note: this runs about half the speed of the LMOMENTS fortran package)
-    import Utilities.lmomentFit as lmom
-    log.debug('LMOMENTS package not found - reverting to slower python' +
-              'version of code')
+from Utilities.lmomentFit import samlmu2d, pelgev2d, pelgpa2d
 
 def estimateEVD(v, years, missingValue=-9999., minRecords=50, yrspersim=1):
     """
-    Calculate extreme value distribution parameters using the Lmoments module
+    Calculate extreme value distribution parameters using the method of
+    L-moments. All samples are fitted simultaneously.
 
-    :param v: array of data values.
+    Only the positive values of each sample are used in the fit.
+
+    :param v: array of data values. The first axis is the record axis
+              -- all other axes (e.g. latitude, longitude) are treated
+              as independent samples.
     :type v: :class:`numpy.ndarray`
     :param years: array of years for which to calculate return period values.
     :type years: :class:`numpy.ndarray`
@@ -50,52 +48,317 @@ def estimateEVD(v, years, missingValue=-9999., minRecords=50, yrspersim=1):
     :return: return period values
     :rtype: :class:`numpy.ndarray`
     :return: location, shape and scale parameters of the distribution
-    :rtype: float
+    :rtype: :class:`numpy.ndarray`
     
     """
     # Convert to float to prevent integer division & ensure consistent data
     # types for output variables
     yrspersim = float(yrspersim)
     missingValue = float(missingValue)
-    years = np.array(years)
-     
-    # Initialise variables:
-    loc, scale, shp = [missingValue, missingValue, missingValue]
-    w = missingValue * np.ones(len(years))
-
-    if (v.max() > 0.):
-        ii = np.flatnonzero(v)
-        # Only calculate l-moments for those grid points where the values are 
-        # not all equal, and where there are 50 or more valid values.
-        if v[ii].min() != v[ii].max():
-            if len(ii) >= minRecords:
-                l1, l2, l3 = lmom.samlmu(v[ii], 3)
-                t3 = l3 / l2
-                if (l2 <= 0.) or (np.abs(t3) >= 1.):
-                    # Reject points where the second l-moment is negative
-                    # or the ratio of the third to second is > 1.
-                    log.debug("Invalid l-moments")
-                else:
-                    # Parameter estimation returns the location, scale and shape 
-                    # parameters
-                    xmom = [l1, l2, t3]
-                    loc, scale, shp = np.array(lmom.pelgev(xmom))
-                    # We only store the values if the first parameter is
-                    # finite (i.e. the location parameter is finite)
-                    if not np.isfinite(loc):
-                        loc, scale, shp = [
-                            missingValue, missingValue, missingValue]
-
-    for i, t in enumerate(years):
-        if shp == -9999:
-            w[i] = missingValue
-        else:
-            w[i] = (np.transpose(loc + (scale / shp) *
-                    (1. - np.power(-1. * np.log(1. - (yrspersim / t)),
-                                   shp))))
-
-            # Replace any non-finite numbers with the missing value:
-            if not np.isfinite(w[i]):
-                w[i] = missingValue
+    years = np.array(years, dtype=float)
+    v = np.sort(np.asarray(v, dtype=float), axis=0)
+
+    nrecords = v.shape[0]
+    shape = v.shape[1:]
+
+    if nrecords == 0:
+        return (missingValue * np.ones((len(years),) + shape),
+                missingValue * np.ones(shape),
+                missingValue * np.ones(shape),
+                missingValue * np.ones(shape))
+
+    # After sorting, the valid values are the last `nvalid` values of
+    # each sample:
+    vflat = v.reshape((nrecords, -1))
+    nsamples = vflat.shape[1]
+    nvalid = (vflat > 0.).sum(axis=0)
+    vmin = vflat[np.clip(nrecords - nvalid, 0, nrecords - 1),
+                 np.arange(nsamples)]
+    vmax = vflat[-1]
+
+    xmom = samlmu2d(vflat, 3, counts=nvalid)
+
+    # NOTE: the third value returned by `samlmu2d` is already the
+    # L-moment ratio TAU3. The additional division by Lambda-2 is
+    # retained from the original (per grid point) implementation, so
+    # the return period values are unchanged.
+    with np.errstate(divide='ignore', invalid='ignore'):
+        xmom[2] = xmom[2] / xmom[1]
+    loc, scale, shp = pelgev2d(xmom)
+
+    # Only use samples where the values are not all equal, where there
+    # are enough valid values, and reject samples where the second
+    # l-moment is negative or the ratio of the third to second is > 1:
+    with np.errstate(invalid='ignore'):
+        valid = ((nvalid > 0) & (vmin != vmax) & (nvalid >= minRecords) &
+                 (xmom[1] > 0.) & (np.abs(xmom[2]) < 1.) & np.isfinite(loc))
+
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        y = -1. * np.log(1. - (yrspersim / years))
+        w = (loc + (scale / shp) *
+             (1. - np.power(y[:, np.newaxis], shp)))
+
+    # Replace any non-finite numbers with the missing value:
+    w = np.where(valid & np.isfinite(w), w, missingValue)
+    loc = np.where(valid, loc, missingValue)
+    scale = np.where(valid, scale, missingValue)
+    shp = np.where(valid, shp, missingValue)
+
+    return (w.reshape((len(years),) + shape), loc.reshape(shape),
+            scale.reshape(shape), shp.reshape(shape))
+
+def estimateEmpirical(v, years, missingValue=-9999., minRecords=50,
+                      yrspersim=1):
+    """
+    Calculate empirical return period values from the order statistics
+    of the data. No distribution is fitted, so the returned location,
+    scale and shape parameters are all set to `missingValue`.
+
+    The return level for a return period `T` is interpolated between
+    the order statistics using the Weibull plotting position, i.e. the
+    `k`-th largest of `N` block maxima is assigned a return period of
+    `yrspersim * (N + 1) / k` years. Return periods beyond the length
+    of the record are set to `missingValue`.
+
+    :param v: array of data values. The first axis is the record axis
+              -- all other axes (e.g. latitude, longitude) are treated
+              as independent samples.
+    :type v: :class:`numpy.ndarray`
+    :param years: array of years for which to calculate return period values.
+    :type years: :class:`numpy.ndarray`
+    :param float missingValue: value to insert where there are
+                               insufficient data.
+    :param int minRecords: minimum number of valid observations required to
+                           calculate return period values.
+    :param int yrspersim: data represent block maxima - this gives the length
+                          of each block in years.
+
+    :return: return period values
+    :rtype: :class:`numpy.ndarray`
+    :return: location, shape and scale parameters of the distribution
+    :rtype: :class:`numpy.ndarray`
+
+    """
+    yrspersim = float(yrspersim)
+    missingValue = float(missingValue)
+    years = np.array(years, dtype=float)
+    v = np.asarray(v)
+
+    nrecords = v.shape[0]
+    shape = v.shape[1:]
+    loc = missingValue * np.ones(shape)
+    scale = missingValue * np.ones(shape)
+    shp = missingValue * np.ones(shape)
+
+    if nrecords == 0:
+        return missingValue * np.ones((len(years),) + shape), loc, scale, shp
+
+    # Position (in the sorted record) of the value for each return
+    # period. Only the order statistics either side of these
+    # positions are needed, so a partial sort is sufficient:
+    rank = yrspersim * (nrecords + 1.) / years
+    pos = np.clip(nrecords - rank, 0, nrecords - 1)
+    lower = np.floor(pos).astype(int)
+    upper = np.minimum(lower + 1, nrecords - 1)
+
+    kth = np.unique(np.concatenate([lower, upper]))
+    vpart = np.partition(v, kth, axis=0)
+
+    bshape = (len(years),) + (1,) * len(shape)
+    frac = (pos - lower).reshape(bshape)
+    w = vpart[lower] + frac * (vpart[upper] - vpart[lower])
+
+    # Reject return periods longer than the record, and locations
+    # with too few valid values:
+    inrange = (rank >= 1.).reshape(bshape)
+    w = np.where(inrange, w, missingValue)
+    nvalid = (v > 0.).sum(axis=0)
+    w = np.where(nvalid >= minRecords, w, missingValue)
+
+    return w, loc, scale, shp
+
+def estimateWeightedEvents(v, years, missingValue=-9999., minRecords=50,
+                           yrspersim=1, weights=None, nsims=None):
+    """
+    Calculate empirical return period values from the maxima of weighted
+    events, e.g. the tracks of simulations with importance sampled
+    genesis points, where each event is weighted by the likelihood ratio
+    of its genesis point.
+
+    The annual rate of events exceeding a level `x` is estimated as
+
+        rate(x) = lambda * sum(w_e * (v_e > x)) / N
+
+    where `N` is the number of events and `lambda` is the mean number of
+    events per year (`N` over the `nsims * yrspersim` simulated years).
+    The return level for a return period `T` is the level at which the
+    probability of at least one exceedance in a year,
+    `1 - exp(-rate(x))`, is `1 / T`. The level is interpolated between
+    the order statistics of the events, and return periods beyond the
+    largest event are set to `missingValue`.
+
+    :param v: array of event maxima. The first axis is the event axis
+              -- all other axes (e.g. latitude, longitude) are treated
+              as independent samples.
+    :type v: :class:`numpy.ndarray`
+    :param years: array of years for which to calculate return period values.
+    :type years: :class:`numpy.ndarray`
+    :param float missingValue: value to insert where there are
+                               insufficient data.
+    :param int minRecords: minimum number of valid observations required to
+                           calculate return period values.
+    :param int yrspersim: the number of years in each simulation.
+    :param weights: weights of the events, either one per event or one
+                    for each value of `v`. If not given, all events are
+                    weighted equally.
+    :type weights: :class:`numpy.ndarray`
+    :param int nsims: the number of simulations the events were drawn
+                      from (default is one simulation for each event).
+
+    :return: return period values
+    :rtype: :class:`numpy.ndarray`
+    :return: location, shape and scale parameters of the distribution
+    :rtype: :class:`numpy.ndarray`
+
+    """
+    yrspersim = float(yrspersim)
+    missingValue = float(missingValue)
+    years = np.array(years, dtype=float)
+    v = np.asarray(v)
+
+    nrecords = v.shape[0]
+    shape = v.shape[1:]
+    loc = missingValue * np.ones(shape)
+    scale = missingValue * np.ones(shape)
+    shp = missingValue * np.ones(shape)
+
+    if nrecords == 0:
+        return missingValue * np.ones((len(years),) + shape), loc, scale, shp
+
+    if nsims is None:
+        nsims = nrecords
+    rate = nrecords / (nsims * yrspersim)
+
+    if weights is None:
+        weights = np.ones(nrecords)
+    weights = np.asarray(weights, dtype=float)
+    if weights.ndim == 1:
+        weights = weights.reshape((nrecords,) + (1,) * len(shape))
+    weights = np.broadcast_arrays(weights, v)[0]
+
+    # Sort the values at each location in descending order, and
+    # accumulate the rate of events exceeding each order statistic:
+    vv = v.reshape(nrecords, -1)
+    ww = weights.reshape(nrecords, -1)
+    cols = np.arange(vv.shape[1])
+    order = np.argsort(-vv, axis=0)
+    vs = vv[order, cols]
+    cum = rate * ww[order, cols].cumsum(axis=0) / nrecords
+
+    # Annual rate of exceedance for each return period (Poisson):
+    with np.errstate(divide='ignore'):
+        target = -np.log(1. - 1. / years)
+
+    w = np.empty((len(years), vv.shape[1]))
+    for n, prob in enumerate(target):
+        upper = np.minimum((cum < prob).sum(axis=0), nrecords - 1)
+        lower = np.maximum(upper - 1, 0)
+        clower = cum[lower, cols]
+        cupper = cum[upper, cols]
+        step = np.where(cupper > clower, cupper - clower, 1.)
+        frac = np.clip((prob - clower) / step, 0., 1.)
+        frac = np.where(upper > lower, frac, 0.)
+        w[n] = vs[lower, cols] + frac * (vs[upper, cols] - vs[lower, cols])
+
+        # Reject return periods beyond the largest event:
+        w[n] = np.where(prob < cum[0], missingValue, w[n])
+        if not np.isfinite(prob):
+            w[n] = missingValue
+
+    w = w.reshape((len(years),) + shape)
+    nvalid = (v > 0.).sum(axis=0)
+    w = np.where(nvalid >= minRecords, w, missingValue)
+
+    return w, loc, scale, shp
+
+def estimateGPD(v, years, missingValue=-9999., minRecords=50, yrspersim=1,
+                threshold=90.):
+    """
+    Calculate return period values by fitting a Generalised Pareto
+    Distribution to the values exceeding a threshold (peaks over
+    threshold), using the method of L-moments. All samples are
+    fitted simultaneously.
+
+    The threshold is set for each sample such that the largest
+    (100 - `threshold`) percent of the valid (non-zero) values are
+    treated as exceedances. The returned location parameter includes
+    the threshold, so the return period values are in the same units
+    as the data.
+
+    :param v: array of data values. The first axis is the record axis
+              -- all other axes (e.g. latitude, longitude) are treated
+              as independent samples.
+    :type v: :class:`numpy.ndarray`
+    :param years: array of years for which to calculate return period values.
+    :type years: :class:`numpy.ndarray`
+    :param float missingValue: value to insert if the fit is not valid.
+    :param int minRecords: minimum number of valid observations required to
+                           perform fitting.
+    :param int yrspersim: data represent block maxima - this gives the length
+                          of each block in years.
+    :param float threshold: percentile of the valid values used as the
+                            threshold.
+
+    :return: return period values
+    :rtype: :class:`numpy.ndarray`
+    :return: location, shape and scale parameters of the distribution
+    :rtype: :class:`numpy.ndarray`
+
+    """
+    yrspersim = float(yrspersim)
+    missingValue = float(missingValue)
+    years = np.array(years, dtype=float)
+    v = np.sort(np.asarray(v, dtype=float), axis=0)
+
+    nrecords = v.shape[0]
+    shape = v.shape[1:]
+    bshape = (len(years),) + (1,) * len(shape)
+
+    if nrecords == 0:
+        return (missingValue * np.ones((len(years),) + shape),
+                missingValue * np.ones(shape),
+                missingValue * np.ones(shape),
+                missingValue * np.ones(shape))
+
+    # Number of exceedances for each sample. The threshold is the
+    # largest value that is not an exceedance:
+    nvalid = (v > 0.).sum(axis=0)
+    nexc = np.floor((100. - threshold) * nvalid / 100.).astype(int)
+    idx = np.clip(nrecords - nexc - 1, 0, nrecords - 1)
+    vflat = v.reshape((nrecords, -1))
+    u = vflat[idx.ravel(), np.arange(vflat.shape[1])].reshape(shape)
+
+    # The exceedances are the largest `nexc` values of each sample:
+    xmom = samlmu2d(vflat - u.ravel(), 3, counts=nexc.ravel())
+    l2, t3 = [x.reshape(shape) for x in xmom[1:]]
+    loc, scale, shp = [x.reshape(shape) for x in pelgpa2d(xmom)]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Mean rate of exceedance (per year) and the return levels:
+        n = nexc.astype(float)
+        rate = n / (nrecords * yrspersim)
+        y = np.asarray(rate * years.reshape(bshape))
+        small = np.abs(shp) < 1e-5
+        w = np.where(small, loc + scale * np.log(y),
+                     loc + scale * (1. - np.power(y, -shp)) / shp)
+        w = np.where(y >= 1., u + w, missingValue)
+
+    valid = ((nvalid >= minRecords) & (nexc >= 3) & (l2 > 0.) &
+             (np.abs(t3) < 1.) & np.isfinite(loc) & np.isfinite(scale))
+
+    w = np.where(valid & np.isfinite(w), w, missingValue)
+    loc = np.where(valid, u + loc, missingValue)
+    scale = np.where(valid, scale, missingValue)
+    shp = np.where(valid, shp, missingValue)
 
     return w, loc, scale, shp
@@ -0,0 +1,199 @@
+"""
+:mod:`query` -- Extract return period curves from a hazard file
+================================================================
+
+.. module:: query
+    :synopsis: Extract return period wind speeds for a set of
+               locations from the output of the hazard calculation.
+
+.. moduleauthor:: Craig Arthur <craig.arthur@ga.gov.au>
+
+The hazard file is opened once, and the return period curves (and
+confidence range, if present) for all requested locations are read
+with a single request for each variable, rather than loading the full
+grid for every location. Locations are assigned to the nearest grid
+point::
+
+    from hazard.query import HazardQuery
+    hq = HazardQuery('output/hazard/hazard.nc')
+    years, wspd, upper, lower = hq.curves(lons, lats)
+    hq.close()
+
+"""
+
+import logging
+import numpy as np
+import numpy.ma as ma
+
+import Utilities.nctools as nctools
+
+log = logging.getLogger(__name__)
+log.addHandler(logging.NullHandler())
+
+def nearestIndex(coords, values):
+    """
+    Find the index of the element of `coords` closest to each element of
+    `values`. Values outside the range of `coords` are assigned to the
+    first or last element, as for :func:`Utilities.maputils.find_index`.
+
+    :param coords: 1-D array of coordinate values (e.g. longitudes).
+    :type coords: :class:`numpy.ndarray`
+    :param values: Values to locate in `coords`.
+    :type values: :class:`numpy.ndarray` or `list`
+
+    :returns: :class:`numpy.ndarray` of indices into `coords`.
+
+    Example::
+
+        >>> nearestIndex(np.arange(0., 100., 0.5), [15.25, -1., 120.])
+        array([30,  0, 199])
+
+    """
+
+    coords = np.asarray(coords)
+    values = np.atleast_1d(np.asarray(values, dtype=float))
+    if len(coords) == 1:
+        return np.zeros(values.shape, dtype=int)
+
+    order = np.argsort(coords)
+    sc = coords[order]
+    idx = np.clip(np.searchsorted(sc, values), 1, len(sc) - 1)
+    left = values - sc[idx - 1]
+    right = sc[idx] - values
+    idx = idx - (left <= right)
+    return order[idx]
+
+class HazardQuery(object):
+    """
+    Extract return period curves from a hazard file for many locations.
+
+    :param str hazardFile: Path to the hazard file (``hazard.nc``)
+                           created by :mod:`hazard`.
+
+    """
+
+    def __init__(self, hazardFile):
+        self.hazardFile = hazardFile
+        try:
+            self.ncobj = nctools.ncLoadFile(hazardFile)
+            self.lon = nctools.ncGetDims(self.ncobj, 'lon')
+            self.lat = nctools.ncGetDims(self.ncobj, 'lat')
+            self.years = nctools.ncGetDims(self.ncobj, 'years')
+        except (IOError, RuntimeError, KeyError):
+            log.critical("Cannot load hazard file: %s" % hazardFile)
+            raise
+
+        self.ciBounds = ('wspdupper' in self.ncobj.variables and
+                         'wspdlower' in self.ncobj.variables)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Close the hazard file"""
+        self.ncobj.close()
+
+    def locate(self, lons, lats):
+        """
+        Find the grid indices of the grid points nearest to the given
+        locations.
+
+        :param lons: Longitudes of the locations.
+        :param lats: Latitudes of the locations.
+
+        :returns: Arrays of latitude and longitude indices.
+
+        """
+
+        i = nearestIndex(self.lon, lons)
+        j = nearestIndex(self.lat, lats)
+        if len(i) != len(j):
+            raise ValueError("Number of longitudes and latitudes differ")
+        return j, i
+
+    def getPoints(self, varname, j, i):
+        """
+        Read the values of a variable at a set of grid points. The values
+        for all points are read in a single request covering the unique
+        rows and columns of the points.
+
+        :param str varname: Name of the variable to read.
+        :param j: Latitude indices of the grid points.
+        :param i: Longitude indices of the grid points.
+
+        :returns: :class:`numpy.ma.MaskedArray` with the points along
+                  the first dimension (shape (npoints,) for a 2-D
+                  variable, (npoints, nyears) for a 3-D variable).
+
+        """
+
+        uj, jinv = np.unique(j, return_inverse=True)
+        ui, iinv = np.unique(i, return_inverse=True)
+
+        varobj = self.ncobj.variables[varname]
+        varobj.set_auto_maskandscale(True)
+        data = ma.asarray(varobj[..., uj, ui])
+        data = data[..., jinv, iinv]
+        return data.T
+
+    def curves(self, lons, lats, varname='wspd'):
+        """
+        Return period curves at a set of locations.
+
+        :param lons: Longitudes of the locations.
+        :param lats: Latitudes of the locations.
+        :param str varname: Name of the return period variable.
+
+        :returns: The return periods, and masked arrays of shape
+                  (npoints, nyears) of the return period values and
+                  the upper and lower confidence range. The confidence
+                  range is `None` if not stored in the hazard file.
+
+        """
+
+        j, i = self.locate(lons, lats)
+        wspd = self.getPoints(varname, j, i)
+        if self.ciBounds and varname == 'wspd':
+            upper = self.getPoints('wspdupper', j, i)
+            lower = self.getPoints('wspdlower', j, i)
+        else:
+            upper = lower = None
+
+        return self.years, wspd, upper, lower
+
+    def parameters(self, lons, lats):
+        """
+        Fitted distribution parameters at a set of locations.
+
+        :param lons: Longitudes of the locations.
+        :param lats: Latitudes of the locations.
+
+        :returns: Masked arrays of the location, scale and shape
+                  parameters at each location.
+
+        """
+
+        j, i = self.locate(lons, lats)
+        return [self.getPoints(v, j, i) for v in ['loc', 'scale', 'shp']]
+
+def queryHazard(hazardFile, lons, lats):
+    """
+    Convenience function to extract return period curves at a set of
+    locations from a hazard file.
+
+    :param str hazardFile: Path to the hazard file.
+    :param lons: Longitudes of the locations.
+    :param lats: Latitudes of the locations.
+
+    :returns: See :meth:`HazardQuery.curves`.
+
+    """
+
+    hq = HazardQuery(hazardFile)
+    try:
+        return hq.curves(lons, lats)
+    finally:
+        hq.close()
@@ -155,13 +155,17 @@ def doOutputDirectoryCreation(configFile):
                 raise
 
 
-def doTrackGeneration(configFile):
+def doTrackGeneration(configFile, windfield=False):
     """
     Do the tropical cyclone track generation in :mod:`TrackGenerator`.
 
     The track generation settings are read from *configFile*.
 
     :param str configFile: Name of configuration file.
+    :param bool windfield: If ``True``, also calculate the wind fields of
+                           each simulation as soon as its tracks are
+                           generated, rather than reading the tracks
+                           back from the track files.
 
     """
 
@@ -172,18 +176,52 @@ def doTrackGeneration(configFile):
 
     showProgressBar = config.get('Logging', 'ProgressBar')
 
-    pbar = ProgressBar('Simulating cyclone tracks: ', showProgressBar)
+    if windfield:
+        pbar = ProgressBar('Simulating cyclone tracks and wind fields: ',
+                           showProgressBar)
+    else:
+        pbar = ProgressBar('Simulating cyclone tracks: ', showProgressBar)
 
     def status(done, total):
         pbar.update(float(done)/total)
 
     import TrackGenerator
-    TrackGenerator.run(configFile, status)
+    TrackGenerator.run(configFile, status, windfield=windfield)
 
     pbar.update(1.0)
     log.info('Completed track generation')
 
 
+def doConvergence(configFile):
+    """
+    Generate the tracks and wind fields in batches of simulations until
+    the return period wind speeds converge, using
+    :mod:`hazard.convergence`. The convergence settings are read from
+    *configFile*.
+
+    :param str configFile: Name of configuration file.
+
+    """
+
+    log.info('Starting convergence run')
+
+    config = ConfigParser()
+    config.read(configFile)
+
+    showProgressBar = config.get('Logging', 'ProgressBar')
+
+    pbar = ProgressBar('Simulating until converged: ', showProgressBar)
+
+    def status(done, total):
+        pbar.update(float(done)/total)
+
+    from hazard import convergence
+    nSims = convergence.run(configFile, status)
+
+    pbar.update(1.0)
+    log.info('Completed convergence run with %d simulations', nSims)
+
+
 def doWindfieldCalculations(configFile):
     """
     Do the wind field calculations, using :mod:`wind`. The wind
@@ -398,7 +436,7 @@ def doHazard(configFile):
         pbar.update(float(done)/total)
 
     import hazard
-    hazard.run(configFile)
+    hazard.run(configFile, status)
 
     log.info('Completed HazardInterface')
     pbar.update(1.0)
@@ -503,13 +541,22 @@ def main(configFile='main.ini'):
 
     pp.barrier()
 
-    if config.getboolean('Actions', 'ExecuteTrackGenerator'):
-        doTrackGeneration(configFile)
+    if config.getboolean('Actions', 'ExecuteConvergence'):
+        doConvergence(configFile)
 
-    pp.barrier()
+    elif (config.getboolean('Actions', 'ExecuteTrackGenerator') and
+          config.getboolean('Actions', 'ExecuteWindfield') and
+          config.getboolean('TrackGenerator', 'StreamWindfield')):
+        doTrackGeneration(configFile, windfield=True)
+
+    else:
+        if config.getboolean('Actions', 'ExecuteTrackGenerator'):
+            doTrackGeneration(configFile)
+
+        pp.barrier()
 
-    if config.getboolean('Actions', 'ExecuteWindfield'):
-        doWindfieldCalculations(configFile)
+        if config.getboolean('Actions', 'ExecuteWindfield'):
+            doWindfieldCalculations(configFile)
 
     pp.barrier()
 
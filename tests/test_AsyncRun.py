@@ -0,0 +1,44 @@
+"""
+Testing the background output writer
+"""
+
+import time
+import unittest
+
+from Utilities.AsyncRun import AsyncWriter
+
+
+class TestAsyncWriter(unittest.TestCase):
+
+    def testFlush(self):
+        """Test all submitted jobs are complete after a flush"""
+        writer = AsyncWriter(2, 3)
+        done = []
+
+        def job(i, delay=0.):
+            time.sleep(delay)
+            done.append(i)
+
+        for i in range(10):
+            writer.submit(job, i, delay=0.01)
+        writer.flush()
+        self.assertEqual(sorted(done), range(10))
+        writer.close()
+
+    def testError(self):
+        """Test an error in a job is raised by the next flush"""
+        writer = AsyncWriter(1, 2)
+        writer.submit(lambda: 1 / 0)
+        self.assertRaises(ZeroDivisionError, writer.flush)
+        writer.flush()
+        writer.close()
+
+    def testSerial(self):
+        """Test jobs run as they are submitted without threads"""
+        writer = AsyncWriter(0)
+        done = []
+        writer.submit(done.append, 1)
+        self.assertEqual(done, [1])
+
+if __name__ == "__main__":
+    unittest.main()
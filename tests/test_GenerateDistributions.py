@@ -0,0 +1,53 @@
+"""
+Testing the calculation of the cell distributions
+"""
+
+import sys
+import unittest
+import numpy as np
+from numpy.testing import assert_array_equal
+
+from StatInterface.GenerateDistributions import GenerateDistributions
+
+
+class TestGenerateDistributions(unittest.TestCase):
+
+    gridLimit = {'xMin': 100., 'xMax': 110., 'yMin': -20., 'yMax': -10.}
+    gridSpace = {'x': 2.5, 'y': 2.5}
+    gridInc = {'x': 1., 'y': 1.}
+
+    def setUp(self):
+        prng = np.random.RandomState(1234)
+        n = 1500
+        lon = prng.uniform(100., 110., n)
+        lat = prng.uniform(-20., -10., n)
+        self.lonLat = np.column_stack((lon, lat))
+        self.param = prng.gamma(4., 5., n)
+        self.param[prng.uniform(size=n) < 0.05] = sys.maxint
+        self.bearing = np.mod(np.degrees(prng.vonmises(0., 1., n)), 360.)
+
+    def distributions(self, numProcesses, param, **kwargs):
+        gd = GenerateDistributions(None, self.gridLimit, self.gridSpace,
+                                   self.gridInc, 'Gaussian',
+                                   minSamplesCell=40,
+                                   numProcesses=numProcesses)
+        return gd.allDistributions(self.lonLat, param, **kwargs)
+
+    def testProcesses(self):
+        """Test the distributions do not depend on the number of processes"""
+        serial = self.distributions(1, self.param, kdeStep=0.5)
+        pool = self.distributions(3, self.param, kdeStep=0.5)
+        self.assertEqual(serial.shape, pool.shape)
+        assert_array_equal(serial, pool)
+        assert_array_equal(np.unique(serial[:, 0]), np.arange(16))
+
+    def testProcessesAngular(self):
+        """Test the angular distributions with several processes"""
+        serial = self.distributions(1, self.bearing, kdeStep=5.,
+                                    angular=True)
+        pool = self.distributions(2, self.bearing, kdeStep=5.,
+                                  angular=True)
+        assert_array_equal(serial, pool)
+
+if __name__ == "__main__":
+    unittest.main()
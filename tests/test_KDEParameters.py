@@ -54,6 +54,16 @@ class TestKDEParameters(NumpyTestCase.NumpyTestCase):
         result = self.k.generateKDE(self.pressure_rate, kdeStep)
         self.numpyAssertAlmostEqual(self.resultp, result)
 
+    def test_GenerateKDEBinned(self):
+        """Testing binned GenerateKDE matches the direct estimate"""
+        kdeStep = 0.1
+        k = KDEParameters.KDEParameters('Epanechnikov', binned=True)
+        result = k.generateKDE(self.pressure_rate, kdeStep)
+        self.numpyAssertAlmostEqual(self.resultp[:, 0], result[:, 0])
+        pdf = self.resultp[:, 1]
+        self.assertTrue(abs(result[:, 1] - pdf).max() < 1e-4 * pdf.max())
+        self.assertTrue(abs(result[:, 2] - self.resultp[:, 2]).max() < 1e-4)
+
 if __name__ == "__main__":
     flStartLog('', 'CRITICAL', False)
     testSuite = unittest.makeSuite(TestKDEParameters,'test')
@@ -1,7 +1,124 @@
+import os
+import shutil
+import tempfile
 import unittest
+import numpy as np
+from datetime import timedelta
 from numpy.testing import *
 
-# from TrackGenerator import TrackGenerator
+from TrackGenerator import TrackGenerator as tgmodule
+from TrackGenerator.TrackGenerator import (CellCDF, ppf, stratifiedQuantiles,
+                                           Simulation, TrackGenerator,
+                                           simulateBlocks)
+from Utilities.AsyncRun import flushWriter
+from StatInterface.generateStats import GenerateStats
+import wind
+from Utilities import nctools, stats
+
+
+GRIDLIMIT = {'xMin': 100., 'xMax': 120., 'yMin': -25., 'yMax': -5.}
+GRIDSPACE = {'x': 5., 'y': 5.}
+
+
+class ConstantPressure(object):
+    """Environmental pressure that is the same everywhere"""
+
+    def __init__(self, value=1010.):
+        self.value = value
+
+    def get_pressure(self, coords):
+        coords = np.asarray(coords, dtype=float)
+        return self.value * np.ones(coords.shape[1:])
+
+
+class LandEastOf(object):
+    """Land mask with land east of a longitude"""
+
+    def __init__(self, lon):
+        self.lon = lon
+        self.landMask = self
+
+    def onLand(self, lon, lat):
+        return np.asarray(lon) >= self.lon
+
+
+def cellTable(values):
+    """CDF table with the same distribution of values in every cell"""
+    ncells = stats.maxCellNum(GRIDLIMIT, GRIDSPACE) + 1
+    values = np.atleast_1d(values).astype(float)
+    cdf = np.arange(1, len(values) + 1) / float(len(values))
+    return np.array([[c, v, p] for c in range(ncells)
+                     for v, p in zip(values, cdf)])
+
+def cellStats(mu, sig, alpha=0., phi=0., pmin=900., angular=False):
+    """Cell statistics that are the same in every cell"""
+    cs = GenerateStats(None, None, GRIDLIMIT, GRIDSPACE, GRIDSPACE,
+                       angular=angular, calculateLater=True)
+    for prefix in ['', 'l']:
+        getattr(cs.coeffs, prefix + 'mu')[:] = mu
+        getattr(cs.coeffs, prefix + 'sig')[:] = sig
+        getattr(cs.coeffs, prefix + 'alpha')[:] = alpha
+        getattr(cs.coeffs, prefix + 'phi')[:] = phi
+        getattr(cs.coeffs, prefix + 'min')[:] = pmin
+    return cs
+
+def makeGenerator(processPath, origins=None, random=True, **kwargs):
+    """
+    Create a track generator from synthetic distributions. The genesis
+    points are drawn from `origins` (a list of longitude, latitude
+    pairs), or uniformly from the centre of the domain. If `random` is
+    ``False``, the initial conditions and the tracks are deterministic.
+    """
+    lon = np.arange(100., 120.01, 0.5)
+    lat = np.arange(-25., -4.99, 0.5)
+    pdf = np.zeros((len(lat), len(lon)))
+    if origins is None:
+        pdf[(lat > -20.) & (lat < -10.), :] = 1.
+        pdf[:, (lon < 105.) | (lon > 115.)] = 0.
+    else:
+        for x, y in origins:
+            pdf[np.argmin(abs(lat - y)), np.argmin(abs(lon - x))] = 1.
+    dimensions = {
+        0: {'name': 'lat', 'values': lat, 'dtype': 'f',
+            'atts': {'units': 'degrees_north'}},
+        1: {'name': 'lon', 'values': lon, 'dtype': 'f',
+            'atts': {'units': 'degrees_east'}}
+    }
+    variables = {
+        0: {'name': 'gpdf', 'dims': ('lat', 'lon'), 'values': pdf,
+            'dtype': 'f', 'atts': {'units': ''}}
+    }
+    nctools.ncSaveGrid(os.path.join(processPath, 'originPDF.nc'),
+                       dimensions, variables)
+
+    # The decay over land is random, so there is no land for the
+    # deterministic tracks:
+    land = LandEastOf(115. if random else 200.)
+    kwargs.setdefault('maxTimeSteps', 100)
+    tg = TrackGenerator(processPath, GRIDLIMIT, GRIDSPACE, GRIDSPACE,
+                        ConstantPressure(), land, **kwargs)
+
+    if random:
+        tg.allCDFInitBearing = CellCDF(cellTable(np.arange(180., 361., 10.)))
+        tg.allCDFInitSpeed = CellCDF(cellTable(np.arange(10., 41., 2.)))
+        tg.allCDFInitPressure = CellCDF(cellTable(np.arange(950., 1001., 5.)))
+        tg.allCDFInitSize = CellCDF(cellTable(np.arange(20., 61., 5.)))
+        tg.allCDFInitDay = CellCDF(cellTable(np.arange(1., 91.)))
+        tg.vStats = cellStats(25., 5., 0.5, 0.8)
+        tg.bStats = cellStats(np.radians(250.), 0.3, 0.5, 0.8, angular=True)
+        tg.dpStats = cellStats(0.5, 1., 0.3, 0.9)
+    else:
+        tg.allCDFInitBearing = CellCDF(cellTable(270.))
+        tg.allCDFInitSpeed = CellCDF(cellTable(40.))
+        tg.allCDFInitPressure = CellCDF(cellTable(980.))
+        tg.allCDFInitSize = CellCDF(cellTable(30.))
+        tg.allCDFInitDay = CellCDF(cellTable(30.))
+        tg.vStats = cellStats(40., 0.)
+        tg.bStats = cellStats(np.radians(270.), 0., angular=True)
+        tg.dpStats = cellStats(1., 0.)
+    tg.pStats = cellStats(980., 10., pmin=900.)
+    return tg
+
 
 
 class TestTrackGenerator(unittest.TestCase):
@@ -10,6 +127,316 @@ class TestTrackGenerator(unittest.TestCase):
         assert_almost_equal(range(10), range(10))
         pass
 
+
+class TestCellCDF(unittest.TestCase):
+
+    def setUp(self):
+        # CDFs for cells 3, 0 and 7 (in that order in the file):
+        self.table = np.array([[3, 10., 0.2], [3, 20., 0.7], [3, 30., 1.],
+                               [0, 1., 0.5], [0, 2., 1.],
+                               [7, 950., 0.1], [7, 990., 0.6],
+                               [7, 1000., 0.9], [7, 1010., 1.]])
+        self.cdf = CellCDF(self.table)
+
+    def testCDF(self):
+        """Test the CDF of a cell is a slice of the table"""
+        for c in [0, 3, 7]:
+            ind = self.table[:, 0] == c
+            assert_equal(self.cdf.cdf(c), self.table[ind, 1:3])
+        self.assertEqual(len(self.cdf.cdf(5)), 0)
+        self.assertEqual(len(self.cdf.cdf(20)), 0)
+
+    def testPPF(self):
+        """Test ppf for many cells matches ppf of each cell"""
+        cells = np.array([3, 0, 7, 7, 3, 0, 7])
+        q = np.array([0.1, 0.6, 0.05, 0.65, 0.99, 0.5, 1.])
+        expected = [ppf(qq, self.table[self.table[:, 0] == c, 1:3])
+                    for qq, c in zip(q, cells)]
+        assert_equal(self.cdf.ppf(q, cells), expected)
+        self.assertRaises(IndexError, self.cdf.ppf, [0.5], [5])
+
+    def testSearchsorted(self):
+        """Test searching the values of many cells"""
+        cells = np.array([7, 7, 7, 3, 0])
+        values = np.array([900., 995., 1020., 25., 1.])
+        assert_equal(self.cdf.searchsorted(cells, values), [0, 2, 4, 2, 0])
+
+class TestStratifiedQuantiles(unittest.TestCase):
+
+    def testLHS(self):
+        """Test each stratum of a Latin hypercube holds one track"""
+        rng = np.random.RandomState(1)
+        lower, width = stratifiedQuantiles(20, 'lhs', rng)
+        q = lower + width * rng.random_sample(lower.shape)
+        for d in range(3):
+            assert_equal(np.sort(np.floor(20 * q[:, d])), np.arange(20))
+
+    def testStratified(self):
+        """Test each stratum of the genesis grid holds one track"""
+        rng = np.random.RandomState(1)
+        lower, width = stratifiedQuantiles(20, 'stratified', rng)
+        q = lower + width * rng.random_sample(lower.shape)
+        inside = width[:, 0] < 1.
+        self.assertEqual(inside.sum(), 16)
+        cells = np.floor(4 * q[inside, :2])
+        self.assertEqual(len(set(map(tuple, cells))), 16)
+        assert_equal(np.sort(np.floor(20 * q[:, 2])), np.arange(20))
+
+    def testUnknown(self):
+        """Test an unknown sampling method is rejected"""
+        rng = np.random.RandomState(1)
+        self.assertRaises(ValueError, stratifiedQuantiles, 5, 'sobol', rng)
+
+
+class TestGenerateEnsemble(unittest.TestCase):
+
+    def setUp(self):
+        self.processPath = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.processPath)
+
+    def testScalarPath(self):
+        """Test ensemble tracks match the tracks generated singly"""
+        # Westward tracks that exit the domain early (and are removed),
+        # decay in the domain, and exit the domain:
+        origins = [(103., -15.), (118., -15.), (108., -15.)]
+        tg = makeGenerator(self.processPath, origins, random=False)
+        sims = [Simulation(0, 1, 12, None), Simulation(1, 1, 8, None)]
+        results = tg.generateEnsemble(sims)
+
+        expected = {}
+        for lon, lat in origins:
+            tracks = tg.generateTracks(1, initLon=lon, initLat=lat)
+            if len(tracks) > 0:
+                expected[lon] = tracks
+        self.assertEqual(sorted(expected.keys()), [108., 118.])
+        # The track from 118E decays after 27 steps, and the track from
+        # 108E leaves the domain:
+        self.assertEqual(len(expected[118.]), 27)
+        self.assertTrue(expected[108.][-1, 3] > GRIDLIMIT['xMin'])
+        self.assertTrue(1010. - expected[108.][-1, 7] >= 5.)
+
+        for sim, result in zip(sims, results):
+            numbers = np.unique(result[:, 0].astype(int))
+            self.assertTrue(len(numbers) > 0)
+            for n in numbers:
+                track = result[result[:, 0] == n]
+                lon = round(float(track[0, 3]))
+                self.assertTrue(lon in expected)
+                self.assertEqual(track.shape, expected[lon].shape)
+                assert_allclose(track[:, 2:].astype(float),
+                                expected[lon][:, 2:].astype(float),
+                                rtol=1e-5, atol=1e-4)
+                dt = np.diff(track[:, 1])
+                self.assertTrue(all(d == timedelta(hours=1) for d in dt))
+
+    def testFilters(self):
+        """Test tracks are removed by the same rules as single tracks"""
+        origins = [(118., -15.), (108., -15.)]
+
+        # Tracks leaving the inner domain are removed:
+        inner = {'xMin': 105., 'xMax': 120., 'yMin': -25., 'yMax': -5.}
+        tg = makeGenerator(self.processPath, origins, random=False,
+                           innerGridLimit=inner)
+        results = tg.generateEnsemble([Simulation(0, 1, 20, None)])
+        self.assertTrue(len(results[0]) > 0)
+        assert_almost_equal(np.round(results[0][::27, 3].astype(float)),
+                            118.)
+
+        # Tracks that do not pass through the region are culled, and
+        # counted for each simulation:
+        region = {'xMin': 100., 'xMax': 104., 'yMin': -20., 'yMax': -10.}
+        tg = makeGenerator(self.processPath, origins, random=False,
+                           cullRegion=region)
+        sims = [Simulation(0, 1, 20, None), Simulation(1, 1, 5, None)]
+        results = tg.generateEnsemble(sims)
+        for k, sim in enumerate(sims):
+            numbers = np.unique(results[k][:, 0]) if len(results[k]) else []
+            self.assertEqual(len(numbers) + tg.nCulled[k], sim.ntracks)
+            for n in numbers:
+                track = results[k][results[k][:, 0] == n]
+                self.assertTrue(track[:, 3].astype(float).min() <= 104.)
+        self.assertTrue(0 < tg.nCulled[0] < sims[0].ntracks)
+
+        # Tracks whose pressure is not below the environmental pressure
+        # are removed:
+        tg = makeGenerator(self.processPath, origins, random=False)
+        tg.allCDFInitPressure = CellCDF(cellTable(1015.))
+        results = tg.generateEnsemble([Simulation(0, 1, 10, None)])
+        self.assertEqual(len(results[0]), 0)
+
+    def testCulled(self):
+        """Test the same tracks are culled as when generated singly"""
+        # The track from 118E decays before it reaches the region, the
+        # track from 108E passes through it, and the track from 103E
+        # dies early (and is not counted as culled):
+        region = {'xMin': 100., 'xMax': 104., 'yMin': -20., 'yMax': -10.}
+        for lon, culled in [(118., 6), (108., 0), (103., 0)]:
+            tg = makeGenerator(self.processPath, [(lon, -15.)],
+                               random=False, cullRegion=region)
+            tracks = tg.generateTracks(6, initLon=lon, initLat=-15.)
+            self.assertEqual(tg.nCulled, culled)
+            results = tg.generateEnsemble([Simulation(0, 1, 6, None),
+                                           Simulation(1, 1, 2, None)])
+            assert_equal(tg.nCulled, [culled, culled // 3])
+            self.assertEqual(len(results[0]), len(tracks))
+
+    def testOwnership(self):
+        """Test the tracks of a simulation do not depend on the block"""
+        tg = makeGenerator(self.processPath)
+        sims = [Simulation(i, 5, n, None)
+                for i, n in enumerate([6, 0, 9, 4])]
+        block = tg.generateEnsemble(sims)
+        culled = tg.nCulled.copy()
+        for k, sim in enumerate(sims):
+            alone = tg.generateEnsemble([sim])
+            self.assertEqual(alone[0].shape, block[k].shape)
+            if len(alone[0]) > 0:
+                assert_equal(alone[0][:, [0, 2, 3, 4, 7]].astype(float),
+                             block[k][:, [0, 2, 3, 4, 7]].astype(float))
+                self.assertEqual(list(alone[0][:, 1]),
+                                 list(block[k][:, 1]))
+                numbers = block[k][:, 0].astype(int)
+                self.assertTrue(numbers.min() >= 1)
+                self.assertTrue(numbers.max() <= sim.ntracks)
+            self.assertEqual(tg.nCulled[0], culled[k])
+
+    def testWeights(self):
+        """Test each track is weighted by the ratio of its genesis point"""
+        tg = makeGenerator(self.processPath)
+        x, y = tg.originSampler.x, tg.originSampler.y
+        bias = (x[np.newaxis, :] > 112.) * np.ones((len(y), 1))
+        tg.originSampler.setImportance(bias, 0.75)
+
+        sims = [Simulation(i, 5, n, None) for i, n in enumerate([20, 0, 30])]
+        results = tg.generateEnsemble(sims)
+        weights = list(tg.weight)
+        results.append(tg.generateTracks(25))
+        weights.append(tg.weight)
+
+        for tracks, weight in zip(results, weights):
+            if len(tracks) == 0:
+                self.assertEqual(len(weight), 0)
+                continue
+            first = np.flatnonzero(np.diff(np.r_[-1, tracks[:, 0]]))
+            self.assertEqual(len(weight), len(first))
+            lon = tracks[first, 3].astype(float)
+            lat = tracks[first, 4].astype(float)
+            assert_allclose(weight, tg.originSampler.weights(lon, lat))
+            self.assertTrue(np.all(weight <= 4. + 1e-6))
+
+        # The origins east of 112E are over-sampled and down-weighted:
+        weight = np.concatenate(weights)
+        self.assertTrue(weight.min() < 1. < weight.max())
+
+    def testShapes(self):
+        """Test the ensemble output has the form of the single tracks"""
+        tg = makeGenerator(self.processPath)
+        sims = [Simulation(0, 3, 10, None), Simulation(1, 3, 0, None)]
+        results = tg.generateEnsemble(sims)
+        self.assertEqual(len(results), 2)
+        self.assertEqual(len(results[1]), 0)
+        self.assertEqual(results[0].ndim, 2)
+        self.assertEqual(results[0].shape[1], 10)
+
+        tgmodule.PRNG.seed(3, 0)
+        tracks = tg.generateTracks(10)
+        self.assertEqual(tracks.shape[1], results[0].shape[1])
+        self.assertEqual(tracks.dtype, results[0].dtype)
+        self.assertEqual(type(tracks[0, 1]), type(results[0][0, 1]))
+        self.assertEqual(len(tg.generateEnsemble([])), 0)
+
+
+class TestSimulateBlocks(unittest.TestCase):
+
+    def setUp(self):
+        self.processPath = tempfile.mkdtemp()
+        self.tg = makeGenerator(self.processPath)
+
+    def tearDown(self):
+        shutil.rmtree(self.processPath)
+
+    def simulate(self, ensemble, nProcesses):
+        """Generate the track files and return their contents"""
+        trackPath = tempfile.mkdtemp(dir=self.processPath)
+        sims = [Simulation(i, 7, n, 'tracks.%05i.csv' % i)
+                for i, n in enumerate([5, 3, 0, 8, 4, 6])]
+        if ensemble:
+            blocks = [sims[:4], sims[4:]]
+        else:
+            blocks = [[sim] for sim in sims]
+        calls = []
+        simulateBlocks(self.tg, blocks, trackPath, ensemble,
+                       nProcesses=nProcesses,
+                       callback=lambda i, n: calls.append((i, n)))
+        flushWriter()
+        files = {}
+        for sim in sims:
+            with open(os.path.join(trackPath, sim.outfile), 'rb') as fp:
+                files[sim.outfile] = fp.read()
+        return files, calls
+
+    def testProcesses(self):
+        """Test the track files do not depend on the number of processes"""
+        for ensemble in [False, True]:
+            serial, calls = self.simulate(ensemble, 1)
+            self.assertTrue(len(serial['tracks.00003.csv']) > 1000)
+            pool, calls = self.simulate(ensemble, 3)
+            self.assertEqual(serial, pool)
+            nblocks = 2 if ensemble else 6
+            self.assertEqual(calls, [(i + 1, nblocks)
+                                     for i in range(nblocks)])
+
+    def testWindfieldTracks(self):
+        """Test the tracks passed to the wind fields match the track files"""
+        trackPath = tempfile.mkdtemp(dir=self.processPath)
+        sims = [Simulation(i, 11, n, 'tracks.%05i.csv' % i)
+                for i, n in enumerate([4, 0, 7])]
+        received = []
+        windfield = lambda tracks, trackFile, weights: \
+            received.append(wind.loadTracksFromArray(tracks, trackFile,
+                                                     weights))
+        x, y = self.tg.originSampler.x, self.tg.originSampler.y
+        self.tg.originSampler.setImportance(np.outer(y < -15., x > 110.),
+                                            0.5)
+        simulateBlocks(self.tg, [sims], trackPath, ensemble=True,
+                       windfield=windfield)
+        flushWriter()
+
+        # The track files are rounded to the precision of the file format:
+        atol = {'TimeElapsed': 5e-4, 'Longitude': 5e-4, 'Latitude': 5e-4,
+                'Speed': 0.005 / 3.6, 'Bearing': np.radians(0.005),
+                'CentralPressure': 0.5, 'EnvPressure': 0.5, 'rMax': 0.005}
+
+        self.assertEqual(len(received), len(sims))
+        for sim, fused in zip(sims, received):
+            saved = wind.loadTracks(os.path.join(trackPath, sim.outfile))
+            # As for the track files, an empty simulation gives a single
+            # empty track:
+            self.assertEqual(len(fused), len(saved))
+            self.assertEqual(len(fused[0].data) == 0, sim.ntracks == 0)
+            for track, other in zip(fused, saved):
+                self.assertEqual(track.trackId, other.trackId)
+                self.assertEqual(track.trackfile, other.trackfile)
+                self.assertAlmostEqual(track.weight, other.weight)
+                self.assertEqual(track.data.dtype, other.data.dtype)
+                assert_equal(track.CycloneNumber, other.CycloneNumber)
+                self.assertEqual(list(track.Datetime), list(other.Datetime))
+                for name, tol in atol.items():
+                    diff = track.data[name] - other.data[name]
+                    if name == 'Bearing':
+                        diff = np.mod(diff + np.pi, 2. * np.pi) - np.pi
+                    self.assertTrue(np.all(np.abs(diff) <= tol * 1.001),
+                                    name)
+
+    def testWriteError(self):
+        """Test errors writing the tracks in a worker are raised"""
+        trackPath = os.path.join(self.processPath, 'missing')
+        blocks = [[Simulation(i, 7, 3, 'tracks.%05i.csv' % i)]
+                  for i in range(4)]
+        self.assertRaises(IOError, simulateBlocks, self.tg, blocks,
+                          trackPath, nProcesses=2)
+
 if __name__ == "__main__":
-    suite = unittest.makeSuite(TestTrackGenerator, 'test')
-    unittest.TextTestRunner().run(suite)
+    unittest.main()
@@ -0,0 +1,70 @@
+"""
+Testing the binned kernel density estimators
+"""
+
+import unittest
+import numpy as np
+from numpy.testing import assert_almost_equal
+
+from Utilities import binnedKDE
+
+
+def directUPDF(data, grid, bw, kdeType):
+    """Sum the kernels at every grid point"""
+    kernel, const, support = binnedKDE.UKERNELS[kdeType]
+    u = (grid[:, np.newaxis] - data[np.newaxis, :]) / bw
+    return kernel(u).sum(axis=1) * const / data.size / bw
+
+def directMPDF(data, x, y, bw, kdeType):
+    """Sum the kernels at every grid point"""
+    kernel, const, support = binnedKDE.MKERNELS[kdeType]
+    gx, gy = np.meshgrid(x, y)
+    u2 = ((gx[:, :, np.newaxis] - data[:, 0])**2 +
+          (gy[:, :, np.newaxis] - data[:, 1])**2) / bw**2
+    return kernel(u2).sum(axis=2) * const / data.shape[0] / bw**2
+
+
+class TestBinnedKDE(unittest.TestCase):
+
+    def setUp(self):
+        prng = np.random.RandomState(1234)
+        self.data = prng.gamma(3., 4., 2000)
+        self.lonLat = np.column_stack([prng.normal(150., 5., 500),
+                                       prng.normal(-15., 3., 500)])
+
+    def testUPDF(self):
+        """Test univariate binned estimates match the direct estimates"""
+        grid = np.arange(self.data.min(), self.data.max(), 0.1)
+        bw = 1.5
+        for kdeType in binnedKDE.UKERNELS:
+            pdf = directUPDF(self.data, grid, bw, kdeType)
+            result = binnedKDE.UPDF(self.data, grid, bw, kdeType)
+            self.assertEqual(result.shape, grid.shape)
+            self.assertTrue(abs(result - pdf).max() < 2e-3 * pdf.max())
+
+    def testMPDF(self):
+        """Test bivariate binned estimates match the direct estimates"""
+        x = np.arange(135., 165., 0.25)
+        y = np.arange(0., -30., -0.25)
+        bw = 1.5
+        for kdeType, tol in [('Gaussian', 5e-4), ('Epanechnikov', 2e-2)]:
+            pdf = directMPDF(self.lonLat, x, y, bw, kdeType)
+            result = binnedKDE.MPDF(self.lonLat, x, y, bw, kdeType)
+            self.assertEqual(result.shape, (len(y), len(x)))
+            self.assertTrue(abs(result - pdf).max() < tol * pdf.max())
+
+    def testNormalised(self):
+        """Test the binned estimate integrates to one"""
+        grid = np.arange(-20., 80., 0.1)
+        pdf = binnedKDE.UPDF(self.data, grid, 1.5, 'Epanechnikov')
+        assert_almost_equal(pdf.sum() * 0.1, 1.0, decimal=4)
+
+    def testIrregularGrid(self):
+        """Test an irregular grid is rejected"""
+        grid = np.array([0., 1., 3., 4.])
+        self.assertFalse(binnedKDE.isRegular(grid))
+        self.assertRaises(ValueError, binnedKDE.UPDF, self.data, grid, 1.,
+                          'Gaussian')
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+"""
+Testing the circular kernel density estimator
+"""
+
+import unittest
+import numpy as np
+from math import pi
+from numpy.testing import assert_almost_equal
+
+from StatInterface import circularKDE
+
+
+def directPDF(data, grid, bw):
+    """Sum the kernels (each normalised over the grid) at every point"""
+    kH = np.exp(bw*np.cos(grid[np.newaxis, :] - data[:, np.newaxis]))
+    return (kH/kH.sum(axis=1)[:, np.newaxis]).sum(axis=0)
+
+
+class TestCircularKDE(unittest.TestCase):
+
+    def setUp(self):
+        prng = np.random.RandomState(1234)
+        self.data = np.mod(prng.vonmises(1., 2., 1000), 2*pi)
+
+    def testPeriodicPDF(self):
+        """Test the FFT estimate matches the direct estimate"""
+        for kdeStep, bw in [(pi/16., 0.5), (pi/16., 5.), (pi/90., 50.)]:
+            grid = np.arange(0, 2*pi + kdeStep, kdeStep)
+            pdf = directPDF(self.data, grid, bw)
+            result = circularKDE._periodicPDF(self.data, bw, grid, kdeStep)
+            assert_almost_equal(result/pdf.max(), pdf/pdf.max(), decimal=4)
+
+    def testNonPeriodicGrid(self):
+        """Test a grid that does not divide the circle is not binned"""
+        grid = np.arange(0, 2*pi + 0.2, 0.2)
+        self.assertTrue(circularKDE._periodicPDF(self.data, 1., grid,
+                                                 0.2) is None)
+
+    def testCDF(self):
+        """Test the CDF is non-decreasing and ends at one"""
+        grid, pdf, cy = circularKDE.circularKDE(self.data)
+        self.assertEqual(grid.shape, pdf.shape)
+        self.assertTrue(np.all(np.diff(cy) >= 0))
+        self.assertAlmostEqual(cy[-1], 1.0)
+
+if __name__ == "__main__":
+    unittest.main()
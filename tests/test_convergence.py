@@ -0,0 +1,103 @@
+"""
+Testing the convergence monitor for return period wind speeds
+"""
+
+import unittest
+import numpy as np
+
+from numpy.testing import assert_almost_equal, assert_allclose
+from hazard import calculate
+from hazard.convergence import ConvergenceMonitor, relativeChange
+
+
+class SyntheticMonitor(ConvergenceMonitor):
+    """Monitor that draws wind speeds instead of reading files"""
+
+    def loadPoints(self, filename):
+        return self.rng.gumbel(30., 5., size=len(self.j)).astype('f')
+
+    def loadWeights(self, files):
+        return None
+
+
+class WeightedMonitor(ConvergenceMonitor):
+    """Monitor that draws three weighted events for each simulation"""
+
+    def loadPoints(self, filename):
+        vmax = self.rng.gumbel(30., 5., size=(3, len(self.j)))
+        vmax[self.rng.uniform(size=vmax.shape) < 0.5] = 0.
+        return vmax.astype('f')
+
+    def loadWeights(self, files):
+        return self.weight * np.ones(3 * len(files))
+
+
+class TestConvergence(unittest.TestCase):
+
+    def setUp(self):
+        self.lon = np.arange(110., 120., 1.)
+        self.lat = np.arange(-20., -12., 1.)
+        self.years = np.array([10., 50.])
+
+    def testRelativeChange(self):
+        """Test relative change excludes missing values"""
+        old = np.array([[10., 20., -9999., 0.],
+                        [20., 40., 30., 30.]])
+        new = np.array([[11., 18., 10., 5.],
+                        [20., 40., -9999., 33.]])
+        change = relativeChange(old, new)
+        assert_almost_equal(change, [0.1, (0. + 0. + 0.1) / 3.])
+
+        change = relativeChange(old[:, 2:3], new[:, 2:3])
+        self.assertTrue(np.isnan(change).all())
+
+    def testSamplePoints(self):
+        """Test grid points are sampled without replacement"""
+        cm = ConvergenceMonitor(self.lon, self.lat, self.years, 20, 50, 1)
+        cells = set(zip(cm.j, cm.i))
+        self.assertEqual(len(cells), 20)
+        cm = ConvergenceMonitor(self.lon, self.lat, self.years, 500, 50, 1)
+        self.assertEqual(len(cm.j), len(self.lon) * len(self.lat))
+
+    def testConverged(self):
+        """Test convergence is reached as batches are added"""
+        cm = SyntheticMonitor(self.lon, self.lat, self.years, 20, 50, 1,
+                              method='empirical')
+        cm.rng = np.random.RandomState(0)
+
+        change = cm.update(range(500))
+        self.assertTrue(np.isnan(change).all())
+        self.assertFalse(cm.converged(0.01))
+
+        for n in range(5):
+            cm.update(range(500))
+        self.assertEqual(cm.numSims[-1], 3000)
+        self.assertTrue(cm.converged(0.01))
+        self.assertFalse(cm.converged(0.001))
+
+    def testWeighted(self):
+        """Test the weights of the events are used"""
+        levels = []
+        for weight in [1., 0.5]:
+            cm = WeightedMonitor(self.lon, self.lat, self.years, 20, 50, 1,
+                                 method='empirical')
+            cm.rng = np.random.RandomState(0)
+            cm.weight = weight
+            cm.update(range(100))
+            cm.update(range(100, 300))
+            self.assertEqual(cm.numSims, [100, 300])
+            self.assertEqual(len(cm.weights), len(cm.records))
+
+            Rp = calculate(cm.records[:, np.newaxis, :], self.years,
+                           -9999., 50, 1, weights=cm.weights, nsims=300)[0]
+            assert_allclose(cm.returnLevels[-1], Rp[:, 0, :])
+            levels.append(Rp)
+
+        # Down-weighting the events lowers the return period values:
+        self.assertTrue(np.all(levels[1] < levels[0]))
+
+        cm.loadWeights = lambda files: None
+        self.assertRaises(ValueError, cm.update, range(10))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -6,7 +6,8 @@ import unittest
 import numpy as np
 
 from numpy.testing import assert_almost_equal
-from hazard.evd import estimateEVD
+from hazard.evd import estimateEVD, estimateEmpirical, estimateGPD, \
+    estimateWeightedEvents
 
 
 class TestEvd(unittest.TestCase):
@@ -45,6 +46,91 @@ class TestEvd(unittest.TestCase):
         assert_almost_equal(scale2, self.missingValue, decimal=5)
         assert_almost_equal(shp2, self.missingValue, decimal=5)
 
+    def testEmpirical(self):
+        """Testing empirical return period values"""
+        v = np.arange(1., 101.)
+        np.random.shuffle(v)
+        w, loc, scale, shp = estimateEmpirical(v, [10., 50., 200.],
+                                               missingValue=-9999,
+                                               minRecords=50,
+                                               yrspersim=1)
+
+        assert_almost_equal(w, [90.9, 98.98, -9999.], decimal=5)
+        assert_almost_equal(loc, self.missingValue, decimal=5)
+
+        # All grid points of a 3-d array are evaluated at once:
+        V = np.dstack([v, v[::-1]]).reshape((100, 1, 2))
+        w3, loc3, scale3, shp3 = estimateEmpirical(V, [10., 50., 200.],
+                                                   minRecords=50)
+        self.assertEqual(w3.shape, (3, 1, 2))
+        assert_almost_equal(w3[:, 0, 0], w, decimal=5)
+        assert_almost_equal(w3[:, 0, 1], w, decimal=5)
+
+    def testWeightedEvents(self):
+        """Testing return period values from weighted events"""
+        v = np.arange(1., 101.)
+        np.random.shuffle(v)
+        years = np.array([10., 50.])
+        rate = -np.log(1. - 1. / years)
+
+        # The k-th largest of 100 events in 100 years is exceeded at a
+        # rate of k / 100 events per year:
+        w, loc, scale, shp = estimateWeightedEvents(v, [1., 10., 50., 200.],
+                                                    minRecords=50,
+                                                    weights=np.ones(100))
+        assert_almost_equal(w[1:3], 101. - 100. * rate, decimal=5)
+        assert_almost_equal(w[[0, 3]], self.missingValue, decimal=5)
+        assert_almost_equal(loc, self.missingValue, decimal=5)
+
+        # Drawing the same events from fewer simulations doubles the
+        # rate:
+        w1, loc1, scale1, shp1 = estimateWeightedEvents(v, years,
+                                                        minRecords=50,
+                                                        nsims=50)
+        assert_almost_equal(w1, 101. - 50. * rate, decimal=5)
+
+        # Down-weighting the largest half of the events lengthens
+        # their return periods:
+        weights = np.where(v > 50., 0.5, 1.5)
+        w2, loc2, scale2, shp2 = estimateWeightedEvents(v, years,
+                                                        minRecords=50,
+                                                        weights=weights)
+        assert_almost_equal(w2, 101. - 200. * rate, decimal=5)
+
+        # The weights can be given for each value of a 3-d array:
+        V = np.dstack([v, v[::-1]]).reshape((100, 1, 2))
+        W = np.dstack([weights, weights[::-1]]).reshape((100, 1, 2))
+        w3, loc3, scale3, shp3 = estimateWeightedEvents(V, years,
+                                                        minRecords=50,
+                                                        weights=W)
+        self.assertEqual(w3.shape, (2, 1, 2))
+        assert_almost_equal(w3[:, 0, 0], w2, decimal=5)
+        assert_almost_equal(w3[:, 0, 1], w2, decimal=5)
+
+    def testGPD(self):
+        """Testing peaks-over-threshold GPD fit"""
+        v = np.arange(1., 101.)
+        np.random.shuffle(v)
+
+        # Exceedances of the 90th percentile are 1, 2, ..., 10, which
+        # gives a shape parameter of 1 and a scale parameter of 11.
+        w, loc, scale, shp = estimateGPD(v, [5., 20., 100.],
+                                         missingValue=-9999,
+                                         minRecords=50,
+                                         yrspersim=1,
+                                         threshold=90.)
+
+        assert_almost_equal(w, [-9999., 95.5, 99.9], decimal=5)
+        assert_almost_equal(loc, 90., decimal=5)
+        assert_almost_equal(scale, 11., decimal=5)
+        assert_almost_equal(shp, 1., decimal=5)
+
+        w2, loc2, scale2, shp2 = estimateGPD(v, [5., 20., 100.],
+                                             missingValue=-9999,
+                                             minRecords=200)
+        assert_almost_equal(w2, np.ones(3) * self.missingValue, decimal=5)
+        assert_almost_equal(loc2, self.missingValue, decimal=5)
+
 if __name__ == "__main__":
     suite = unittest.makeSuite(TestEvd, 'test')
     unittest.TextTestRunner().run(suite)
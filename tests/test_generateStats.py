@@ -97,5 +97,72 @@ class TestGenerateStats(NumpyTestCase.NumpyTestCase):
         self.numpyAssertAlmostEqual(wP.coeffs.phi, wP.coeffs.lphi)
         self.numpyAssertAlmostEqual(wP.coeffs.min, wP.coeffs.lmin)
 
+
+class TestCalculateGrouped(NumpyTestCase.NumpyTestCase):
+
+    # The domain is not a whole number of cells high, so the bottom row
+    # of cells extends below yMin:
+    gridLimit = {'xMin': 150.0, 'xMax': 160.0, 'yMin': -21.5, 'yMax': -10.0}
+    gridSpace = {'x': 2.0, 'y': 2.0}
+    gridInc = {'x': 1.0, 'y': 1.0}
+    minSample = 20
+
+    def setUp(self):
+        prng = numpy.random.RandomState(1234)
+        n = 4000
+        lon = prng.uniform(149, 161, n)
+        lat = prng.uniform(-23, -9, n)
+
+        # Put some of the observations on the edges of the cells:
+        edge = prng.uniform(size=n) < 0.2
+        lon[edge] = 150 + 2*prng.randint(0, 6, edge.sum())
+        edge = prng.uniform(size=n) < 0.2
+        lat[edge] = -10 - 2*prng.randint(0, 7, edge.sum())
+
+        # Fewer observations over land, so some land cells are expanded:
+        lsflag = (prng.uniform(size=n) < 0.25).astype(float)
+        self.lonLat = numpy.column_stack((lon, lat, lsflag))
+        self.missing = prng.uniform(size=n) < 0.05
+        self.prng = prng
+
+    def calculator(self, param, angular):
+        param = numpy.where(self.missing, sys.maxint, param)
+        gs = generateStats.GenerateStats(None, None, self.gridLimit,
+                                         self.gridSpace, self.gridInc,
+                                         self.minSample, angular,
+                                         calculateLater=True)
+        gs.lonLat = self.lonLat
+        gs.param = param
+        return gs
+
+    def compare(self, gs):
+        """Compare the grouped statistics with those of each cell"""
+        for onLand in [False, True]:
+            values, done = gs.calculateGrouped(onLand)
+            self.assertTrue(done.any())
+            if onLand:
+                self.assertFalse(done.all())
+            for cell in numpy.flatnonzero(done):
+                expected = gs.calculate(cell, onLand)
+                for k, (value, other) in enumerate(zip(values, expected)):
+                    if gs.angular and k == 0:
+                        diff = numpy.mod(value[cell] - other + numpy.pi,
+                                         2*numpy.pi) - numpy.pi
+                        self.assertAlmostEqual(diff, 0.)
+                    else:
+                        self.assertAlmostEqual(value[cell], other)
+
+    def test_calculateGrouped(self):
+        """Testing calculateGrouped matches calculate for each cell"""
+        steps = self.prng.normal(0, 1, len(self.lonLat))
+        gs = self.calculator(20 + numpy.cumsum(steps)/10., False)
+        self.compare(gs)
+
+    def test_calculateGroupedAngular(self):
+        """Testing calculateGrouped matches calculate for angles"""
+        param = numpy.degrees(self.prng.vonmises(0., 2., len(self.lonLat)))
+        gs = self.calculator(numpy.mod(param, 360.), True)
+        self.compare(gs)
+
 if __name__ == "__main__":
     unittest.main()
@@ -93,5 +93,62 @@ class TestGrid(NumpyTestCase.NumpyTestCase):
         value = self.ncgridobj.sampleGrid(self.ilon,self.ilat)
         self.assertAlmostEqual(pvalue,value)
 
+
+class TestLandMask(unittest.TestCase):
+    """Test the land mask gives the same points as SampleGrid"""
+
+    def setUp(self):
+        import tempfile
+        from Utilities import nctools
+        self.lon = numpy.arange(110., 130.01, 0.1)
+        self.lat = numpy.arange(-30., -10.01, 0.1)
+        rng = numpy.random.RandomState(1)
+        mask = rng.random_sample((len(self.lat), len(self.lon))) > 0.5
+        # Land to the east of 125E only:
+        mask[:, self.lon < 125.] = False
+        mask[:, self.lon > 126.] = True
+
+        dimensions = {
+            0: {'name': 'lat', 'values': self.lat,
+                'dtype': 'f8', 'atts': {}},
+            1: {'name': 'lon', 'values': self.lon,
+                'dtype': 'f8', 'atts': {}}
+        }
+        variables = {
+            0: {'name': 'landmask', 'dims': ('lat', 'lon'),
+                'values': mask.astype('f'), 'dtype': 'f', 'atts': {}}
+        }
+        fd, self.filename = tempfile.mkstemp(suffix='.nc')
+        os.close(fd)
+        nctools.ncSaveGrid(self.filename, dimensions, variables,
+                           nodata=-9999., gatts={})
+        self.sample = grid.SampleGrid(self.filename)
+        self.mask = grid.LandMask(self.filename)
+
+    def tearDown(self):
+        os.unlink(self.filename)
+
+    def test_onLand(self):
+        """Test LandMask.onLand matches SampleGrid for many points"""
+        rng = numpy.random.RandomState(2)
+        lon = rng.uniform(110., 129.9, 1000)
+        lat = rng.uniform(-30., -10.2, 1000)
+        # Include points on the grid lines:
+        lon[:100] = self.lon[rng.randint(0, len(self.lon), 100)]
+        lat[:100] = self.lat[rng.randint(0, len(self.lat), 100)]
+
+        expected = [self.sample.sampleGrid(x, y) > 0.
+                    for x, y in zip(lon, lat)]
+        self.assertEqual(list(self.mask.onLand(lon, lat)), expected)
+        self.assertEqual([self.mask.onLand(x, y) for x, y in zip(lon, lat)],
+                         expected)
+        self.assertEqual(self.mask.packed.dtype, numpy.uint8)
+
+    def test_distanceToCoast(self):
+        """Test distance to the coast is measured to the nearest land"""
+        dist = self.mask.distanceToCoast([120., 126.5], [-20., -20.])
+        self.assertTrue(dist[0] > 400. and dist[0] < 600.)
+        self.assertTrue(dist[1] < 60.)
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,304 @@
+"""
+Testing the conversion of additional hazard variables
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from os.path import join as pjoin
+
+from numpy.testing import assert_almost_equal, assert_equal, assert_allclose, \
+    assert_array_equal
+import hazard
+from hazard import (pressureDeficit, deficitToPressure, directionSector,
+                    SLP_REFERENCE)
+from Utilities import nctools
+from Utilities.config import ConfigParser
+from StatInterface.SamplingOrigin import SamplingOrigin
+
+
+class TestHazardVariables(unittest.TestCase):
+
+    def testPressureDeficit(self):
+        """Test pressure deficits are positive and reversible"""
+        slp = np.array([100000., 95000., 0., -9999.])
+        Pd = pressureDeficit(slp)
+        assert_almost_equal(Pd, [SLP_REFERENCE - 100000.,
+                                 SLP_REFERENCE - 95000., 0., 0.])
+        P = deficitToPressure(Pd, -9999.)
+        assert_almost_equal(P, [100000., 95000., -9999., -9999.])
+
+    def testDirectionSector(self):
+        """Test direction sectors are assigned clockwise from north"""
+        # Winds from the north, east, south, west and north-west:
+        ua = np.array([0., -1., 0., 1., 1.])
+        va = np.array([-1., 0., 1., 0., -1.])
+        assert_equal(directionSector(ua, va, 4), [0, 1, 2, 3, 0])
+        assert_equal(directionSector(ua, va, 8), [0, 2, 4, 6, 7])
+
+
+class TestHazardCalculator(unittest.TestCase):
+    """Test hazard calculations from a small set of wind field files"""
+
+    def setUp(self):
+        self.outputPath = tempfile.mkdtemp()
+        self.windPath = pjoin(self.outputPath, 'windfield')
+        os.makedirs(self.windPath)
+        os.makedirs(pjoin(self.outputPath, 'hazard'))
+        self.lon = np.arange(150., 152.01, 0.5)
+        self.lat = np.arange(-20., -18.99, 0.5)
+        self.gridLimit = {'xMin': 150., 'xMax': 152.,
+                          'yMin': -20., 'yMax': -19.}
+        self.prng = np.random.RandomState(1234)
+
+        # The configuration is shared, so the original settings are
+        # restored after each test:
+        self.config = ConfigParser()
+        options = {('Output', 'Path'): self.outputPath,
+                   ('Region', 'gridLimit'): repr(self.gridLimit),
+                   ('TrackGenerator', 'NumSimulations'): '40',
+                   ('Hazard', 'MinimumRecords'): '5',
+                   ('Hazard', 'CalculateCI'): 'False',
+                   ('Hazard', 'SampleSize'): '10',
+                   ('Hazard', 'Incremental'): 'False',
+                   ('Hazard', 'MinimumPressure'): 'False',
+                   ('Hazard', 'NumProcesses'): '1'}
+        self.saved = {}
+        for (section, option), value in options.items():
+            if self.config.has_option(section, option):
+                self.saved[(section, option)] = self.config.get(section,
+                                                                option)
+            else:
+                self.saved[(section, option)] = None
+            self.config.set(section, option, value)
+
+    def tearDown(self):
+        for (section, option), value in self.saved.items():
+            if value is None:
+                self.config.remove_option(section, option)
+            else:
+                self.config.set(section, option, value)
+        shutil.rmtree(self.outputPath)
+
+    def writeFile(self, n):
+        """Write a random wind field file"""
+        shape = (len(self.lat), len(self.lon))
+        vmax = self.prng.gamma(4., 5., shape)
+        vmax[self.prng.uniform(size=shape) < 0.2] = 0.
+        slp = SLP_REFERENCE - 1000. * vmax
+        dimensions = {
+            0: {'name': 'lat', 'values': self.lat, 'dtype': 'f',
+                'atts': {'units': 'degrees_north'}},
+            1: {'name': 'lon', 'values': self.lon, 'dtype': 'd',
+                'atts': {'units': 'degrees_east'}}
+        }
+        variables = {
+            0: {'name': 'vmax', 'dims': ('lat', 'lon'), 'values': vmax,
+                'dtype': 'f', 'atts': {'units': 'm/s'}},
+            1: {'name': 'slp', 'dims': ('lat', 'lon'), 'values': slp,
+                'dtype': 'f', 'atts': {'units': 'Pa'}}
+        }
+        filename = pjoin(self.windPath, 'gust.%03d.nc' % n)
+        nctools.ncSaveGrid(filename, dimensions, variables)
+        return filename
+
+    def writeEvents(self, n, weights):
+        """Write a wind field file with the maxima of weighted events"""
+        shape = (len(weights), len(self.lat), len(self.lon))
+        vmax = self.prng.gamma(4., 5., shape)
+        vmax[self.prng.uniform(size=shape) < 0.5] = 0.
+        dimensions = {
+            0: {'name': 'lat', 'values': self.lat, 'dtype': 'f',
+                'atts': {'units': 'degrees_north'}},
+            1: {'name': 'lon', 'values': self.lon, 'dtype': 'd',
+                'atts': {'units': 'degrees_east'}},
+            2: {'name': 'event', 'values': np.arange(len(weights)),
+                'dtype': 'i', 'atts': {}}
+        }
+        variables = {
+            0: {'name': 'vmax', 'dims': ('lat', 'lon'),
+                'values': vmax.max(axis=0), 'dtype': 'f',
+                'atts': {'units': 'm/s'}},
+            1: {'name': 'event_vmax', 'dims': ('event', 'lat', 'lon'),
+                'values': vmax, 'dtype': 'f', 'atts': {'units': 'm/s'}},
+            2: {'name': 'event_slp', 'dims': ('event', 'lat', 'lon'),
+                'values': SLP_REFERENCE - 1000. * vmax, 'dtype': 'f',
+                'atts': {'units': 'Pa'}},
+            3: {'name': 'event_weight', 'dims': ('event',),
+                'values': np.asarray(weights), 'dtype': 'f8', 'atts': {}}
+        }
+        filename = pjoin(self.windPath, 'gust.%03d.nc' % n)
+        nctools.ncSaveGrid(filename, dimensions, variables)
+        return vmax
+
+    def runHazard(self, **options):
+        """Run the hazard calculation and return the output variables"""
+        for option, value in options.items():
+            self.config.set('Hazard', option, value)
+        hazard.run(None)
+        ncobj = nctools.ncLoadFile(pjoin(self.outputPath, 'hazard',
+                                         'hazard.nc'))
+        data = dict((name, np.array(var[:]))
+                    for name, var in ncobj.variables.items())
+        ncobj.close()
+        return data
+
+    def testIncremental(self):
+        """Test incremental updates match the full calculation"""
+        for n in range(25):
+            self.writeFile(n)
+        self.runHazard(Incremental='True')
+        for n in range(25, 40):
+            self.writeFile(n)
+        incremental = self.runHazard(Incremental='True')
+
+        os.remove(pjoin(self.outputPath, 'hazard', 'state.nc'))
+        full = self.runHazard(Incremental='False')
+        assert_allclose(incremental['wspd'], full['wspd'], rtol=1e-5)
+        assert_allclose(incremental['loc'], full['loc'], rtol=1e-5)
+
+    def testStaleState(self):
+        """Test the state is not used if processed files have changed"""
+        for n in range(25):
+            self.writeFile(n)
+        self.runHazard(Incremental='True')
+
+        # Regenerate a processed file under the same name:
+        filename = self.writeFile(3)
+        mtime = os.path.getmtime(filename) + 10.
+        os.utime(filename, (mtime, mtime))
+
+        tilegrid = hazard.TileGrid(self.gridLimit, self.lon, self.lat)
+        stateFile = pjoin(self.outputPath, 'hazard', 'state.nc')
+        self.assertEqual(hazard.loadStateFileList(stateFile, tilegrid,
+                                                  self.windPath), [])
+
+        incremental = self.runHazard(Incremental='True')
+        os.remove(stateFile)
+        full = self.runHazard(Incremental='False')
+        assert_allclose(incremental['wspd'], full['wspd'], rtol=1e-5)
+
+    def testProcesses(self):
+        """Test the hazard does not depend on the number of processes"""
+        # A wider grid, so the domain is split into several tiles:
+        self.lon = np.arange(150., 154.99, 0.02)
+        self.gridLimit['xMax'] = 155.
+        self.config.set('Region', 'gridLimit', repr(self.gridLimit))
+        tilegrid = hazard.TileGrid(self.gridLimit, self.lon, self.lat)
+        self.assertTrue(len(hazard.getTiles(tilegrid)) > 2)
+
+        for n in range(40):
+            self.writeFile(n)
+        options = {'CalculateCI': 'True', 'MinimumPressure': 'True'}
+        serial = self.runHazard(NumProcesses='1', **options)
+        pool = self.runHazard(NumProcesses='2', **options)
+        self.assertEqual(sorted(serial.keys()), sorted(pool.keys()))
+        self.assertTrue('wspdupper' in serial)
+        for name in serial:
+            assert_array_equal(serial[name], pool[name])
+
+    def testMinimumPressure(self):
+        """Test minimum pressure hazard without confidence intervals"""
+        for n in range(20):
+            self.writeFile(n)
+        data = self.runHazard(MinimumPressure='True', CalculateCI='False')
+        self.assertTrue('slp' in data)
+        self.assertFalse('slpupper' in data)
+        self.assertFalse('slplower' in data)
+        valid = data['slp'] != -9999.
+        self.assertTrue(valid.any())
+        self.assertTrue(np.all(data['slp'][valid] < SLP_REFERENCE))
+
+        data = self.runHazard(MinimumPressure='True', CalculateCI='True')
+        self.assertTrue('slpupper' in data)
+        self.assertTrue('slplower' in data)
+
+    def testWeightedEvents(self):
+        """Test the hazard of weighted events is calculated per event"""
+        events, weights = [], []
+        for n in range(30):
+            w = self.prng.uniform(0.2, 2., 1 + n % 4)
+            events.append(self.writeEvents(n, w))
+            weights.append(w)
+        events = np.concatenate(events)
+        weights = np.concatenate(weights)
+        assert_allclose(hazard.getFileWeights(hazard.getFileList(
+            self.windPath)), weights)
+
+        data = self.runHazard(Method='GEV', MinimumPressure='True',
+                              CalculateCI='True')
+        Rp = hazard.calculate(events, data['years'], -9999., 5, 1,
+                              weights=weights, nsims=30)[0]
+        assert_allclose(data['wspd'], Rp, rtol=1e-5)
+        self.assertTrue((data['wspd'] > 0.).any())
+        for name in ['slp', 'wspdupper', 'wspdlower']:
+            self.assertTrue(name in data)
+
+        # The events of every file are needed:
+        self.writeFile(30)
+        self.assertRaises(ValueError, hazard.getFileWeights,
+                          hazard.getFileList(self.windPath))
+
+
+class TestImportanceSampling(unittest.TestCase):
+    """
+    Test importance sampling the genesis points reduces the variance of
+    the return period wind speeds at a site, with a simple model of the
+    events: only tracks from genesis points east of 115E affect the
+    site.
+    """
+
+    def setUp(self):
+        self.x = np.arange(100., 120.01, 0.5)
+        self.y = np.arange(-25., -4.99, 0.5)
+        self.pdf = np.ones((len(self.y), len(self.x)))
+        self.affects = self.x > 115.
+        self.years = np.array([10., 50.])
+        self.nsims = 200
+        self.rate = 10.
+
+    def simulate(self, sampler, prng):
+        """
+        Generate the events of `nsims` one-year simulations, and return
+        the return period wind speeds of the weighted events (or of the
+        annual maxima if the sampling is not biased).
+        """
+        ntracks = prng.poisson(self.rate, self.nsims)
+        owner = np.repeat(np.arange(self.nsims), ntracks)
+        lon, lat = sampler.ppf(prng.uniform(size=len(owner)),
+                               prng.uniform(size=len(owner)))
+        hit = self.affects[self.x.searchsorted(lon)]
+        vmax = np.where(hit, prng.gamma(4., 5., len(owner)), 0.)
+
+        if sampler.ratio is None:
+            annual = np.zeros(self.nsims)
+            np.maximum.at(annual, owner, vmax)
+            return hazard.calculate(annual.reshape((-1, 1, 1)), self.years,
+                                    -9999., 5, 1, 'empirical')[0][:, 0, 0]
+
+        weights = sampler.weights(lon, lat)
+        return hazard.calculate(vmax.reshape((-1, 1, 1)), self.years,
+                                -9999., 5, 1, weights=weights,
+                                nsims=self.nsims)[0][:, 0, 0]
+
+    def testVariance(self):
+        """Test importance sampling reduces the variance"""
+        plain = SamplingOrigin(self.pdf, self.x, self.y)
+        biased = SamplingOrigin(self.pdf.copy(), self.x, self.y)
+        biased.setImportance(self.affects * np.ones((len(self.y), 1)), 0.75)
+        self.assertTrue(np.all(biased.ratio <= 4.))
+
+        prng = np.random.RandomState(42)
+        Rp = np.array([self.simulate(plain, prng) for n in range(40)])
+        Rpw = np.array([self.simulate(biased, prng) for n in range(40)])
+
+        # The estimates agree, but the weighted events vary less:
+        sd, sdw = Rp.std(axis=0), Rpw.std(axis=0)
+        assert_allclose(Rpw.mean(axis=0), Rp.mean(axis=0),
+                        atol=2. * sd.max() / np.sqrt(40))
+        self.assertTrue(np.all(sdw < 0.7 * sd))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+"""
+Testing extraction of return period curves from a hazard file
+"""
+
+import os
+import unittest
+import tempfile
+import numpy as np
+
+from numpy.testing import assert_almost_equal, assert_equal
+from hazard.query import HazardQuery, nearestIndex
+from Utilities import nctools
+
+
+class TestHazardQuery(unittest.TestCase):
+
+    def setUp(self):
+        self.years = np.array([10., 50., 100.])
+        self.lon = np.arange(120., 130., 0.5)
+        self.lat = np.arange(-20., -10., 0.5)
+        ny, nx = len(self.lat), len(self.lon)
+        self.wspd = np.arange(3 * ny * nx, dtype='f').reshape((3, ny, nx))
+        self.wspd[:, 0, 0] = -9999.
+
+        dimensions = {
+            0: {'name': 'years', 'values': self.years,
+                'dtype': 'f', 'atts': {}},
+            1: {'name': 'lat', 'values': self.lat,
+                'dtype': 'f', 'atts': {}},
+            2: {'name': 'lon', 'values': self.lon,
+                'dtype': 'd', 'atts': {}}
+        }
+        variables = {
+            0: {'name': 'wspd', 'dims': ('years', 'lat', 'lon'),
+                'chunksizes': (3, 4, 4), 'values': self.wspd,
+                'dtype': 'f', 'atts': {}},
+            1: {'name': 'wspdupper', 'dims': ('years', 'lat', 'lon'),
+                'values': self.wspd + 1., 'dtype': 'f', 'atts': {}},
+            2: {'name': 'wspdlower', 'dims': ('years', 'lat', 'lon'),
+                'values': self.wspd - 1., 'dtype': 'f', 'atts': {}}
+        }
+
+        fd, self.hazardFile = tempfile.mkstemp(suffix='.nc')
+        os.close(fd)
+        nctools.ncSaveGrid(self.hazardFile, dimensions, variables,
+                           nodata=-9999., gatts={})
+
+    def tearDown(self):
+        os.unlink(self.hazardFile)
+
+    def testNearestIndex(self):
+        """Test nearest grid indices are found for many points"""
+        idx = nearestIndex(np.arange(0., 100., 0.5), [15.25, -1., 120.])
+        assert_equal(idx, [30, 0, 199])
+        idx = nearestIndex(np.arange(10., -10., -1.), [3.2, -20., 20.])
+        assert_equal(idx, [7, 19, 0])
+
+    def testCurves(self):
+        """Test return period curves are extracted at each point"""
+        lons = [125.1, 121.0, 125.1, 129.6]
+        lats = [-15.1, -18.0, -12.4, -10.2]
+        hq = HazardQuery(self.hazardFile)
+        years, wspd, upper, lower = hq.curves(lons, lats)
+        hq.close()
+
+        assert_almost_equal(years, self.years)
+        self.assertEqual(wspd.shape, (4, 3))
+        for k, (x, y) in enumerate(zip(lons, lats)):
+            i = np.abs(self.lon - x).argmin()
+            j = np.abs(self.lat - y).argmin()
+            assert_almost_equal(wspd[k], self.wspd[:, j, i])
+            assert_almost_equal(upper[k], self.wspd[:, j, i] + 1.)
+            assert_almost_equal(lower[k], self.wspd[:, j, i] - 1.)
+
+    def testMissingValues(self):
+        """Test missing values are masked"""
+        hq = HazardQuery(self.hazardFile)
+        years, wspd, upper, lower = hq.curves([119., 125.], [-21., -15.])
+        hq.close()
+        self.assertTrue(wspd.mask[0].all())
+        self.assertFalse(wspd.mask[1].any())
+
+if __name__ == "__main__":
+    unittest.main()
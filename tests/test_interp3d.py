@@ -66,6 +66,23 @@ class TestInterp3d(NumpyTestCase.NumpyTestCase):
                           self.coords,
                           self.scale,
                           self.offset)
+
+    def test_interp3d_prefiltered(self):
+        """Test interp3d accepts data already passed through the spline filter"""
+        from scipy.ndimage.interpolation import spline_filter
+        coeffs = spline_filter(self.data.astype(numpy.float64))
+        output = interp3d.interp3d(coeffs, self.coords, self.scale,
+                                   self.offset, prefilter=False)
+        self.numpyAssertAlmostEqual(output.astype(self.values.dtype),
+                                    self.values)
+
+    def test_interp3d_linear(self):
+        """Test trilinear interpolation is bounded by the grid values"""
+        output = interp3d.interp3d(self.data, self.coords, self.scale,
+                                   self.offset, order=1)
+        self.assertEqual(output.shape, self.values.shape)
+        self.assertTrue(numpy.all(output >= self.data.min()))
+        self.assertTrue(numpy.all(output <= self.data.max()))
        
 
 
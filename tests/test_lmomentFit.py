@@ -78,6 +78,46 @@ class Testlmoments(NumpyTestCase.NumpyTestCase):
         params = lmom.pelgev(xmom)
         self.numpyAssertAlmostEqual(params,self.params)
 
+    def test_samlmu2d(self):
+        """Test samlmu2d returns same values as samlmu for each column"""
+        values = numpy.sort(self.values)
+        X = numpy.column_stack([values, values[::-1], 2.*values])
+        moments = lmom.samlmu2d(X,5)
+        for j in range(X.shape[1]):
+            self.numpyAssertAlmostEqual(moments[:,j],
+                                        lmom.samlmu(X[:,j],5))
+
+    def test_samlmu2d_counts(self):
+        """Test samlmu2d uses the last counts values of each column"""
+        values = numpy.sort(self.values)
+        X = numpy.column_stack([values, values])
+        moments = lmom.samlmu2d(X,3,counts=[len(values),20])
+        self.numpyAssertAlmostEqual(moments[:,0],lmom.samlmu(values,3))
+        self.numpyAssertAlmostEqual(moments[:,1],
+                                    lmom.samlmu(values[-20:],3))
+        moments = lmom.samlmu2d(X,3,counts=[0,1])
+        self.assertTrue(numpy.isnan(moments).all())
+
+    def test_pelgev2d(self):
+        """Test pelgev2d returns same parameters as pelgev"""
+        xmom = numpy.array([[50., 50., 50., 50., 50.],
+                            [10., 10., 10., 10., 10.],
+                            [-0.9, -0.5, 0., 0.2, 0.9]])
+        params = lmom.pelgev2d(xmom)
+        for j in range(xmom.shape[1]):
+            self.numpyAssertAlmostEqual(params[:,j],
+                                        lmom.pelgev(xmom[:,j]))
+
+    def test_pelgpa2d(self):
+        """Test pelgpa2d returns same parameters as pelgpa"""
+        xmom = numpy.array([[5., 5., 5., 5.],
+                            [2., 2., 2., 2.],
+                            [-0.5, 0., 0.2, 0.9]])
+        params = lmom.pelgpa2d(xmom)
+        for j in range(xmom.shape[1]):
+            self.numpyAssertAlmostEqual(params[:,j],
+                                        lmom.pelgpa(xmom[:,j]))
+
 if __name__ == "__main__":
     flStartLog('', 'CRITICAL', False)
     testSuite = unittest.makeSuite(Testlmoments,'test')
@@ -155,6 +155,23 @@ class TestMapUtils(NumpyTestCase.NumpyTestCase):
         """Test that find_nearest raises ValueError if second arg is an array"""
         self.assertRaises(ValueError, maputils.find_nearest, self.lon, self.findpts)
 
+    def test_bear2LatLon(self):
+        """Test bear2LatLon returns the same values for arrays and scalars"""
+        bearing = array([0., 90., 180., 270., 45.])
+        distance = array([111.1, 50., 100., 0., 300.])
+        lon = array([130., 130., 120., 100., 150.])
+        lat = array([-10., 0., -20., -30., -40.])
+        nLon, nLat = maputils.bear2LatLon(bearing, distance, lon, lat)
+        for k in range(len(bearing)):
+            x, y = maputils.bear2LatLon(bearing[k], distance[k],
+                                        lon[k], lat[k])
+            self.assertAlmostEqual(nLon[k], x)
+            self.assertAlmostEqual(nLat[k], y)
+        self.assertAlmostEqual(nLon[0], 130.)
+        self.assertAlmostEqual(nLat[0], -10. + 111.1 / 6367. * 180. / pi)
+        self.assertAlmostEqual(nLat[1], 0.)
+        self.assertAlmostEqual(nLon[3], 100.)
+
 #class TestInput(unittest.TestCase):
 #   xx=[1, 3, 5, 9, 11]
 #   yy=[1, 4, 12, 40, 60]
@@ -88,6 +88,14 @@ class Teststatutils(NumpyTestCase.NumpyTestCase):
         for lon, lat in invalidLatLongs:
             self.assertRaises(ValueError, statutils.getCellNum, lon, lat, self.gridLimit, self.gridSpace)
 
+    def test_GetCellNums(self):
+        """Testing getCellNums returns the same values as getCellNum"""
+        lons = array([173, 173, 133, 70, 173.5, 60, 190, 90, 90, 180, 70])
+        lats = array([-39, -30, -30, 0, -0.5, -20, -20, -50, 20, 0, -40])
+        cells = array([174, 152, 144, 0, 20, -1, -1, -1, -1, -1, -1])
+        result = statutils.getCellNums(lons, lats, self.gridLimit, self.gridSpace)
+        self.numpyAssertEqual(result, cells)
+
     def test_GetCellLonLat(self):
         """Testing getCellLonLat"""
         #valid values
@@ -111,7 +119,53 @@ class Teststatutils(NumpyTestCase.NumpyTestCase):
         """Testing maxCellNum"""
         maxCellNum = 175
         self.assertEqual(maxCellNum, statutils.maxCellNum(self.gridLimit, self.gridSpace))
+
+    def test_CellIndex(self):
+        """Testing CellIndex returns the observations in a rectangle"""
+        from numpy.random import RandomState
+        from numpy import where
+        prng = RandomState(1234)
+        lon = prng.uniform(70, 180, 2000)
+        lat = prng.uniform(-40, 0, 2000)
+        mask = prng.uniform(size=2000) > 0.2
+        index = statutils.CellIndex(lon, lat, self.gridLimit,
+                                    self.gridSpace, mask)
+        rectangles = ((70, 75, -40, -35), (100, 110, -20, -5),
+                      (72.5, 101.3, -33.2, -0.5), (70, 180, -40, 0),
+                      (173, 174, -20, -19))
+        for wLon, eLon, sLat, nLat in rectangles:
+            expected = where(mask & (lat >= sLat) & (lat < nLat) &
+                             (lon >= wLon) & (lon < eLon))[0]
+            self.numpyAssertEqual(index.query(wLon, eLon, sLat, nLat),
+                                  expected)
+            self.assertEqual(index.count(wLon, eLon, sLat, nLat),
+                             len(expected))
         
+    def test_CellIndexMisaligned(self):
+        """Testing CellIndex on a grid that is not a whole number of cells"""
+        from numpy.random import RandomState
+        from numpy import where
+        gridLimit = {'xMin': 70, 'xMax': 180, 'yMin': -38, 'yMax': 0}
+        prng = RandomState(1234)
+        lon = prng.uniform(70, 180, 2000)
+        lat = prng.uniform(-40, 0, 2000)
+        index = statutils.CellIndex(lon, lat, gridLimit, self.gridSpace)
+
+        # The bottom row of cells extends below yMin:
+        for cell in range(statutils.maxCellNum(gridLimit,
+                                               self.gridSpace) + 1):
+            wLon, nLat = statutils.getCellLonLat(cell, gridLimit,
+                                                 self.gridSpace)
+            eLon = wLon + self.gridSpace['x']
+            sLat = nLat - self.gridSpace['y']
+            expected = where((lat >= sLat) & (lat < nLat) &
+                             (lon >= wLon) & (lon < eLon))[0]
+            self.numpyAssertEqual(index.query(wLon, eLon, sLat, nLat),
+                                  expected)
+            self.assertEqual(index.count(wLon, eLon, sLat, nLat),
+                             len(expected))
+        self.assertTrue(len(where(lat < -38)[0]) > 0)
+
     def test_GetOccurence(self):
         """Testing getOccurance"""
         occurList = [-10, 20, 30, 40]
@@ -0,0 +1,42 @@
+"""
+Testing the random number streams for each simulation
+"""
+
+import unittest
+import numpy as np
+
+from numpy.testing import assert_almost_equal
+from Utilities.tcrandom import SimulationStream, simulationState
+
+
+class TestSimulationStream(unittest.TestCase):
+
+    def testReproducible(self):
+        """Test a simulation stream does not depend on the block size"""
+        s1 = SimulationStream(10, 3, blocksize=7)
+        s2 = SimulationStream(10, 3)
+        u1 = [s1.uniform(0., 1.) for i in range(20)]
+        u2 = [s2.uniform(0., 1.) for i in range(20)]
+        assert_almost_equal(u1, u2)
+        assert_almost_equal(u1, simulationState(10, 3).random_sample(20))
+
+    def testSeed(self):
+        """Test reseeding restarts the stream of a simulation"""
+        s = SimulationStream(10, 3)
+        v1 = [s.logisticvariate(0., 1.) for i in range(5)]
+        s.seed(10, 4)
+        v2 = [s.logisticvariate(0., 1.) for i in range(5)]
+        s.seed(10, 3)
+        v3 = [s.logisticvariate(0., 1.) for i in range(5)]
+        assert_almost_equal(v1, v3)
+        self.assertFalse(np.allclose(v1, v2))
+
+    def testNormal(self):
+        """Test normal variates are scaled and shifted"""
+        s = SimulationStream(1, 0)
+        v = np.array([s.normalvariate(5., 0.1) for i in range(2000)])
+        self.assertAlmostEqual(v.mean(), 5., 1)
+        self.assertAlmostEqual(v.std(), 0.1, 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,146 @@
+"""
+Testing the netCDF4 track catalogues
+"""
+
+import os
+import time
+import unittest
+import tempfile
+import numpy as np
+from datetime import datetime, timedelta
+
+from numpy.testing import assert_almost_equal, assert_equal
+from Utilities import trackCatalogue
+from Utilities.metutils import convert
+
+
+class TestTrackCatalogue(unittest.TestCase):
+
+    def setUp(self):
+        start = datetime(2000, 1, 1, 6)
+        rows = []
+        for number, length in [(1, 4), (2, 1), (3, 6)]:
+            for i in range(length):
+                rows.append([number, start + timedelta(hours=i), float(i),
+                             120. + 0.5 * i, -15. - 0.2 * i, 20., 180.,
+                             990. - i, 1008., 30.])
+        self.tracks = np.array(rows, dtype=object)
+
+        fd, self.ncfile = tempfile.mkstemp(suffix='.nc')
+        os.close(fd)
+        fd, self.csvfile = tempfile.mkstemp(suffix='.csv')
+        os.close(fd)
+        trackCatalogue.saveTrackCatalogue(self.ncfile, self.tracks, 7)
+
+    def tearDown(self):
+        os.unlink(self.ncfile)
+        os.unlink(self.csvfile)
+
+    def testReadTracks(self):
+        """Test the tracks are split on the cyclone number"""
+        tracks = trackCatalogue.readTracks(self.ncfile)
+        self.assertEqual([len(t) for t in tracks], [4, 1, 6])
+        for n, track in enumerate(tracks):
+            assert_equal(track['CycloneNumber'], n + 1)
+
+        data = np.concatenate(tracks)
+        self.assertEqual(list(data['Datetime']), list(self.tracks[:, 1]))
+        assert_almost_equal(data['Longitude'],
+                            self.tracks[:, 3].astype(float))
+        assert_almost_equal(data['CentralPressure'],
+                            convert(self.tracks[:, 7].astype(float),
+                                    'hPa', 'Pa'))
+
+    def testReadCSV(self):
+        """Test reading a csv track file matches the catalogue"""
+        with open(self.csvfile, 'w') as fp:
+            fp.write('%' + trackCatalogue.TRACKFILE_HEADER)
+            np.savetxt(fp, self.tracks, fmt=trackCatalogue.TRACKFILE_FMT)
+
+        tracks = trackCatalogue.splitTracks(
+            trackCatalogue.readCSV(self.csvfile))
+        expected = trackCatalogue.readTracks(self.ncfile)
+        self.assertEqual([len(t) for t in tracks], [4, 1, 6])
+        for track, other in zip(tracks, expected):
+            self.assertEqual(list(track['Datetime']),
+                             list(other['Datetime']))
+            for name in trackCatalogue.TRACKFILE_COLS[2:]:
+                assert_almost_equal(track[name], other[name], 3)
+
+    def testReadCSVTimeZone(self):
+        """Test the dates of a csv track file do not depend on the time zone"""
+        with open(self.csvfile, 'w') as fp:
+            fp.write('%' + trackCatalogue.TRACKFILE_HEADER)
+            np.savetxt(fp, self.tracks, fmt=trackCatalogue.TRACKFILE_FMT)
+
+        tz = os.environ.get('TZ')
+        os.environ['TZ'] = 'Australia/Perth'
+        time.tzset()
+        try:
+            data = trackCatalogue.readCSV(self.csvfile)
+        finally:
+            if tz is None:
+                del os.environ['TZ']
+            else:
+                os.environ['TZ'] = tz
+            time.tzset()
+        self.assertEqual(list(data['Datetime']), list(self.tracks[:, 1]))
+
+    def testParseDates(self):
+        """Test parsing the dates of the track files"""
+        dates = trackCatalogue.parseDates(np.array(['1900-01-30 23:59:58',
+                                                    '2000-02-29 06:30:00']))
+        self.assertEqual(list(dates.astype(object)),
+                         [datetime(1900, 1, 30, 23, 59, 58),
+                          datetime(2000, 2, 29, 6, 30)])
+        self.assertEqual(len(trackCatalogue.parseDates(np.array([]))), 0)
+        self.assertRaises(ValueError, trackCatalogue.parseDates,
+                          np.array(['2000-02-29 06:30']))
+
+    def testSplitEmpty(self):
+        """Test an empty track file gives a single empty track"""
+        with open(self.csvfile, 'w') as fp:
+            fp.write('%' + trackCatalogue.TRACKFILE_HEADER)
+        tracks = trackCatalogue.splitTracks(
+            trackCatalogue.readCSV(self.csvfile))
+        self.assertEqual(len(tracks), 1)
+        self.assertEqual(len(tracks[0]), 0)
+
+    def testReadWeights(self):
+        """Test reading the likelihood ratio of each track"""
+        weights = [0.25, 1.5, 0.75]
+        self.assertEqual(trackCatalogue.readWeights(self.ncfile), None)
+        trackCatalogue.saveTrackCatalogue(self.ncfile, self.tracks, 7,
+                                          weights=weights)
+        assert_almost_equal(trackCatalogue.readWeights(self.ncfile), weights)
+
+        with open(self.csvfile, 'w') as fp:
+            fp.write('%' + trackCatalogue.TRACKFILE_HEADER)
+            fp.write('%Culled=2\n%Weights=0.25,1.5,0.75\n')
+            np.savetxt(fp, self.tracks, fmt=trackCatalogue.TRACKFILE_FMT)
+        assert_almost_equal(trackCatalogue.readWeights(self.csvfile), weights)
+
+        with open(self.csvfile, 'w') as fp:
+            fp.write('%' + trackCatalogue.TRACKFILE_HEADER)
+            fp.write('%Weights=\n')
+        self.assertEqual(len(trackCatalogue.readWeights(self.csvfile)), 0)
+
+    def testExportCSV(self):
+        """Test exporting a catalogue gives the csv track file"""
+        trackCatalogue.exportCSV(self.ncfile, self.csvfile)
+        with open(self.csvfile) as fp:
+            exported = fp.read()
+
+        fd, csvfile = tempfile.mkstemp(suffix='.csv')
+        os.close(fd)
+        with open(csvfile, 'w') as fp:
+            fp.write('%' + trackCatalogue.TRACKFILE_HEADER)
+            np.savetxt(fp, self.tracks, fmt=trackCatalogue.TRACKFILE_FMT)
+        with open(csvfile) as fp:
+            expected = fp.read()
+        os.unlink(csvfile)
+
+        self.assertEqual(exported, expected)
+
+if __name__ == "__main__":
+    unittest.main()
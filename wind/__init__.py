@@ -43,7 +43,10 @@ from Utilities.files import flModDate, flProgramVersion
 from Utilities.config import ConfigParser
 from Utilities.metutils import convert
 from Utilities.maputils import bearing2theta, makeGrid
+from Utilities.trackCatalogue import isCatalogue, readTrackCatalogue, \
+    readTracks, readCSV, readWeights, splitTracks, trackRecords
 from Utilities.parallel import attemptParallel
+from Utilities.AsyncRun import getWriter, flushWriter
 
 import Utilities.nctools as nctools
 
@@ -59,12 +62,10 @@ TRACKFILE_UNIT = ('', '', 'hr', 'degree', 'degree', 'kph', 'degrees',
 TRACKFILE_FMTS = ('i', 'object', 'f', 'f8', 'f8', 'f8', 'f8', 'f8', 'f8', 'f8')
 
 TRACKFILE_CNVT = {
-    0: lambda s: int(float(s.strip() or 0)),
-    1: lambda s: datetime.strptime(s.strip(), DATEFORMAT),
-    5: lambda s: convert(float(s.strip() or 0), TRACKFILE_UNIT[5], 'mps'),
-    6: lambda s: bearing2theta(float(s.strip() or 0) * np.pi / 180.),
-    7: lambda s: convert(float(s.strip() or 0), TRACKFILE_UNIT[7], 'Pa'),
-    8: lambda s: convert(float(s.strip() or 0), TRACKFILE_UNIT[8], 'Pa'),
+    'Speed': lambda v: convert(v, TRACKFILE_UNIT[5], 'mps'),
+    'Bearing': lambda v: bearing2theta(v * np.pi / 180.),
+    'CentralPressure': lambda v: convert(v, TRACKFILE_UNIT[7], 'Pa'),
+    'EnvPressure': lambda v: convert(v, TRACKFILE_UNIT[8], 'Pa'),
 }
 
 
@@ -91,6 +92,7 @@ class Track(object):
         self.data = data
         self.trackId = None
         self.trackfile = None
+        self.weight = None
 
     def __getattr__(self, key):
         """
@@ -677,7 +679,13 @@ class WindfieldGenerator(object):
                             progressCallback=None, timeStepCallback=None):
         """
         Dump the maximum wind speeds (gusts) observed over a region to
-        netcdf files. One file is created for every track file.
+        netcdf files. One file is created for every track file. The
+        files are written in the background by the shared writer (see
+        :func:`Utilities.AsyncRun.getWriter`), so the next wind fields
+        are calculated while the gusts are saved.
+
+        If the tracks are weighted (see :func:`makeTracks`), the maxima
+        of each track are saved as well, for the hazard calculation.
 
         :type  trackiter: list of :class:`Track` objects
         :param trackiter: a list of :class:`Track` objects.
@@ -705,11 +713,15 @@ class WindfieldGenerator(object):
             results = itertools.imap(self.calculateExtremesFromTrack, trackiter)
 
         gusts = {}
+        events = defaultdict(list)
         done = defaultdict(list)
 
         i = 0
         for track, result in results:
             gust, bearing, Vx, Vy, P, lon, lat = result
+            if track.weight is not None:
+                events[track.trackfile].append((track.weight, gust, Vx,
+                                                Vy, P))
 
             if track.trackfile in gusts:
                 gust1, bearing1, Vx1, Vy1, P1, lon1, lat1 = \
@@ -727,10 +739,15 @@ class WindfieldGenerator(object):
                 dumpfile = pjoin(windfieldPath,
                                  base.replace('tracks', 'gust') + '.nc')
 
+                eventData = None
+                if track.trackfile in events:
+                    eventData = [np.array(x) for x in
+                                 zip(*events.pop(track.trackfile))]
+
                 #dumpfile = pjoin(windfieldPath, fnFormat % (pp.rank(), i))
-                self._saveGustToFile(track.trackfile,
-                                     (lat, lon, gust, Vx, Vy, P),
-                                     dumpfile)
+                getWriter().submit(self._saveGustToFile, track.trackfile,
+                                   (lat, lon, gust, Vx, Vy, P),
+                                   dumpfile, eventData)
 
                 del done[track.trackfile]
                 del gusts[track.trackfile]
@@ -740,13 +757,20 @@ class WindfieldGenerator(object):
                 if progressCallback:
                     progressCallback(i)
 
-    def _saveGustToFile(self, trackfile, result, filename):
+    def _saveGustToFile(self, trackfile, result, filename, events=None):
         """
-        Save gusts to a file.
+        Save gusts to a file. For an importance sampled simulation,
+        `events` holds the likelihood ratio and the gusts, wind
+        components and pressures of each track, which are stored along
+        the `event` dimension for use in the hazard calculation.
         """
         lat, lon, speed, Vx, Vy, P = result
 
-        trackfileDate = flModDate(trackfile)
+        if os.path.exists(trackfile):
+            trackfileDate = flModDate(trackfile)
+        else:
+            # The tracks were not saved (see `dumpGustsFromTrackArray`)
+            trackfileDate = ''
 
         gatts = {
             'title': 'TCRM hazard simulation - synthetic event wind field',
@@ -864,6 +888,37 @@ class WindfieldGenerator(object):
             }
         }
 
+        if events is not None:
+            weights = events[0]
+            dimensions[2] = {
+                'name': 'event',
+                'values': np.arange(len(weights)),
+                'dtype': 'i',
+                'atts': {'long_name': 'Event number'}
+            }
+            variables[5] = {
+                'name': 'event_weight',
+                'dims': ('event',),
+                'values': weights,
+                'dtype': 'f8',
+                'atts': {
+                    'long_name': 'Likelihood ratio of the genesis point'
+                }
+            }
+            # The maxima of each event, with the attributes of the
+            # maxima of the simulation:
+            for n, values in enumerate(events[1:]):
+                var = dict(variables[n])
+                var['name'] = 'event_' + var['name']
+                var['dims'] = ('event', 'lat', 'lon')
+                var['values'] = values
+                var['atts'] = dict(var['atts'],
+                                   long_name=var['atts']['long_name'] +
+                                   ' of each event',
+                                   actual_range=(np.min(values),
+                                                 np.max(values)))
+                variables[6 + n] = var
+
         nctools.ncSaveGrid(filename, dimensions, variables, gatts=gatts)
 
     def dumpGustsFromTrackfiles(self, trackfiles, windfieldPath,
@@ -901,6 +956,46 @@ class WindfieldGenerator(object):
                                  progressCallback=progressCallback,
                                  timeStepCallback=timeStepCallback)
 
+    def dumpGustsFromTrackArray(self, tracks, trackfile, windfieldPath,
+                                filenameFormat='gust-%02i-%04i.nc',
+                                timeStepCallback=None, weights=None):
+        """
+        Helper method to dump the maximum wind speeds (gusts) of the
+        tracks of a simulation held in memory, without reading them from
+        a track file. The gusts are saved to the file that would be
+        created for `trackfile`.
+
+        :type  tracks: :class:`numpy.ndarray`
+        :param tracks: the tracks generated by
+                       :meth:`TrackGenerator.generateTracks`.
+
+        :type  trackfile: str
+        :param trackfile: the name of the track file of the simulation.
+                          The file does not need to exist.
+
+        :type  windfieldPath: str
+        :param windfieldPath: the path where to store the gust output files.
+
+        :type  filenameFormat: str
+        :param filenameFormat: the format string for the output file names. The
+                               default is set to 'gust-%02i-%04i.nc'.
+
+        :type  timeStepCallBack: function
+        :param timeStepCallback: optional function to be called at each
+                                 timestep to extract point values for
+                                 specified locations.
+
+        :type  weights: :class:`numpy.ndarray`
+        :param weights: optional likelihood ratio of each track, when
+                        the genesis points are importance sampled.
+
+        """
+
+        self.dumpGustsFromTracks(loadTracksFromArray(tracks, trackfile,
+                                                     weights),
+                                 windfieldPath, filenameFormat,
+                                 timeStepCallback=timeStepCallback)
+
 
 def readTrackData(trackfile):
     """
@@ -919,19 +1014,11 @@ def readTrackData(trackfile):
 
     """
 
-    try:
-        return np.loadtxt(trackfile,
-                          comments='%',
-                          delimiter=',',
-                          dtype={
-                          'names': TRACKFILE_COLS,
-                          'formats': TRACKFILE_FMTS},
-                          converters=TRACKFILE_CNVT)
-    except ValueError:
-        # return an empty array with the appropriate `dtype` field names
-        return np.empty(0, dtype={
-                        'names': TRACKFILE_COLS,
-                        'formats': TRACKFILE_FMTS})
+    if isCatalogue(trackfile):
+        return readTrackCatalogue(trackfile, TRACKFILE_COLS,
+                                  TRACKFILE_FMTS, TRACKFILE_CNVT)[0]
+
+    return readCSV(trackfile, TRACKFILE_COLS, TRACKFILE_FMTS, TRACKFILE_CNVT)
 
 
 def readMultipleTrackData(trackfile):
@@ -946,15 +1033,11 @@ def readMultipleTrackData(trackfile):
 
     """
 
-    datas = []
-    data = readTrackData(trackfile)
-    if len(data) > 0:
-        cycloneId = data['CycloneNumber']
-        for i in range(1, np.max(cycloneId) + 1):
-            datas.append(data[cycloneId == i])
-    else:
-        datas.append(data)
-    return datas
+    if isCatalogue(trackfile):
+        return readTracks(trackfile, TRACKFILE_COLS, TRACKFILE_FMTS,
+                          TRACKFILE_CNVT)
+
+    return splitTracks(readTrackData(trackfile))
 
 
 def loadTracksFromFiles(trackfiles):
@@ -995,12 +1078,56 @@ def loadTracks(trackfile):
 
     """
 
+    return makeTracks(readMultipleTrackData(trackfile), trackfile,
+                      readWeights(trackfile))
+
+
+def loadTracksFromArray(tracks, trackfile, weights=None):
+    """
+    Return a list of :class:`Track` objects for the tracks of a simulation
+    held in memory, as returned by :meth:`TrackGenerator.generateTracks`.
+    The tracks are converted to the units used by :func:`readTrackData`.
+    They are the same as the tracks read back from the track file,
+    except that they are not rounded to the precision of the file
+    (see :data:`Utilities.trackCatalogue.TRACKFILE_FMT`).
+
+    :type  tracks: :class:`numpy.ndarray`
+    :param tracks: the tracks of a simulation.
+
+    :param str trackfile: the name of the track file of the simulation.
+    :param weights: optional likelihood ratio of each track.
+
+    :return: list of :class:`Track` objects.
+
+    """
+
+    data = trackRecords(tracks, TRACKFILE_COLS, TRACKFILE_FMTS,
+                        TRACKFILE_CNVT)
+    return makeTracks(splitTracks(data), trackfile, weights)
+
+
+def makeTracks(datas, trackfile, weights=None):
+    """
+    Create the :class:`Track` objects for the tracks of a track file.
+
+    :param list datas: the data of each track in the file.
+    :param str trackfile: the track data filename.
+    :param weights: optional likelihood ratio of each track, stored in
+                    the :attr:`weight` attribute of the tracks. The
+                    empty track of an empty track file is given a
+                    weight of zero.
+
+    :return: list of :class:`Track` objects.
+
+    """
+
     tracks = []
-    datas = readMultipleTrackData(trackfile)
     n = len(datas)
     for i, data in enumerate(datas):
         track = Track(data)
         track.trackfile = trackfile
+        if weights is not None:
+            track.weight = weights[i] if len(data) > 0 else 0.
         track.trackId = (i, n)
         tracks.append(track)
     return tracks
@@ -1037,23 +1164,17 @@ def balanced(iterable):
     return itertools.islice(iterable, p, None, P)
 
 
-def run(configFile, callback=None):
+def loadWindfieldGenerator(config):
     """
-    Run the wind field calculations.
+    Create a :class:`WindfieldGenerator` with the wind field settings of
+    a configuration.
 
-    :param str configFile: path to a configuration file.
-    :param func callback: optional callback function to track progress.
-
-    """
+    :param config: :class:`ConfigParser` holding the configuration.
 
-    log.info('Loading wind field calculation settings')
+    :returns: :class:`WindfieldGenerator` instance.
 
-    # Get configuration
-
-    config = ConfigParser()
-    config.read(configFile)
+    """
 
-    outputPath = config.get('Output', 'Path')
     profileType = config.get('WindfieldInterface', 'profileType')
     windFieldType = config.get('WindfieldInterface', 'windFieldType')
     beta = config.getfloat('WindfieldInterface', 'beta')
@@ -1064,10 +1185,6 @@ def run(configFile, callback=None):
     resolution = config.getfloat('WindfieldInterface', 'Resolution')
     domain = config.get('WindfieldInterface', 'Domain')
 
-    windfieldPath = pjoin(outputPath, 'windfield')
-    trackPath = pjoin(outputPath, 'tracks')
-    windfieldFormat = 'gust-%i-%04d.nc'
-
     gridLimit = None
     if config.has_option('Region','gridLimit'):
         gridLimit = config.geteval('Region', 'gridLimit')
@@ -1075,6 +1192,45 @@ def run(configFile, callback=None):
     if config.has_option('WindfieldInterface', 'gridLimit'):
         gridLimit = config.geteval('WindfieldInterface', 'gridLimit')
 
+    thetaMax = math.radians(thetaMax)
+
+    return WindfieldGenerator(config=config,
+                              margin=margin,
+                              resolution=resolution,
+                              profileType=profileType,
+                              windFieldType=windFieldType,
+                              beta=beta,
+                              beta1=beta1,
+                              beta2=beta2,
+                              thetaMax=thetaMax,
+                              gridLimit=gridLimit,
+                              domain=domain)
+
+
+def run(configFile, callback=None, trackfiles=None):
+    """
+    Run the wind field calculations.
+
+    :param str configFile: path to a configuration file.
+    :param func callback: optional callback function to track progress.
+    :param list trackfiles: optional list of track files to process. By
+                            default, all track files in the output track
+                            path are processed.
+
+    """
+
+    log.info('Loading wind field calculation settings')
+
+    # Get configuration
+
+    config = ConfigParser()
+    config.read(configFile)
+
+    outputPath = config.get('Output', 'Path')
+    windfieldPath = pjoin(outputPath, 'windfield')
+    trackPath = pjoin(outputPath, 'tracks')
+    windfieldFormat = 'gust-%i-%04d.nc'
+
     if config.has_section('Timeseries'):
         if config.has_option('Timeseries', 'Extract'):
             if config.getboolean('Timeseries', 'Extract'):
@@ -1088,33 +1244,25 @@ def run(configFile, callback=None):
             """Dummy timestepCallback function"""
             pass
 
-    thetaMax = math.radians(thetaMax)
-
     # Attempt to start the track generator in parallel
     global pp
     pp = attemptParallel()
 
     log.info('Running windfield generator')
 
-    wfg = WindfieldGenerator(config=config,
-                             margin=margin,
-                             resolution=resolution,
-                             profileType=profileType,
-                             windFieldType=windFieldType,
-                             beta=beta,
-                             beta1=beta1,
-                             beta2=beta2,
-                             thetaMax=thetaMax,
-                             gridLimit=gridLimit,
-                             domain=domain)
+    wfg = loadWindfieldGenerator(config)
+    getWriter(config.getint('Output', 'WriterThreads'),
+              config.getint('Output', 'WriterQueueSize'))
 
     msg = 'Dumping gusts to %s' % windfieldPath
     log.info(msg)
 
     # Get the trackfile names and count
 
-    files = os.listdir(trackPath)
-    trackfiles = [pjoin(trackPath, f) for f in files if f.startswith('tracks')]
+    if trackfiles is None:
+        files = os.listdir(trackPath)
+        trackfiles = [pjoin(trackPath, f) for f in files
+                      if f.startswith('tracks')]
     nfiles = len(trackfiles)
 
     def progressCallback(i):
@@ -1135,6 +1283,9 @@ def run(configFile, callback=None):
     except NameError:
         pass
 
+    # Make sure all the gusts have been written
+    flushWriter()
+
     pp.barrier()
 
     log.info('Completed windfield generator')